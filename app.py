@@ -2,81 +2,196 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
-import joblib
-from io import StringIO
 import os
+import time
+from hot_swap import ModelManager, ServingModel
+from ingest import read_upload
+from jobs import JobQueue
+from response_formats import available_formats, negotiate, render_predictions
+from model_artifacts import ARTIFACTS_DIR, load_bundle, latest_bundle_path
+from telemetry import Telemetry
 
-# Load model and columns
-MODEL_PATH = "xgboost_credit_model.joblib"
-COLS_PATH = "train_features_columns.joblib"
-METRICS_PATH = "evaluation_metrics.joblib"
+# 'xgboost' or 'numpy' (vectorized tree evaluator, needs a model bundle)
+INFERENCE_ENGINE = os.environ.get("NOVA_INFERENCE_ENGINE", "xgboost")
 
-model = joblib.load(MODEL_PATH)
-train_features_columns = joblib.load(COLS_PATH)
-if os.path.exists(METRICS_PATH):
-    evaluation_metrics = joblib.load(METRICS_PATH)
-else:
-    evaluation_metrics = {}
+# XGBoost threads per prediction; 0 keeps XGBoost's default (all cores). serve.py sets it per worker
+MODEL_THREADS = int(os.environ.get("NOVA_MODEL_THREADS", "0"))
+
+# Hot swap of new bundles and shadow scoring, as in main.py
+MODEL_WATCH_SECONDS = float(os.environ.get("NOVA_MODEL_WATCH_SECONDS", "10"))
+USE_SHADOW_MODE = os.environ.get("NOVA_SHADOW_MODE", "0") == "1"
+SHADOW_PROMOTE_ROWS = int(os.environ.get("NOVA_SHADOW_PROMOTE_ROWS", "0"))
+SHADOW_MIN_AGREEMENT = float(os.environ.get("NOVA_SHADOW_MIN_AGREEMENT", "0.95"))
+
+# Asynchronous batch jobs, as in main.py
+JOBS_DIR = os.environ.get("NOVA_JOBS_DIR", "jobs")
+JOB_WORKERS = int(os.environ.get("NOVA_JOB_WORKERS", "0"))
+JOB_MAX_QUEUED = int(os.environ.get("NOVA_JOB_MAX_QUEUED", "4"))
+JOB_TTL_SECONDS = float(os.environ.get("NOVA_JOB_TTL_HOURS", "24")) * 3600
+
+def load_serving_model(path):
+    return ServingModel.from_bundle(load_bundle(path), INFERENCE_ENGINE, MODEL_THREADS)
+
+# Returned with 503 until a bundle is loaded; /readyz stays not ready meanwhile
+NO_MODEL_ERROR = "No model bundle is loaded yet; export one with train_and_export_model.py."
 
 app = Flask(__name__)
 CORS(app)
+# Request counters, per-stage latency and model batch size histograms, served on /metrics
+telemetry = Telemetry().instrument(app)
+# model_manager.current is the served model (with its encoder and metrics); new bundles replace it as a whole
+model_manager = ModelManager(load_serving_model, poll_interval=MODEL_WATCH_SECONDS, shadow=USE_SHADOW_MODE,
+                             promote_after_rows=SHADOW_PROMOTE_ROWS,
+                             min_agreement=SHADOW_MIN_AGREEMENT).register(app)
+# Set by serve.py when several workers serve: /metrics and /drift then cover all of them
+worker_state = None
+job_queue = JobQueue(model_manager, jobs_dir=JOBS_DIR, workers=JOB_WORKERS, max_queued=JOB_MAX_QUEUED,
+                     ttl_seconds=JOB_TTL_SECONDS, engine=INFERENCE_ENGINE).register(app)
 
-def preprocess_user_data(user_df, train_columns):
-    # One-hot encode categorical columns
-    categorical_cols = user_df.select_dtypes(include=['object']).columns.tolist()
-    user_df = pd.get_dummies(user_df, columns=categorical_cols, drop_first=True)
-    # Add missing columns
-    missing_cols = set(train_columns) - set(user_df.columns)
-    for c in missing_cols:
-        user_df[c] = 0
-    # Remove extra columns
-    extra_cols = set(user_df.columns) - set(train_columns)
-    user_df = user_df.drop(columns=list(extra_cols), errors='ignore')
-    # Reorder
-    user_df = user_df[train_columns]
-    return user_df
+def load_latest(artifacts_dir=ARTIFACTS_DIR):
+    """
+    Serves the latest bundle of artifacts_dir and watches that directory for newer ones.
+    Returns False if it holds no bundle yet; the watcher then loads the first one exported.
+    """
+    model_manager.artifacts_dir = artifacts_dir
+    bundle_path = latest_bundle_path(artifacts_dir)
+    if bundle_path is None:
+        print(f"No model bundle in {artifacts_dir}; not ready until one is exported.")
+        return False
+    # Warm start from the latest bundle exported by train_and_export_model.py
+    serving = load_serving_model(bundle_path)
+    model_manager.activate(serving)
+    print(f"Loaded model bundle {serving.version} ({INFERENCE_ENGINE} inference engine)")
+    return True
+
+load_latest()
 
 @app.route('/predict', methods=['POST'])
 def predict():
+    serving = model_manager.current
+    if serving is None:
+        return jsonify({'error': NO_MODEL_ERROR}), 503
     try:
-        user_input = request.json
-        user_df = pd.DataFrame([user_input])
-        user_features_processed = preprocess_user_data(user_df.copy(), train_features_columns)
-        prediction = model.predict(user_features_processed)
+        with telemetry.timed('/predict', 'parse'):
+            user_input = request.json
+        telemetry.count_rows('/predict', 1)
+        if serving.drift is not None:
+            serving.drift.update_record(user_input)
+        with telemetry.timed('/predict', 'preprocess'):
+            user_features_processed = serving.encoder.encode_row(user_input)
+        telemetry.record_model_batch('/predict', 1)
+        with telemetry.timed('/predict', 'predict'):
+            started = time.perf_counter()
+            prediction = serving.predictor.predict(user_features_processed)
+            live_seconds = time.perf_counter() - started
+        model_manager.submit_shadow(user_input, prediction == 1, live_seconds)
         result = "Eligible" if prediction[0] == 1 else "Not Eligible"
-        return jsonify({
-            'prediction': result,
-            'metrics': evaluation_metrics
-        })
+        with telemetry.timed('/predict', 'serialize'):
+            return jsonify({
+                'prediction': result,
+                'metrics': serving.metrics
+            })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/predict_csv', methods=['POST'])
 def predict_csv():
+    serving = model_manager.current
+    if serving is None:
+        return jsonify({'error': NO_MODEL_ERROR}), 503
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'No file part in the request'}), 400
         file = request.files['file']
         if file.filename == '':
             return jsonify({'error': 'No selected file'}), 400
-        csv_data = StringIO(file.read().decode('utf-8'))
-        input_df = pd.read_csv(csv_data, low_memory=False, engine='c')
+        response_format = negotiate(request)
+        if response_format is None:
+            return jsonify({'error': f"Unknown format; use one of {', '.join(available_formats())}."}), 406
+        with telemetry.timed('/predict_csv', 'parse'):
+            input_df = read_upload(file.stream, serving.validator)
+        telemetry.count_rows('/predict_csv', len(input_df))
         # Remove Creditworthy if present
         if 'Creditworthy' in input_df.columns:
             input_df = input_df.drop(columns=['Creditworthy'])
         input_df = input_df.dropna(axis=1, how='all')
-        user_features_processed = preprocess_user_data(input_df.copy(), train_features_columns)
-        predictions = model.predict(user_features_processed)
+        if serving.drift is not None:
+            serving.drift.update_frame(input_df)
+        with telemetry.timed('/predict_csv', 'preprocess'):
+            user_features_processed = serving.encoder.encode_frame(input_df)
+        telemetry.record_model_batch('/predict_csv', len(user_features_processed))
+        with telemetry.timed('/predict_csv', 'predict'):
+            predictions = serving.predictor.predict(user_features_processed)
         input_df['Creditworthy_Prediction'] = np.where(predictions == 1, 'Eligible', 'Not Eligible')
-        results = input_df.to_dict('records')
+        model_manager.submit_shadow(input_df, predictions == 1)
+        with telemetry.timed('/predict_csv', 'serialize'):
+            return render_predictions(input_df, response_format, {
+                'metrics': serving.metrics,
+                'fairness_metrics': {},
+                'fairness_observation': "Fairness metrics require ground truth labels and are not available for this upload."
+            })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/explain', methods=['POST'])
+def explain():
+    serving = model_manager.current
+    if serving is None:
+        return jsonify({'error': NO_MODEL_ERROR}), 503
+    try:
+        user_input = request.json
+        explainer = serving.explainer
+        explanation = explainer.explain(serving.encoder.encode_row(user_input))
+        return jsonify(dict(explainer.records(*explanation)[0], model_version=serving.version))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/explain_csv', methods=['POST'])
+def explain_csv():
+    serving = model_manager.current
+    if serving is None:
+        return jsonify({'error': NO_MODEL_ERROR}), 503
+    try:
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file part in the request'}), 400
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'error': 'No selected file'}), 400
+        input_df = read_upload(file.stream, serving.validator)
+        explainer = serving.explainer
+        explanation = explainer.explain(serving.encoder.encode_frame(input_df))
         return jsonify({
-            'predictions': results,
-            'metrics': evaluation_metrics,
-            'fairness_metrics': {},
-            'fairness_observation': "Fairness metrics require ground truth labels and are not available for this upload."
+            'explanations': explainer.records(*explanation),
+            'features': explainer.features,
+            'base_value': explainer.base_value,
+            'model_version': serving.version
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/drift', methods=['GET'])
+def drift_report():
+    serving = model_manager.current
+    if serving is None or serving.drift is None:
+        return jsonify({'error': 'The served model has no training-time feature profile.'}), 404
+    return jsonify(serving.drift.report(worker_state.others('drift') if worker_state is not None else ()))
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({'status': 'ok', 'model_loaded': model_manager.current is not None, 'pid': os.getpid()})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    serving = model_manager.current
+    if serving is None:
+        return jsonify({'status': 'not ready', 'model_loaded': False}), 503
+    return jsonify({'status': 'ready', 'model_loaded': True, 'model_version': serving.version})
+
+def start_background_services():
+    # Threads do not survive fork(), so serve.py calls this in every worker
+    model_manager.start()
+    job_queue.start()
+
 if __name__ == "__main__":
+    start_background_services()
     app.run(host="0.0.0.0", port=7860)
\ No newline at end of file
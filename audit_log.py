@@ -0,0 +1,326 @@
+import atexit
+import os
+import queue
+import threading
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Columnar output is optional
+    pa = None
+    pq = None
+
+_STOP = object()
+
+# Supported output formats and the file extension used for each
+AUDIT_FORMATS = {
+    'csv': '.csv',
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+}
+
+# What submit() does when the queue is full
+WHEN_FULL_POLICIES = ('drop', 'block')
+
+
+class AuditLogWriter:
+    """
+    Appends prediction audit records to disk from a background thread.
+
+    Request handlers call submit() with a record dict or a DataFrame, which
+    only puts it on a bounded queue. A single writer thread drains the queue
+    and writes a batch whenever flush_rows rows are pending or flush_interval
+    seconds have passed since the oldest pending record, so rows from
+    concurrent requests are never interleaved.
+
+    The file is rotated to '<name>.<timestamp><ext>' once it reaches max_bytes
+    or is older than max_age seconds (either check is off when set to None).
+    Only files this writer created are renamed: a file it finds at path and
+    cannot append to, or one it appended to and has to rotate, is left in
+    place and writing continues in a new '<name>.<timestamp><ext>' file.
+    Parquet and Arrow files are only readable once they are closed, i.e.
+    after a rotation or close(), since their footer is written last; keep
+    max_age short if they are read while the server runs.
+
+    When the queue is full, the 'drop' policy discards the record and counts
+    it, while 'block' makes the caller wait for space (up to block_timeout
+    seconds, forever if it is None, then the record is dropped).
+    """
+
+    def __init__(self, path, columns, fmt='csv', max_queue=10000, flush_rows=500, flush_interval=1.0,
+                 max_bytes=None, max_age=None, when_full='drop', block_timeout=None):
+        if fmt not in AUDIT_FORMATS:
+            raise ValueError(f"Unsupported audit log format '{fmt}'. Use one of: {', '.join(AUDIT_FORMATS)}.")
+        if fmt != 'csv' and pa is None:
+            raise ImportError(f"pyarrow is required for the '{fmt}' audit log format.")
+        if when_full not in WHEN_FULL_POLICIES:
+            raise ValueError(f"Unsupported queue policy '{when_full}'. Use one of: {', '.join(WHEN_FULL_POLICIES)}.")
+
+        self.path = path
+        self.active_path = None  # the file being written: path, or a new file next to it
+        self.columns = list(columns)
+        self.fmt = fmt
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes or None
+        self.max_age = max_age or None
+        self.when_full = when_full
+        self.block_timeout = block_timeout
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+
+        # Open file state, only touched by the writer thread
+        self._handle = None
+        self._arrow_writer = None
+        self._arrow_schema = None
+        self._opened_at = None
+        self._created = set()  # files this writer created, the only ones it renames
+        self._keep_path = False  # path holds a file this writer must not rename; write next to it
+
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._dropped = 0
+        self._written = 0
+        self._flushes = 0
+        self._rotations = 0
+        self._errors = 0
+        self._last_error = None
+
+    # --------------------------------------------------------------------------
+    # Request side
+    # --------------------------------------------------------------------------
+    def start(self):
+        """
+        Starts the writer thread and makes sure pending records are flushed at exit.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='nova-audit-log', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+        return self
+
+    def submit(self, record):
+        """
+        Queues a record dict or a DataFrame of records for writing.
+        Returns False if the record was dropped because the queue is full.
+        """
+        try:
+            if self.when_full == 'block':
+                self._queue.put(record, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self._dropped += len(record) if isinstance(record, pd.DataFrame) else 1
+            return False
+        with self._lock:
+            self._submitted += len(record) if isinstance(record, pd.DataFrame) else 1
+        return True
+
+    def close(self, timeout=None):
+        """
+        Flushes everything queued so far, closes the file and stops the writer thread.
+        """
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        """
+        Returns queue and write counters.
+        """
+        with self._lock:
+            return {
+                'path': self.active_path or self.path,
+                'format': self.fmt,
+                'queue_depth': self._queue.qsize(),
+                'queue_capacity': self._queue.maxsize,
+                'when_full': self.when_full,
+                'submitted_rows': self._submitted,
+                'dropped_rows': self._dropped,
+                'written_rows': self._written,
+                'flushes': self._flushes,
+                'rotations': self._rotations,
+                'errors': self._errors,
+                'last_error': self._last_error,
+            }
+
+    # --------------------------------------------------------------------------
+    # Writer thread
+    # --------------------------------------------------------------------------
+    def _run(self):
+        pending = []
+        pending_rows = 0
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush(pending)
+                self._close_file()
+                return
+
+            if item is not None:
+                pending.append(item)
+                pending_rows += len(item) if isinstance(item, pd.DataFrame) else 1
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if pending and (pending_rows >= self.flush_rows or time.monotonic() >= deadline):
+                self._flush(pending)
+                pending = []
+                pending_rows = 0
+                deadline = None
+
+    def _flush(self, items):
+        if not items:
+            return
+        try:
+            batch = self._to_frame(items)
+            self._maybe_rotate()
+            if self.fmt == 'csv':
+                self._write_csv(batch)
+            else:
+                self._write_arrow(batch)
+            with self._lock:
+                self._written += len(batch)
+                self._flushes += 1
+        except Exception as e:
+            # Never let a bad batch take the writer thread down
+            print(f"Audit log write to {self.path} failed: {e}")
+            with self._lock:
+                self._errors += 1
+                self._last_error = str(e)
+
+    def _to_frame(self, items):
+        frames = []
+        records = []
+        for item in items:
+            if isinstance(item, pd.DataFrame):
+                if records:
+                    frames.append(pd.DataFrame.from_records(records))
+                    records = []
+                frames.append(item)
+            else:
+                records.append(item)
+        if records:
+            frames.append(pd.DataFrame.from_records(records))
+        batch = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+        # Every file has the same fixed layout, so rows from different endpoints line up
+        return batch.reindex(columns=self.columns)
+
+    def _open_file(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        header = pd.DataFrame(columns=self.columns).to_csv(index=False).rstrip('\r\n')
+        self.active_path = self.path
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            # Columnar files cannot be appended to, and a CSV with a different
+            # header would misalign the columns, so start a fresh file instead
+            if self._keep_path or self.fmt != 'csv' or _first_line(self.path) != header:
+                if self.path in self._created:
+                    self._rotate_existing()
+                else:
+                    self._keep_path = True
+                    self.active_path = self._rotated_path()
+                    print(f"Audit log {self.path} was not created by this writer; writing to {self.active_path}")
+
+        new_file = not os.path.exists(self.active_path) or os.path.getsize(self.active_path) == 0
+        if new_file:
+            self._created.add(self.active_path)
+        if self.fmt == 'csv':
+            self._handle = open(self.active_path, 'a', newline='', encoding='utf-8')
+            if new_file:
+                self._handle.write(header + '\n')
+                self._handle.flush()
+        self._opened_at = time.time()
+
+    def _close_file(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+        if self._arrow_writer is not None:
+            self._arrow_writer.close()
+            self._arrow_writer = None
+            self._arrow_schema = None
+        self._opened_at = None
+
+    def _maybe_rotate(self):
+        if self._opened_at is None:
+            self._open_file()
+            return
+        too_big = self.max_bytes is not None and os.path.exists(self.active_path) \
+            and os.path.getsize(self.active_path) >= self.max_bytes
+        too_old = self.max_age is not None and time.time() - self._opened_at >= self.max_age
+        if too_big or too_old:
+            self._close_file()
+            self._retire_file()
+            self._open_file()
+
+    def _retire_file(self):
+        """
+        Moves the closed file out of the way of the next one, renaming it only if this writer created it.
+        """
+        if self.active_path != self.path:
+            return  # already a '<name>.<timestamp><ext>' file
+        if self.path in self._created:
+            self._rotate_existing()
+        else:
+            self._keep_path = True
+
+    def _rotated_path(self):
+        root, ext = os.path.splitext(self.path)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        target = f"{root}.{stamp}{ext}"
+        suffix = 1
+        while os.path.exists(target):
+            target = f"{root}.{stamp}-{suffix}{ext}"
+            suffix += 1
+        return target
+
+    def _rotate_existing(self):
+        if not os.path.exists(self.path):
+            return
+        target = self._rotated_path()
+        os.replace(self.path, target)
+        self._created.discard(self.path)
+        with self._lock:
+            self._rotations += 1
+        print(f"Audit log rotated to {target}")
+
+    def _write_csv(self, batch):
+        batch.to_csv(self._handle, header=False, index=False)
+        self._handle.flush()
+
+    def _write_arrow(self, batch):
+        table = pa.Table.from_pandas(batch, preserve_index=False)
+        if self._arrow_writer is not None and not table.schema.equals(self._arrow_schema):
+            try:
+                table = table.cast(self._arrow_schema)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError, ValueError):
+                # Column types changed (e.g. an ID column that used to be numeric)
+                self._close_file()
+                self._retire_file()
+                self._open_file()
+        if self._arrow_writer is None:
+            self._arrow_schema = table.schema
+            if self.fmt == 'parquet':
+                self._arrow_writer = pq.ParquetWriter(self.active_path, table.schema)
+            else:
+                self._arrow_writer = pa.ipc.new_file(self.active_path, table.schema)
+        self._arrow_writer.write_table(table)
+
+
+def _first_line(path):
+    with open(path, 'r', newline='', encoding='utf-8', errors='replace') as f:
+        return f.readline().rstrip('\r\n')
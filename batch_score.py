@@ -0,0 +1,331 @@
+import argparse
+import glob
+import io
+import json
+import os
+import resource
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from feature_encoder import FeatureEncoder
+from model_artifacts import ARTIFACTS_DIR, latest_bundle_path, load_bundle
+from validation import SchemaValidator
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet input and output are optional
+    pa = None
+    pq = None
+
+JOB_FILE = '_job.json'
+SUCCESS_FILE = '_SUCCESS'
+
+# Model, encoder and validator of a pool worker, loaded once by _init_worker
+_worker = {}
+
+
+class _RangeReader:
+    """
+    File-like view of the bytes [start, end) of a file, for pd.read_csv.
+    """
+
+    def __init__(self, path, start, end):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+
+def plan_csv_shards(path, shard_bytes):
+    """
+    Splits a CSV file into byte ranges of about shard_bytes that start and end on line breaks.
+
+    Returns (header, [(start, end), ...]). Quoted fields must not contain line breaks.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header_line = f.readline()
+        header = pd.read_csv(io.BytesIO(header_line), nrows=0).columns.tolist()
+        boundaries = [f.tell()]
+        while boundaries[-1] < size:
+            f.seek(min(boundaries[-1] + shard_bytes, size))
+            if f.tell() < size:
+                f.readline()  # move to the start of the next line
+            boundaries.append(min(f.tell(), size))
+    return header, [(a, b) for a, b in zip(boundaries, boundaries[1:]) if b > a]
+
+
+def plan_tasks(input_path, shard_bytes):
+    """
+    Lists the work units of an input: CSV byte ranges or Parquet row groups.
+    """
+    if os.path.isdir(input_path) or input_path.endswith('.parquet'):
+        if pq is None:
+            raise ImportError("pyarrow is required to score Parquet input.")
+        files = sorted(glob.glob(os.path.join(input_path, '*.parquet'))) if os.path.isdir(input_path) else [input_path]
+        return [{'kind': 'parquet', 'path': name, 'row_group': group}
+                for name in files for group in range(pq.ParquetFile(name).num_row_groups)]
+    header, ranges = plan_csv_shards(input_path, shard_bytes)
+    return [{'kind': 'csv', 'path': input_path, 'header': header, 'start': start, 'end': end}
+            for start, end in ranges]
+
+
+def _iter_task_chunks(task, chunk_rows):
+    """
+    Yields the rows of a work unit as DataFrames of up to chunk_rows rows.
+
+    A unit without rows (an empty row group or CSV byte range) yields one empty
+    frame with the input's columns, so its part file still has the full layout.
+    """
+    if task['kind'] == 'parquet':
+        parquet_file = pq.ParquetFile(task['path'])
+        empty = True
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, row_groups=[task['row_group']]):
+            empty = False
+            yield batch.to_pandas()
+        if empty:
+            yield parquet_file.schema_arrow.empty_table().to_pandas()
+        return
+    reader = _RangeReader(task['path'], task['start'], task['end'])
+    try:
+        # Partner IDs keep their leading zeros
+        dtype = {'Partner ID': str} if 'Partner ID' in task['header'] else None
+        # An empty byte range still yields one empty frame with these names
+        yield from pd.read_csv(reader, header=None, names=task['header'], dtype=dtype, chunksize=chunk_rows)
+    finally:
+        reader.close()
+
+
+def _init_worker(bundle_path, engine, n_jobs):
+    bundle = load_bundle(bundle_path)
+    if engine == 'numpy':
+        predictor = bundle.tree_ensemble()
+    else:
+        predictor = bundle.model
+        predictor.set_params(n_jobs=n_jobs)
+    _worker.update(predictor=bundle.segmented(predictor, engine, n_jobs), encoder=FeatureEncoder(bundle.feature_columns),
+                   validator=SchemaValidator(bundle.feature_columns))
+
+
+def score_frame(df, predictor, encoder, validator):
+    """
+    Adds prediction, probability and validation error columns to a chunk of raw rows.
+
+    Rows that fail validation are not scored; their error messages are joined
+    into 'Validation_Errors'.
+    """
+    error_bits = validator.validate_frame(df)
+    valid = error_bits == 0
+    probability = np.full(len(df), np.nan)
+    if valid.any():
+        probability[valid] = predictor.predict_proba(encoder.encode_frame(df[valid]))[:, 1]
+
+    errors = np.full(len(df), '', dtype=object)
+    for value in np.unique(error_bits[~valid]):
+        errors[error_bits == value] = '; '.join(validator.describe(value))
+
+    out = df.copy()
+    out['Creditworthy_Prediction'] = np.where(valid, np.where(probability > 0.5, 'Eligible', 'Not Eligible'), '')
+    out['Creditworthy_Probability'] = probability
+    # As str, so an empty chunk gets the same column type as one with rows
+    out['Validation_Errors'] = errors.astype(str)
+    return out
+
+
+def _score_task(index, task, parts_dir, fmt, chunk_rows):
+    """
+    Scores one work unit into its part file, unless a previous run already wrote it.
+    """
+    part = os.path.join(parts_dir, f'part-{index:05d}.{fmt}')
+    if os.path.exists(part):
+        return {'part': part, 'rows': 0, 'skipped': True}
+
+    started = time.time()
+    tmp = f'{part}.tmp'
+    rows = rejected = 0
+    writer = None
+    with open(tmp, 'wb') as out:
+        for chunk in _iter_task_chunks(task, chunk_rows):
+            scored = score_frame(chunk, _worker['predictor'], _worker['encoder'], _worker['validator'])
+            rows += len(scored)
+            rejected += int((scored['Validation_Errors'] != '').sum())
+            if fmt == 'parquet':
+                table = pa.Table.from_pandas(scored, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(out, table.schema)
+                writer.write_table(table.cast(writer.schema))
+            else:
+                # Every part carries the header; it is stripped again when the parts are merged
+                out.write(scored.to_csv(index=False, header=rows == len(scored)).encode('utf-8'))
+        if writer is not None:
+            writer.close()
+    # Only complete parts get their final name, so a crash never leaves a part that looks done
+    os.replace(tmp, part)
+    return {'part': part, 'rows': rows, 'rejected': rejected, 'skipped': False, 'seconds': time.time() - started,
+            'peak_rss_mb': _peak_rss_mb(resource.RUSAGE_SELF)}
+
+
+def _peak_rss_mb(who):
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _merge_csv_parts(parts, output):
+    tmp = f'{output}.tmp'
+    with open(tmp, 'wb') as out:
+        for i, part in enumerate(parts):
+            with open(part, 'rb') as f:
+                header = f.readline()
+                if i == 0:
+                    out.write(header)
+                shutil.copyfileobj(f, out, 1 << 20)
+    os.replace(tmp, output)
+
+
+def run_batch(input_path, output, bundle_path=None, artifacts_dir=ARTIFACTS_DIR, workers=None, chunk_rows=100_000,
+              shard_mb=64, engine='xgboost', keep_parts=False, progress=None, mp_context=None):
+    """
+    Scores a large CSV or Parquet input with the model bundle across worker processes.
+
+    The input is cut into work units (CSV byte ranges of about shard_mb, or
+    Parquet row groups), every unit is scored chunk by chunk into its own part
+    file, and a rerun after a crash skips the parts that already exist. CSV
+    output is merged into one file at the end; Parquet output is a directory
+    of part files. Returns a summary with rows/sec and peak memory.
+
+    progress, if given, is called with (units done, units total, unit result)
+    after every work unit, and once with (0, units total, None) before the
+    first. Passing an mp_context always scores in a process pool, even with
+    one worker, so the calling process never loads the model.
+    """
+    if shard_mb < 1:
+        raise ValueError(f"shard_mb must be at least 1, got {shard_mb}.")
+    started = time.time()
+    fmt = 'parquet' if output.endswith('.parquet') else 'csv'
+    if fmt == 'parquet' and pq is None:
+        raise ImportError("pyarrow is required to write Parquet output.")
+    if bundle_path is None:
+        bundle_path = latest_bundle_path(artifacts_dir)
+        if bundle_path is None:
+            raise FileNotFoundError(f"No model bundle found in '{artifacts_dir}'.")
+
+    tasks = plan_tasks(input_path, shard_mb * 1024 * 1024)
+    parts_dir = output if fmt == 'parquet' else f'{output}.parts'
+    os.makedirs(parts_dir, exist_ok=True)
+
+    # The job description guards against resuming with a different input or model
+    job = {
+        'input': os.path.abspath(input_path),
+        'input_size': sum(os.path.getsize(p) for p in {t['path'] for t in tasks}),
+        'bundle': os.path.abspath(bundle_path),
+        'engine': engine,
+        'tasks': len(tasks),
+        'shard_mb': shard_mb,
+    }
+    job_path = os.path.join(parts_dir, JOB_FILE)
+    if os.path.isfile(job_path):
+        with open(job_path, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+        if previous != job:
+            raise RuntimeError(f"'{parts_dir}' holds parts of a different job; remove it to start over.")
+    else:
+        with open(job_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, indent=2)
+
+    cores = os.cpu_count() or 1
+    workers = max(1, min(workers or cores, len(tasks) or 1))
+    init_args = (bundle_path, engine, max(1, cores // workers))
+    task_args = [(i, task, parts_dir, fmt, chunk_rows) for i, task in enumerate(tasks)]
+    results = []
+    if progress is not None:
+        progress(0, len(tasks), None)
+    if workers > 1 or mp_context is not None:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=_init_worker,
+                                 initargs=init_args) as pool:
+            for future in as_completed([pool.submit(_score_task, *args) for args in task_args]):
+                results.append(future.result())
+                if progress is not None:
+                    progress(len(results), len(tasks), results[-1])
+    else:
+        _init_worker(*init_args)
+        for args in task_args:
+            results.append(_score_task(*args))
+            if progress is not None:
+                progress(len(results), len(tasks), results[-1])
+
+    # Units finish in any order; part file names sort in input order
+    results.sort(key=lambda result: result['part'])
+    parts = [result['part'] for result in results]
+    if fmt == 'csv':
+        _merge_csv_parts(parts, output)
+        if not keep_parts:
+            shutil.rmtree(parts_dir)
+    else:
+        os.remove(job_path)
+        open(os.path.join(parts_dir, SUCCESS_FILE), 'w').close()
+
+    seconds = time.time() - started
+    rows = sum(result['rows'] for result in results)
+    return {
+        'output': output,
+        'bundle': os.path.basename(bundle_path),
+        'tasks': len(tasks),
+        'tasks_resumed': sum(result['skipped'] for result in results),
+        'rows_scored': rows,
+        'rows_rejected': sum(result.get('rejected', 0) for result in results),
+        'seconds': seconds,
+        'rows_per_second': rows / seconds if seconds else 0.0,
+        'peak_rss_mb_main': _peak_rss_mb(resource.RUSAGE_SELF),
+        'peak_rss_mb_worker': max([result.get('peak_rss_mb', 0.0) for result in results] or [0.0]),
+        'workers': workers,
+    }
+
+
+def main(argv=None):
+    """
+    Command-line entry point for nightly batch scoring.
+    """
+    parser = argparse.ArgumentParser(description="Score a large CSV or Parquet file with the exported model.")
+    parser.add_argument('input', help="CSV file, Parquet file or directory of Parquet part files.")
+    parser.add_argument('--output', default='predictions.csv', help="Output .csv file or .parquet directory.")
+    parser.add_argument('--bundle', default=None, help="Bundle directory (defaults to the latest one).")
+    parser.add_argument('--artifacts', default=ARTIFACTS_DIR, help="Directory holding the model bundles.")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (defaults to all cores).")
+    parser.add_argument('--chunk-rows', type=int, default=100_000, help="Rows parsed and scored at a time.")
+    parser.add_argument('--shard-mb', type=int, default=64, help="Size of the CSV byte range of one work unit.")
+    parser.add_argument('--engine', choices=('xgboost', 'numpy'), default='xgboost', help="Inference engine.")
+    parser.add_argument('--keep-parts', action='store_true', help="Keep the CSV part files after merging.")
+    args = parser.parse_args(argv)
+    if args.shard_mb < 1:
+        parser.error("--shard-mb must be at least 1")
+
+    summary = run_batch(args.input, args.output, bundle_path=args.bundle, artifacts_dir=args.artifacts,
+                        workers=args.workers, chunk_rows=args.chunk_rows, shard_mb=args.shard_mb,
+                        engine=args.engine, keep_parts=args.keep_parts)
+    print(f"Scored {summary['rows_scored']} rows ({summary['rows_rejected']} rejected) in {summary['seconds']:.1f} s: "
+          f"{summary['rows_per_second']:,.0f} rows/sec, peak memory {summary['peak_rss_mb_main']:.0f} MB "
+          f"(main) / {summary['peak_rss_mb_worker']:.0f} MB (worker)")
+    if summary['tasks_resumed']:
+        print(f"Resumed: {summary['tasks_resumed']} of {summary['tasks']} work units were already done.")
+    print(f"Predictions written to {summary['output']}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
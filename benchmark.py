@@ -0,0 +1,253 @@
+import argparse
+import io
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import main as backend
+from audit_log import AuditLogWriter
+from dataset import generate_catalyst_dataset
+from ingest import pa, pq, read_upload
+from response_formats import render_predictions
+from segments import SEGMENT_COLUMN, SegmentedModel
+from validation import FEATURE_CATEGORIES
+from model_artifacts import ARTIFACTS_DIR, library_versions
+
+DEFAULT_SIZES = (1, 100, 10_000, 1_000_000)
+RESULTS_DIR = 'benchmark_results'
+
+
+def summarize(seconds, rows=1):
+    """
+    Latency percentiles (ms) and throughput of a list of timings in seconds.
+    """
+    ms = np.asarray(seconds) * 1000
+    median = float(np.median(ms))
+    return {
+        'repeats': len(ms),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': median,
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'rows_per_second': rows / (median / 1000) if median else None,
+    }
+
+
+def time_call(fn, repeats, rows=1):
+    """
+    Times fn() repeats times, after one untimed warm-up call.
+    """
+    fn()
+    seconds = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - started)
+    return summarize(seconds, rows)
+
+
+def default_repeats(rows):
+    if rows <= 100:
+        return 100
+    if rows <= 10_000:
+        return 10
+    return 2
+
+
+def bench_stages(df, csv_bytes, repeats, tree_ensemble):
+    """
+    Times every stage of the bulk scoring path on one input.
+    """
+    rows = len(df)
+    serving = backend.model_manager.current
+    features = df.drop(columns=['Creditworthy'])
+    X = serving.encoder.encode_frame(features)
+    scored = features.assign(Creditworthy_Prediction=np.where(serving.model.predict(X) == 1, 'Eligible', 'Not Eligible'))
+    audit_dir = tempfile.mkdtemp(prefix='nova-bench-')
+    audit_path = os.path.join(audit_dir, 'audit.csv')
+
+    def save_csv():
+        # Fresh file each time, so every repeat writes the same amount of data
+        if os.path.exists(audit_path):
+            os.remove(audit_path)
+        scored.to_csv(audit_path, index=False)
+
+    typed = read_upload(io.BytesIO(csv_bytes), serving.validator).drop(columns=['Creditworthy'])
+    # The global model stands in for every Partner Type, so the gap to predict_xgboost is the routing cost alone
+    segmented = SegmentedModel(serving.model, {category: serving.model for category in FEATURE_CATEGORIES[SEGMENT_COLUMN]},
+                               serving.feature_columns)
+    stages = {
+        'csv_parse': lambda: pd.read_csv(io.BytesIO(csv_bytes)),
+        'csv_parse_typed': lambda: read_upload(io.BytesIO(csv_bytes), serving.validator),
+        'validation': lambda: serving.validator.validate_frame(features),
+        'preprocess_pandas': lambda: backend.preprocess_user_data(features.copy(), serving.feature_columns),
+        'preprocess_encoder': lambda: serving.encoder.encode_frame(features),
+        'preprocess_encoder_typed': lambda: serving.encoder.encode_frame(typed),
+        'predict_xgboost': lambda: serving.model.predict(X),
+        'predict_numpy': lambda: tree_ensemble.predict(X),
+        'predict_segmented': lambda: segmented.predict(X),
+        'json_serialization': lambda: json.dumps(scored.to_dict('records')),
+        'columnar_serialization': lambda: render_predictions(scored, 'columnar', {}).get_data(),
+        'csv_serialization': lambda: render_predictions(scored, 'csv', {}).get_data(),
+        'audit_csv_write': save_csv,
+    }
+    if pa is not None:
+        sink = pa.BufferOutputStream()
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), sink)
+        parquet_bytes = sink.getvalue().to_pybytes()
+        stages['parquet_parse'] = lambda: read_upload(io.BytesIO(parquet_bytes), serving.validator)
+        stages['arrow_serialization'] = lambda: render_predictions(scored, 'arrow', {}).get_data()
+    results = {name: time_call(fn, repeats, rows) for name, fn in stages.items()}
+    shutil.rmtree(audit_dir, ignore_errors=True)
+    return results
+
+
+def bench_predict(client, records, label):
+    """
+    Sends each record to /predict once and reports the latency distribution.
+    """
+    seconds = []
+    for record in records:
+        started = time.perf_counter()
+        response = client.post('/predict', json=record)
+        seconds.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f"/predict returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    result = summarize(seconds)
+    result['requests_per_second'] = len(seconds) / sum(seconds)
+    print(f"  /predict ({label}): p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms")
+    return result
+
+
+def bench_predict_csv(client, csv_bytes, rows, repeats, query=''):
+    """
+    Uploads the same CSV repeats times to /predict_csv and reports latency and throughput.
+    """
+    def upload():
+        response = client.post('/predict_csv' + query,
+                               data={'file': (io.BytesIO(csv_bytes), 'bench.csv')},
+                               content_type='multipart/form-data')
+        body = response.get_data()  # streamed responses are only produced when read
+        if response.status_code != 200:
+            raise RuntimeError(f"/predict_csv returned {response.status_code}: {body[:200]!r}")
+
+    return time_call(upload, repeats, rows)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes=DEFAULT_SIZES, repeats=None, requests=500, seed=0, artifacts_dir=ARTIFACTS_DIR):
+    """
+    Runs the whole suite and returns the results as a JSON-serializable dict.
+    """
+    work_dir = tempfile.mkdtemp(prefix='nova-bench-')
+    # Keep the benchmark's writes away from the real audit log and fairness counters
+    backend.FAIRNESS_PATH = os.path.join(work_dir, 'fairness_counts.json')
+    if not backend.initialize_backend(artifacts_dir=artifacts_dir):
+        raise RuntimeError("No model could be loaded.")
+    serving = backend.model_manager.current
+    tree_ensemble = backend.load_bundle(serving.path).tree_ensemble()
+    backend.audit_log = AuditLogWriter(os.path.join(work_dir, 'audit.csv'),
+                                        list(serving.input_columns) + ['Creditworthy_Prediction']).start()
+    client = backend.app.test_client()
+
+    results = {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'git_commit': git_commit(),
+            'model_version': serving.version,
+            'cpu_count': os.cpu_count(),
+            'libraries': library_versions(),
+            'config': {k: v for k, v in os.environ.items() if k.startswith('NOVA_')},
+            'inference_engine': backend.INFERENCE_ENGINE,
+            'seed': seed,
+        },
+        'sizes': {},
+    }
+
+    print(f"/predict: {requests} requests")
+    records = generate_catalyst_dataset(requests, seed=seed).drop(columns=['Creditworthy']).to_dict('records')
+    results['predict'] = {'uncached': bench_predict(client, records, 'uncached')}
+    if backend.prediction_cache is not None:
+        results['predict']['cached'] = bench_predict(client, records, 'cached')
+
+    for rows in sizes:
+        n_repeats = repeats or default_repeats(rows)
+        print(f"{rows} rows ({n_repeats} repeats)")
+        df = generate_catalyst_dataset(rows, seed=seed)
+        csv_bytes = df.to_csv(index=False).encode('utf-8')
+        entry = {'csv_bytes': len(csv_bytes), 'stages': bench_stages(df, csv_bytes, n_repeats, tree_ensemble)}
+        for name, stage in entry['stages'].items():
+            print(f"  {name:20s} p50 {stage['p50_ms']:10.2f} ms")
+        entry['predict_csv'] = bench_predict_csv(client, csv_bytes, rows, n_repeats)
+        entry['predict_csv_stream'] = bench_predict_csv(client, csv_bytes, rows, n_repeats, '?stream=ndjson')
+        print(f"  /predict_csv         p50 {entry['predict_csv']['p50_ms']:10.2f} ms, "
+              f"stream p50 {entry['predict_csv_stream']['p50_ms']:.2f} ms")
+        results['sizes'][str(rows)] = entry
+
+    backend.audit_log.close()
+    backend.audit_log = None
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def compare(baseline, current):
+    """
+    Prints the p50 ratio (current / baseline) of every metric both runs have.
+    """
+    def flatten(node, prefix=''):
+        if isinstance(node, dict):
+            if 'p50_ms' in node:
+                yield prefix, node['p50_ms']
+            for key, value in node.items():
+                yield from flatten(value, f"{prefix}/{key}" if prefix else key)
+
+    old = dict(flatten({k: v for k, v in baseline.items() if k != 'meta'}))
+    for name, p50 in flatten({k: v for k, v in current.items() if k != 'meta'}):
+        if name in old and old[name]:
+            print(f"{name:55s} {old[name]:10.2f} -> {p50:10.2f} ms  ({p50 / old[name]:.2f}x)")
+
+
+def main(argv=None):
+    """
+    Command-line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing, inference and the HTTP endpoints.")
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma-separated input sizes in rows.")
+    parser.add_argument('--repeats', type=int, default=None, help="Timed repeats per measurement (size-based default).")
+    parser.add_argument('--requests', type=int, default=500, help="Single-record /predict requests.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the generated inputs.")
+    parser.add_argument('--artifacts', default=ARTIFACTS_DIR, help="Directory holding the model bundles.")
+    parser.add_argument('--output', default=None, help="Results file (defaults to benchmark_results/<time>.json).")
+    parser.add_argument('--compare', default=None, help="Earlier results file to compare against.")
+    args = parser.parse_args(argv)
+
+    results = run([int(s) for s in args.sizes.split(',')], repeats=args.repeats, requests=args.requests,
+                  seed=args.seed, artifacts_dir=args.artifacts)
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(json.load(f), results)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,188 @@
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from xgboost import XGBClassifier
+
+from drift import DRIFT_PROFILE_FILE, DriftProfile
+from evaluation import evaluate_model, load_sensitive_features
+from fairness import FairnessAggregator, label_to_binary
+from feature_encoder import FeatureEncoder
+from model_artifacts import ARTIFACTS_DIR, file_sha256, save_bundle
+from preprocessing import load_and_preprocess_data
+from tree_engine import TreeEnsemble
+
+COMPACTION_FILE = 'compaction.json'
+
+# Tree depths tried by the compaction search; 6 is the XGBClassifier default
+COMPACT_DEPTHS = (2, 3, 4, 6)
+
+# Boosting rounds each depth may use before early stopping ends it
+COMPACT_MAX_ROUNDS = 300
+EARLY_STOPPING_ROUNDS = 20
+
+# Shares of the early-stopped tree count kept by the truncated candidates
+TRUNCATION_FRACTIONS = (1.0, 0.75, 0.5, 0.35, 0.25, 0.15, 0.1)
+
+# Batch sizes latency is measured at: /predict, a small upload and a large one
+LATENCY_ROWS = (1, 100, 10_000)
+
+
+def model_nodes(booster):
+    """
+    Total number of nodes in a booster's trees, the size measure candidates are ranked by.
+    """
+    return int(sum(tree.count('\n') for tree in booster.get_dump()))
+
+
+def as_classifier(booster):
+    """
+    Loads a (sliced) Booster into an XGBClassifier, the object the serving path scores with.
+    """
+    model = XGBClassifier()
+    model.load_model(bytearray(booster.save_raw('ubj')))
+    return model
+
+
+def median_latency_ms(fn, X, repeats):
+    fn(X)  # warm-up
+    seconds = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn(X)
+        seconds.append(time.perf_counter() - started)
+    return float(np.median(seconds) * 1000)
+
+
+def measure_latency(model, X_pool, row_sizes=LATENCY_ROWS):
+    """
+    Median predict latency of a model for each batch size, with XGBoost and with the NumPy tree engine.
+    """
+    ensemble = TreeEnsemble.from_booster(model)
+    latency = {}
+    for rows in row_sizes:
+        X = np.resize(X_pool, (rows, X_pool.shape[1]))
+        repeats = max(5, min(200, 20_000 // rows))
+        latency[str(rows)] = {
+            'xgboost_ms': median_latency_ms(model.predict, X, repeats),
+            'numpy_ms': median_latency_ms(ensemble.predict, X, repeats),
+        }
+    return latency
+
+
+def compaction_curve(X_train, y_train, X_test, y_test, depths=COMPACT_DEPTHS, max_rounds=COMPACT_MAX_ROUNDS,
+                     fractions=TRUNCATION_FRACTIONS, row_sizes=LATENCY_ROWS, seed=42, log=print):
+    """
+    Trains one early-stopped model per depth limit and measures it truncated to shrinking tree counts.
+
+    A tenth of the training rows is held out to pick the early-stopping
+    round. Every (depth, trees) candidate is scored on X_test for accuracy
+    and timed at each batch size in row_sizes. Returns the candidates as
+    dicts, each with its sliced booster under 'booster'.
+    """
+    X_fit, X_valid, y_fit, y_valid = train_test_split(X_train, y_train, test_size=0.1, random_state=seed,
+                                                      stratify=y_train)
+    candidates = []
+    for depth in depths:
+        model = XGBClassifier(n_estimators=max_rounds, max_depth=depth, eval_metric='logloss',
+                              early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+        model.fit(X_fit, y_fit, eval_set=[(X_valid, y_valid)], verbose=False)
+        booster = model.get_booster()
+        best_trees = model.best_iteration + 1
+        log(f"Depth {depth}: early stopping kept {best_trees} of {max_rounds} trees")
+        for n_trees in sorted({max(1, round(best_trees * fraction)) for fraction in fractions}, reverse=True):
+            compact = as_classifier(booster[:n_trees])
+            accuracy = float(np.mean(compact.predict(X_test) == y_test))
+            candidates.append({
+                'max_depth': depth,
+                'n_trees': n_trees,
+                'early_stopping_trees': best_trees,
+                'nodes': model_nodes(compact.get_booster()),
+                'test_accuracy': accuracy,
+                'latency': measure_latency(compact, X_test, row_sizes),
+                'booster': compact,
+            })
+    return candidates
+
+
+def select_compact(candidates, baseline_accuracy, max_accuracy_loss):
+    """
+    Returns the candidate with the fewest nodes whose accuracy is within max_accuracy_loss of the baseline.
+
+    Falls back to the most accurate candidate if none is.
+    """
+    eligible = [c for c in candidates if c['test_accuracy'] >= baseline_accuracy - max_accuracy_loss]
+    if not eligible:
+        return max(candidates, key=lambda c: (c['test_accuracy'], -c['nodes']))
+    return min(eligible, key=lambda c: (c['nodes'], -c['test_accuracy']))
+
+
+def compact_and_export(data_path='catalyst_train.csv', test_path='catalyst_test.csv', artifacts_dir=ARTIFACTS_DIR,
+                       max_accuracy_loss=0.005, depths=COMPACT_DEPTHS, row_sizes=LATENCY_ROWS):
+    """
+    Exports the smallest model whose catalyst_test.csv accuracy is within max_accuracy_loss of the default model.
+
+    The default XGBClassifier (as train_model trains it) is the accuracy and
+    latency baseline. Candidates come from early stopping, tree-count
+    truncation and depth limits (see compaction_curve). The chosen one is
+    evaluated on the usual 80/20 holdout, so its manifest metrics are
+    comparable with any other bundle, and the whole trade-off curve is
+    stored in the bundle as compaction.json. Returns the bundle directory,
+    or None if the training data is missing.
+    """
+    train_df, target_column = load_and_preprocess_data(data_path, cache=True)
+    if train_df is None:
+        return None
+    X = train_df.drop(target_column, axis=1)
+    y = train_df[target_column]
+    X_train, X_holdout, y_train, y_holdout = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    test_df = pd.read_csv(test_path).dropna(subset=[target_column])
+    X_test = FeatureEncoder(X.columns).encode_frame(test_df.drop(columns=[target_column]))
+    y_test = label_to_binary(test_df[target_column])
+
+    baseline = XGBClassifier(eval_metric='logloss').fit(X_train, y_train)
+    reference = {
+        'max_depth': 6,
+        'n_trees': baseline.get_booster().num_boosted_rounds(),
+        'nodes': model_nodes(baseline.get_booster()),
+        'test_accuracy': float(np.mean(baseline.predict(X_test) == y_test)),
+        'latency': measure_latency(baseline, X_test, row_sizes),
+    }
+    print(f"Default model: {reference['n_trees']} trees, {reference['nodes']} nodes, "
+          f"test accuracy {reference['test_accuracy']:.4f}")
+
+    candidates = compaction_curve(X_train.to_numpy(dtype=np.float32), y_train.to_numpy(), X_test, y_test,
+                                  depths=depths, row_sizes=row_sizes)
+    chosen = select_compact(candidates, reference['test_accuracy'], max_accuracy_loss)
+    model = chosen['booster']
+    print(f"Chosen: depth {chosen['max_depth']}, {chosen['n_trees']} trees, {chosen['nodes']} nodes "
+          f"({chosen['nodes'] / reference['nodes']:.1%} of the default), test accuracy {chosen['test_accuracy']:.4f}")
+
+    fairness_seed = FairnessAggregator()
+    metrics = evaluate_model(model, X_holdout, y_holdout, load_sensitive_features(data_path, X_holdout.index),
+                             fairness_seed)
+
+    curve = [{k: v for k, v in c.items() if k != 'booster'} for c in candidates]
+    compaction = {
+        'max_accuracy_loss': max_accuracy_loss,
+        'test_data': test_path,
+        'row_sizes': list(row_sizes),
+        'reference': reference,
+        'chosen': {k: v for k, v in chosen.items() if k != 'booster'},
+        'candidates': curve,
+    }
+    drift_profile = DriftProfile.build([pd.read_csv(data_path)], X.columns)
+    bundle_path = save_bundle(model, X.columns, metrics, data_path, data_hash=file_sha256(data_path),
+                              artifacts_dir=artifacts_dir,
+                              extra_manifest={'training': {'mode': 'compact', 'max_depth': chosen['max_depth'],
+                                                           'n_estimators': chosen['n_trees'],
+                                                           'test_accuracy': chosen['test_accuracy'],
+                                                           'reference_test_accuracy': reference['test_accuracy'],
+                                                           'max_accuracy_loss': max_accuracy_loss},
+                                              'fairness_seed': fairness_seed.counts()},
+                              extra_files={COMPACTION_FILE: compaction,
+                                           DRIFT_PROFILE_FILE: drift_profile.to_dict()})
+    print(f"Model bundle exported to {bundle_path}")
+    return bundle_path
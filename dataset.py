@@ -1,89 +1,207 @@
+import argparse
+import math
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
 import pandas as pd
 import numpy as np
 
-def generate_catalyst_dataset(num_records):
+# Rows drawn from one RNG stream. Blocks, not workers, own the random streams,
+# so the output only depends on the seed and the number of rows.
+BLOCK_ROWS = 100_000
+
+OUTPUT_FORMATS = ('csv', 'parquet')
+
+
+def _dataset_params(entropy):
+    """
+    Draws the values that are shared by every row of a dataset.
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(0,)))
+    return {
+        'volume_offset': int(rng.integers(50, 200)),
+        'engagement': float(rng.uniform(0, 1)),  # Placeholder for 'Engagement Score'
+    }
+
+
+def _generate_block(entropy, index, num_records, params):
+    """
+    Generates the rows of one block and their raw score, without the target column.
+    """
+    start = index * BLOCK_ROWS
+    n = min(BLOCK_ROWS, num_records - start)
+    rng = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(1, index)))
+
+    partner_ids = '00' + pd.Series(np.arange(start + 1, start + n + 1)).astype(str).str.zfill(3)
+    is_driver = rng.random(n) < 0.7
+    partner_type = np.where(is_driver, 'Driver', 'Merchant')
+    earnings = rng.integers(np.where(is_driver, 1000, 800), np.where(is_driver, 2500, 2000))
+    stability = rng.choice(np.array(['Stable', 'Seasonal', 'Variable']), size=n, p=[0.6, 0.2, 0.2])
+    months = rng.integers(1, 48, size=n)
+
+    rating = np.round(np.clip(4.0 + (months / 48 * 0.9) + rng.normal(0, 0.2, n), 3.0, 5.0), 1)
+    volume = (earnings * rng.uniform(0.15, 0.25, n) + params['volume_offset']).astype(int)
+    financial = np.round(np.clip(
+        (earnings / 2500 * 0.6) + (months / 48 * 0.3) + rng.uniform(-0.1, 0.1, n), 0, 1), 2)
+    volatility = np.round(np.clip(1 - (earnings / 2500) - rng.uniform(0, 0.3, n), 0.1, 0.9), 2)
+    repayments = np.clip(financial * 20 + rng.integers(-2, 3, n), 0, 15).astype(int)
+    anomaly = np.round(np.clip(1 - (rating / 5) + rng.uniform(-0.1, 0.2, n), 0, 1), 2)
+
+    # Calculate the raw score based on the provided formula
+    raw_score = (
+        rating * 0.18 +
+        financial * 0.28 +
+        (months / 60) * 0.12 +
+        (1 - volatility) * 0.08 +
+        (repayments / 20) * 0.08 +
+        (1 - anomaly) * 0.18 +
+        params['engagement'] * 0.08 +
+        (earnings / 2500) * 0.05
+    )
+
+    df = pd.DataFrame({
+        "Partner ID": partner_ids.to_numpy(),
+        "Partner Type": partner_type,
+        "Earnings (Value)": earnings,
+        "Earnings (Stability Type)": stability,
+        "Perf. Rating (Avg)": rating,
+        "Time on Platform (Months)": months,
+        "Order/Trip Volume": volume,
+        "Financial Activity (Score)": financial,
+        "Earnings Volatility": volatility,
+        "On-Time Loan Repayments": repayments,
+        "Operational Anomaly Score": anomaly,
+    }, index=pd.RangeIndex(start, start + n))
+    return df, raw_score
+
+
+def _block_score_sum(entropy, index, num_records, params):
+    return float(_generate_block(entropy, index, num_records, params)[1].sum())
+
+
+def _write_block(entropy, index, num_records, params, threshold, directory, fmt):
+    df, raw_score = _generate_block(entropy, index, num_records, params)
+    df['Creditworthy'] = (raw_score > threshold).astype(int)
+    part = os.path.join(directory, f'part-{index:05d}.{fmt}')
+    if fmt == 'parquet':
+        df.to_parquet(part, index=False)
+    else:
+        df.to_csv(part, index=False, header=index == 0)
+    return part
+
+
+def _num_blocks(num_records):
+    return -(-num_records // BLOCK_ROWS)
+
+
+def generate_catalyst_dataset(num_records, seed=None):
     """
     Generates a synthetic dataset for the Catalyst Score Platform.
     
     Args:
         num_records (int): The number of rows to generate.
+        seed (int, optional): Seed for reproducible output. Random if None.
     
     Returns:
         pandas.DataFrame: The generated synthetic dataset.
     """
-    columns = [
-        "Partner ID", "Partner Type", "Earnings (Value)", "Earnings (Stability Type)",
-        "Perf. Rating (Avg)", "Time on Platform (Months)", "Order/Trip Volume",
-        "Financial Activity (Score)", "Earnings Volatility",
-        "On-Time Loan Repayments", "Operational Anomaly Score"
-    ]
-    df = pd.DataFrame(index=range(num_records), columns=columns)
-
-    df['Partner ID'] = [f'00{i:03d}' for i in range(1, num_records + 1)]
-    df['Partner Type'] = np.random.choice(['Driver', 'Merchant'], size=num_records, p=[0.7, 0.3])
-
-    df['Earnings (Value)'] = df['Partner Type'].apply(
-        lambda x: np.random.randint(1000, 2500) if x == 'Driver' else np.random.randint(800, 2000)
-    )
+    entropy = np.random.SeedSequence(seed).entropy
+    params = _dataset_params(entropy)
+    blocks = [_generate_block(entropy, i, num_records, params) for i in range(_num_blocks(num_records))]
+    if not blocks:
+        return pd.DataFrame(columns=list(_generate_block(entropy, 0, 1, params)[0].columns) + ['Creditworthy'])
 
-    df['Earnings (Stability Type)'] = df['Partner Type'].apply(
-        lambda x: np.random.choice(['Stable', 'Seasonal', 'Variable'], p=[0.6, 0.2, 0.2])
-    )
-    
-    df['Time on Platform (Months)'] = np.random.randint(1, 48, size=num_records)
-    
-    df['Perf. Rating (Avg)'] = (
-        4.0 + (df['Time on Platform (Months)'] / 48 * 0.9) + np.random.normal(0, 0.2, num_records)
-    ).clip(3.0, 5.0).round(1)
+    df = pd.concat([block for block, _ in blocks])
+    raw_score = np.concatenate([score for _, score in blocks])
 
-    df['Order/Trip Volume'] = (
-        df['Earnings (Value)'] * np.random.uniform(0.15, 0.25, num_records) + np.random.randint(50, 200)
-    ).astype(int)
-    
-    df['Financial Activity (Score)'] = (
-        (df['Earnings (Value)'] / 2500 * 0.6) + 
-        (df['Time on Platform (Months)'] / 48 * 0.3) + 
-        np.random.uniform(-0.1, 0.1, num_records)
-    ).clip(0, 1).round(2)
-
-    df['Earnings Volatility'] = (
-        1 - (df['Earnings (Value)'] / 2500) - np.random.uniform(0, 0.3, num_records)
-    ).clip(0.1, 0.9).round(2)
-
-    df['On-Time Loan Repayments'] = (
-        df['Financial Activity (Score)'] * 20 + np.random.randint(-2, 3, num_records)
-    ).clip(0, 15).astype(int)
-    
-    df['Operational Anomaly Score'] = (
-        1 - (df['Perf. Rating (Avg)'] / 5) + np.random.uniform(-0.1, 0.2, num_records)
-    ).clip(0, 1).round(2)
-    
-    # Calculate the raw score based on the provided formula
-    df['Raw Score'] = (
-        df['Perf. Rating (Avg)'] * 0.18 +
-        df['Financial Activity (Score)'] * 0.28 +
-        (df['Time on Platform (Months)'] / 60) * 0.12 +
-        (1 - df['Earnings Volatility']) * 0.08 +
-        (df['On-Time Loan Repayments'] / 20) * 0.08 +
-        (1 - df['Operational Anomaly Score']) * 0.18 +
-        np.random.uniform(0, 1) * 0.08 + # Placeholder for 'Engagement Score'
-        (df['Earnings (Value)'] / 2500) * 0.05
-    )
-    
-    # Create the binary target variable 'Creditworthy'
-    df['Creditworthy'] = (df['Raw Score'] > df['Raw Score'].mean()).astype(int)
+    # Create the binary target variable 'Creditworthy' against the dataset mean
+    threshold = math.fsum(score.sum() for _, score in blocks) / num_records
+    df['Creditworthy'] = (raw_score > threshold).astype(int)
+    return df
 
-    # Drop the intermediate raw score column
-    df = df.drop(columns=['Raw Score'])
 
-    return df
+def write_catalyst_dataset(path, num_records, seed=None, fmt=None, workers=None):
+    """
+    Generates a dataset block by block across a process pool and writes it to disk.
+
+    CSV output is a single file; Parquet output is a directory of part files
+    that pd.read_parquet reads back in order. The rows are identical to
+    generate_catalyst_dataset(num_records, seed) whatever the number of workers.
+    The 'Creditworthy' threshold needs the mean raw score of the whole dataset,
+    so blocks are generated twice: once to sum their scores, once to write them.
+    Returns the output path.
+    """
+    if fmt is None:
+        fmt = 'parquet' if path.endswith('.parquet') else 'csv'
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{fmt}'. Expected one of {OUTPUT_FORMATS}.")
+    if num_records < 1:
+        raise ValueError("num_records must be at least 1.")
+
+    entropy = np.random.SeedSequence(seed).entropy
+    params = _dataset_params(entropy)
+    n_blocks = _num_blocks(num_records)
+    workers = max(1, min(workers or os.cpu_count() or 1, n_blocks))
+    block_args = (repeat(entropy), range(n_blocks), repeat(num_records), repeat(params))
+
+    target_dir = os.path.dirname(os.path.abspath(path))
+    os.makedirs(target_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.dataset-', dir=target_dir)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    mapper = pool.map if pool is not None else map
+    try:
+        threshold = math.fsum(mapper(_block_score_sum, *block_args)) / num_records
+        block_args = (repeat(entropy), range(n_blocks), repeat(num_records), repeat(params))
+        parts = list(mapper(_write_block, *block_args, repeat(threshold), repeat(staging), repeat(fmt)))
+
+        if fmt == 'parquet':
+            # A directory cannot replace a file, nor a non-empty directory
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+            os.replace(staging, path)
+        else:
+            tmp = os.path.join(staging, 'combined.csv')
+            with open(tmp, 'wb') as out:
+                for part in parts:
+                    with open(part, 'rb') as f:
+                        shutil.copyfileobj(f, out, 1 << 20)
+            os.replace(tmp, path)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        shutil.rmtree(staging, ignore_errors=True)
+    return path
+
+
+def main(argv=None):
+    """
+    Generates the training, testing and user datasets, or one large dataset with --rows.
+    """
+    parser = argparse.ArgumentParser(description="Generate synthetic Catalyst Score datasets.")
+    parser.add_argument('--rows', type=int, default=None,
+                        help="Write a single dataset with this many rows instead of the default files.")
+    parser.add_argument('--output', default='catalyst_data.csv', help="Output path used with --rows.")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default=None,
+                        help="Output format (inferred from the extension by default).")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for reproducible output.")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (defaults to all cores).")
+    args = parser.parse_args(argv)
+
+    if args.rows is not None:
+        write_catalyst_dataset(args.output, args.rows, seed=args.seed, fmt=args.format, workers=args.workers)
+        print(f"Dataset created: {args.output} ({args.rows} rows)")
+        return 0
 
-# Main logic to generate datasets
-if __name__ == '__main__':
     # Generate training, testing, and user datasets with specified sizes
-    train_df = generate_catalyst_dataset(num_records=10000)
-    test_df = generate_catalyst_dataset(num_records=2000)
-    user_df = generate_catalyst_dataset(num_records=1)
+    seeds = [None] * 3 if args.seed is None else [args.seed, args.seed + 1, args.seed + 2]
+    train_df = generate_catalyst_dataset(num_records=10000, seed=seeds[0])
+    test_df = generate_catalyst_dataset(num_records=2000, seed=seeds[1])
+    user_df = generate_catalyst_dataset(num_records=1, seed=seeds[2])
 
     # Save the datasets to CSV files
     train_df.to_csv('catalyst_train.csv', index=False)
@@ -94,3 +212,8 @@ if __name__ == '__main__':
     print(f"Training dataset: catalyst_train.csv ({len(train_df)} rows)")
     print(f"Testing dataset: catalyst_test.csv ({len(test_df)} rows)")
     print(f"User input dataset: user_input.csv ({len(user_df)} rows)")
+    return 0
+
+# Main logic to generate datasets
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,288 @@
+import json
+import os
+import threading
+from bisect import bisect_right
+
+import numpy as np
+import pandas as pd
+
+from feature_encoder import FeatureEncoder
+
+# File of the training-time reference profile inside a model bundle
+DRIFT_PROFILE_FILE = 'drift_profile.json'
+DRIFT_PROFILE_VERSION = 1
+
+# Quantile bins of every numeric feature in the reference profile
+DRIFT_BINS = 10
+
+# Usual PSI reading: below 0.1 stable, up to 0.25 moderate shift, above that significant
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+
+# Smallest bin proportion used in PSI, so empty bins do not make it infinite
+PSI_FLOOR = 1e-4
+
+
+class DriftProfile:
+    """
+    Fixed-size sketch of the distribution of every model input feature.
+
+    Numeric features are counted in fixed bins (cut at the reference data's
+    deciles), categorical ones per category, and missing values separately.
+    The sketch only holds counts, so it takes constant memory however many
+    rows it has seen, and two sketches with the same bins can be compared in
+    time proportional to the number of bins.
+    """
+
+    def __init__(self, edges, categories=(), rows=0, numeric_counts=None, categorical_counts=None, missing=None):
+        self.edges = {field: [float(edge) for edge in cuts] for field, cuts in edges.items()}
+        # Values are binned in float32, as typed uploads parse them, so 4.3 falls in the same bin either way
+        self._edge_arrays = {field: np.asarray(cuts, dtype=np.float32) for field, cuts in self.edges.items()}
+        self._edge_lists = {field: cuts.tolist() for field, cuts in self._edge_arrays.items()}
+        self.categorical_fields = list(categories)
+        self.rows = int(rows)
+        self.numeric_counts = {field: np.asarray((numeric_counts or {}).get(field, np.zeros(len(cuts) + 1)),
+                                                 dtype=np.int64)
+                               for field, cuts in self.edges.items()}
+        self.categorical_counts = {field: dict((categorical_counts or {}).get(field, {}))
+                                   for field in self.categorical_fields}
+        self.missing = {field: int((missing or {}).get(field, 0)) for field in self.fields}
+
+    @property
+    def fields(self):
+        return list(self.edges) + self.categorical_fields
+
+    @classmethod
+    def build(cls, chunks, feature_columns, bins=DRIFT_BINS):
+        """
+        Builds the reference profile from raw training DataFrames (the whole file, or chunks of it).
+
+        The bin edges are the quantiles of the first chunk, so pass the data in
+        one piece, or in large chunks, when it fits in memory.
+        """
+        encoder = FeatureEncoder(feature_columns)
+        profile = None
+        for chunk in chunks:
+            if profile is None:
+                edges = {}
+                for field in encoder.numeric_index:
+                    values = pd.to_numeric(chunk[field], errors='coerce').dropna() if field in chunk.columns \
+                        else pd.Series(dtype=np.float64)
+                    cuts = np.unique(values.quantile(np.arange(1, bins) / bins).to_numpy()) if len(values) else []
+                    edges[field] = cuts
+                profile = cls(edges, encoder.categorical_index)
+            profile.update_frame(chunk)
+        return profile
+
+    def empty_copy(self):
+        """
+        A sketch with the same bins and no rows, for the traffic compared with this profile.
+        """
+        return DriftProfile(self.edges, self.categorical_fields)
+
+    def update_frame(self, df):
+        """
+        Counts every row of a DataFrame of raw records, one vectorized pass per feature.
+        """
+        self.rows += len(df)
+        for field, cuts in self._edge_arrays.items():
+            if field not in df.columns:
+                self.missing[field] += len(df)
+                continue
+            values = pd.to_numeric(df[field], errors='coerce').to_numpy(dtype=np.float32, na_value=np.nan)
+            present = ~np.isnan(values)
+            self.missing[field] += int(len(values) - present.sum())
+            self.numeric_counts[field] += np.bincount(np.searchsorted(cuts, values[present], side='right'),
+                                                      minlength=len(cuts) + 1)
+        for field in self.categorical_fields:
+            if field not in df.columns:
+                self.missing[field] += len(df)
+                continue
+            column = df[field]
+            self.missing[field] += int(column.isna().sum())
+            counts = self.categorical_counts[field]
+            # value_counts of a categorical column counts its codes, with no string conversion per row
+            observed = column.value_counts() if isinstance(column.dtype, pd.CategoricalDtype) \
+                else column.dropna().astype(str).value_counts()
+            for category, count in observed.items():
+                if count:
+                    counts[str(category)] = counts.get(str(category), 0) + int(count)
+
+    def update_record(self, record):
+        """
+        Counts a single JSON record, without building a DataFrame.
+        """
+        self.rows += 1
+        for field, cuts in self._edge_lists.items():
+            value = record.get(field)
+            try:
+                value = float(np.float32(value))
+            except (TypeError, ValueError):
+                value = float('nan')
+            if value != value:
+                self.missing[field] += 1
+            else:
+                self.numeric_counts[field][bisect_right(cuts, value)] += 1
+        for field in self.categorical_fields:
+            value = record.get(field)
+            if value is None:
+                self.missing[field] += 1
+            else:
+                counts = self.categorical_counts[field]
+                counts[str(value)] = counts.get(str(value), 0) + 1
+
+    def merge(self, other):
+        """
+        Adds the counts of a sketch with the same bins (another worker's, for example) to this one.
+        """
+        self.rows += other.rows
+        for field in self.edges:
+            self.numeric_counts[field] += other.numeric_counts[field]
+        for field in self.categorical_fields:
+            counts = self.categorical_counts[field]
+            for category, count in other.categorical_counts[field].items():
+                counts[category] = counts.get(category, 0) + count
+        for field in self.fields:
+            self.missing[field] += other.missing[field]
+
+    def distribution(self, field, categories=None):
+        """
+        Returns the proportions of a feature's bins (or of the given categories) plus the missing share.
+        """
+        if field in self.edges:
+            counts = list(self.numeric_counts[field])
+        else:
+            counts = [self.categorical_counts[field].get(category, 0) for category in categories]
+        counts = np.asarray(counts + [self.missing[field]], dtype=np.float64)
+        total = counts.sum()
+        return counts / total if total else counts
+
+    def to_dict(self):
+        return {
+            'format_version': DRIFT_PROFILE_VERSION,
+            'rows': self.rows,
+            'numeric': {field: {'edges': self.edges[field], 'counts': self.numeric_counts[field].tolist(),
+                                'missing': self.missing[field]} for field in self.edges},
+            'categorical': {field: {'counts': self.categorical_counts[field], 'missing': self.missing[field]}
+                            for field in self.categorical_fields},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        numeric, categorical = data['numeric'], data['categorical']
+        missing = {field: entry['missing'] for field, entry in list(numeric.items()) + list(categorical.items())}
+        return cls({field: entry['edges'] for field, entry in numeric.items()}, list(categorical), data['rows'],
+                   {field: entry['counts'] for field, entry in numeric.items()},
+                   {field: entry['counts'] for field, entry in categorical.items()}, missing)
+
+    @classmethod
+    def load(cls, bundle_path):
+        """
+        Loads the reference profile of a bundle, or returns None if the bundle has none.
+        """
+        path = os.path.join(bundle_path, DRIFT_PROFILE_FILE)
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+class DriftMonitor:
+    """
+    Compares the features of scored traffic with the training-time reference profile.
+
+    Every scored row updates a DriftProfile with the reference's bins, and
+    report() computes the population stability index of each feature and,
+    for numeric ones, the Kolmogorov-Smirnov distance between the binned
+    distributions. Both only read the bin counts, so the report costs the
+    same after a hundred rows or a hundred million.
+    """
+
+    def __init__(self, reference, model_version=None):
+        self.reference = reference
+        self.model_version = model_version
+        self.live = reference.empty_copy()
+        self._lock = threading.Lock()
+
+    def update_frame(self, df):
+        with self._lock:
+            self.live.update_frame(df)
+
+    def update_record(self, record):
+        with self._lock:
+            self.live.update_record(record)
+
+    def snapshot(self):
+        """
+        Returns the live counts as a JSON-serializable dict, the form published to the other workers.
+        """
+        with self._lock:
+            return {'model_version': self.model_version, 'live': self.live.to_dict()}
+
+    def report(self, snapshots=()):
+        """
+        Returns the per-feature drift scores of the traffic seen so far.
+
+        snapshots are snapshot() dicts of other serve.py workers; those of the
+        same model version are added to this worker's counts.
+        """
+        with self._lock:
+            live = DriftProfile.from_dict(self.live.to_dict())
+        for snapshot in snapshots:
+            if snapshot.get('model_version') == self.model_version:
+                live.merge(DriftProfile.from_dict(snapshot['live']))
+
+        features = {}
+        for field in self.reference.fields:
+            categories = None
+            if field in self.reference.categorical_counts:
+                categories = sorted(set(self.reference.categorical_counts[field]) | set(live.categorical_counts[field]))
+            expected = self.reference.distribution(field, categories)
+            actual = live.distribution(field, categories)
+            entry = {'psi': population_stability_index(expected, actual) if live.rows else None}
+            if categories is None:
+                # Largest gap between the cumulative shares at the bin edges (missing values excluded)
+                entry['ks'] = ks_distance(expected[:-1], actual[:-1]) if live.rows else None
+            else:
+                entry['unseen_categories'] = sorted(set(categories) - set(self.reference.categorical_counts[field]))
+            entry['missing_rate'] = float(actual[-1]) if live.rows else None
+            entry['status'] = drift_status(entry['psi'])
+            features[field] = entry
+
+        return {
+            'model_version': self.model_version,
+            'rows': live.rows,
+            'reference_rows': self.reference.rows,
+            'features': features,
+            'drifted_features': [field for field, entry in features.items() if entry['status'] == 'significant'],
+            'thresholds': {'moderate': PSI_MODERATE, 'significant': PSI_SIGNIFICANT},
+        }
+
+
+def population_stability_index(expected, actual):
+    """
+    PSI of two arrays of bin proportions: sum of (actual - expected) * ln(actual / expected).
+    """
+    expected = np.maximum(np.asarray(expected, dtype=np.float64), PSI_FLOOR)
+    actual = np.maximum(np.asarray(actual, dtype=np.float64), PSI_FLOOR)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def ks_distance(expected, actual):
+    """
+    Largest absolute difference between the cumulative distributions of two binned samples.
+    """
+    expected, actual = np.asarray(expected, dtype=np.float64), np.asarray(actual, dtype=np.float64)
+    if expected.sum() == 0 or actual.sum() == 0:
+        return None
+    return float(np.max(np.abs(np.cumsum(expected) / expected.sum() - np.cumsum(actual) / actual.sum())))
+
+
+def drift_status(psi):
+    if psi is None:
+        return 'no data'
+    if psi >= PSI_SIGNIFICANT:
+        return 'significant'
+    if psi >= PSI_MODERATE:
+        return 'moderate'
+    return 'stable'
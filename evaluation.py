@@ -0,0 +1,53 @@
+import pandas as pd
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
+
+from fairness import SENSITIVE_COLUMN, FairnessAggregator
+
+
+def evaluate_model(model, X_test, y_test, sensitive_features=None, fairness_counts=None):
+    """
+    Evaluates the trained model using key metrics.
+    Returns the metrics as a dictionary. If a FairnessAggregator is given as
+    fairness_counts, the per-group counts of the test rows are added to it.
+    """
+    y_pred = model.predict(X_test)
+    evaluation_metrics = {
+        'accuracy': accuracy_score(y_test, y_pred),
+        'precision': precision_score(y_test, y_pred),
+        'recall': recall_score(y_test, y_pred),
+        'f1_score': f1_score(y_test, y_pred)
+    }
+
+    # Group fairness counters (if a sensitive attribute exists)
+    sensitive_attr = sensitive_features
+    if sensitive_attr is None:
+        # Try common sensitive attribute names
+        for col in ['gender', 'Gender', 'partner_gender', 'Partner Gender']:
+            if col in X_test.columns:
+                sensitive_attr = X_test[col]
+                break
+    if sensitive_attr is not None:
+        counts = FairnessAggregator()
+        counts.update_batch(sensitive_attr, y_pred, y_test)
+        if fairness_counts is not None:
+            fairness_counts.merge(counts)
+        report = counts.report()
+        print("\nFairness metrics by group:")
+        print(pd.DataFrame({'selection_rate': report['selection_rate'],
+                            'equal_opportunity': report['equal_opportunity']}))
+    else:
+        print("No sensitive attribute found for group fairness metrics.")
+    return evaluation_metrics
+
+
+def load_sensitive_features(data_path, index):
+    """
+    Reads the raw sensitive attribute column for the given rows of the training data.
+    load_and_preprocess_data keeps the CSV row numbers as index, so the test
+    split's index selects the matching raw values. Returns None if the column
+    does not exist.
+    """
+    raw = pd.read_csv(data_path, usecols=lambda col: col == SENSITIVE_COLUMN)
+    if SENSITIVE_COLUMN not in raw.columns:
+        return None
+    return raw[SENSITIVE_COLUMN].loc[index]
@@ -0,0 +1,130 @@
+import threading
+
+import numpy as np
+import xgboost as xgb
+
+
+class ContributionExplainer:
+    """
+    Exact TreeSHAP contributions of an XGBoost model, per raw input feature.
+
+    XGBoost computes the contributions of a whole batch in one pass over the
+    booster (pred_contribs=True), in log-odds. The per-column contributions of
+    a one-hot encoded feature are then summed back into that feature with a
+    single matrix product, so 'Partner Type' gets one value, not one per
+    category. For every row, base_value plus the sum of the contributions is
+    the model's margin.
+
+    The base value (the expected margin) is the same for every row and is
+    computed once per explainer; ServingModel keeps one explainer per model
+    version. explain() returns (contributions, probabilities); pass the
+    tuple to records() as is.
+    """
+
+    def __init__(self, model, encoder, input_columns=None):
+        if hasattr(model, 'get_booster'):
+            model = model.get_booster()
+        if not isinstance(model, xgb.Booster):
+            raise ValueError("Explanations need an XGBoost model; export a model bundle with train_and_export_model.py.")
+        self.booster = model
+        self.feature_names = self.booster.feature_names
+
+        # Raw features in the column order of the training CSV, then any the CSV header did not list
+        fields = encoder.input_fields
+        self.features = [c for c in (input_columns or []) if c in fields]
+        self.features += [f for f in fields if f not in self.features]
+
+        # (n_encoded_columns, n_raw_features) 0/1 matrix mapping encoded columns to their raw feature
+        self.groups = np.zeros((encoder.n_features, len(self.features)), dtype=np.float64)
+        position = {feature: j for j, feature in enumerate(self.features)}
+        for feature, idx in encoder.numeric_index.items():
+            self.groups[idx, position[feature]] = 1.0
+        for feature, categories in encoder.categorical_index.items():
+            for idx in categories.values():
+                self.groups[idx, position[feature]] = 1.0
+
+        self._base_value = None
+        self._lock = threading.Lock()
+
+    @property
+    def base_value(self):
+        """
+        Expected margin of the model, the starting point every explanation adds up from.
+        """
+        if self._base_value is None:
+            with self._lock:
+                if self._base_value is None:
+                    probe = np.zeros((1, self.groups.shape[0]), dtype=np.float32)
+                    self._base_value = float(self._raw_contributions(probe)[0, -1])
+        return self._base_value
+
+    def explain(self, X):
+        """
+        Returns (contributions, probabilities) of an encoded (n_rows, n_encoded_columns) matrix.
+
+        contributions is an (n_rows, n_features) float64 array, one column per
+        raw feature in self.features order.
+        """
+        raw = self._raw_contributions(X)
+        contributions = raw[:, :-1] @ self.groups
+        # The last column is the bias; the row sum is the margin the model turns into a probability
+        margins = raw.sum(axis=1)
+        return contributions, 1.0 / (1.0 + np.exp(-margins))
+
+    def records(self, contributions, probabilities, base_values=None):
+        """
+        Turns explain() output into one JSON-ready dict per row, features ranked by impact.
+        """
+        if base_values is None:
+            base_values = np.full(len(probabilities), self.base_value)
+        records = []
+        for row, probability, base_value in zip(contributions.tolist(), probabilities.tolist(), base_values.tolist()):
+            records.append({
+                'prediction': "Eligible" if probability > 0.5 else "Not Eligible",
+                'probability': probability,
+                'base_value': base_value,
+                'contributions': dict(zip(self.features, row)),
+                'top_features': [self.features[j] for j in sorted(range(len(row)), key=lambda j: -abs(row[j]))]
+            })
+        return records
+
+    def _raw_contributions(self, X):
+        matrix = xgb.DMatrix(np.asarray(X, dtype=np.float32), feature_names=self.feature_names)
+        return self.booster.predict(matrix, pred_contribs=True).astype(np.float64)
+
+
+class SegmentedExplainer(ContributionExplainer):
+    """
+    TreeSHAP contributions of a SegmentedModel, each row explained by the model that scores it.
+
+    Rows are split with the same one-hot masks SegmentedModel routes them
+    by, every sub-batch is explained by its segment's ContributionExplainer
+    and the results are scattered back into the original row order. The
+    base value differs between segments, so explain() also returns the base
+    value of every row and base_value is None.
+    """
+
+    def __init__(self, segmented, encoder, input_columns=None):
+        self.segmented = segmented
+        self.explainers = [ContributionExplainer(model, encoder, input_columns) for model in segmented.models]
+        self.features = self.explainers[0].features
+
+    @property
+    def base_value(self):
+        return None
+
+    def explain(self, X):
+        """
+        Returns (contributions, probabilities, base_values) of an encoded matrix.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        numbers = self.segmented.segment_numbers(X)
+        contributions = np.empty((len(X), len(self.features)), dtype=np.float64)
+        probabilities = np.empty(len(X), dtype=np.float64)
+        base_values = np.empty(len(X), dtype=np.float64)
+        for number in np.unique(numbers):
+            rows = np.flatnonzero(numbers == number)
+            explainer = self.explainers[number]
+            contributions[rows], probabilities[rows] = explainer.explain(X[rows])
+            base_values[rows] = explainer.base_value
+        return contributions, probabilities, base_values
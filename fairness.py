@@ -0,0 +1,250 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Attribute the group fairness metrics are reported over
+SENSITIVE_COLUMN = 'Partner Type'
+
+# Selection-rate gap above which mitigation is recommended
+GAP_THRESHOLD = 0.1
+
+# Per-group counters: every scored row, the rows predicted 'Eligible', and the
+# confusion matrix of the rows that came with a ground-truth label
+COUNTERS = ('scored', 'selected', 'tp', 'fp', 'tn', 'fn')
+
+# Seconds between two saves of the served model's counters, if they changed
+FAIRNESS_SAVE_SECONDS = float(os.environ.get('NOVA_FAIRNESS_SAVE_SECONDS', '5'))
+
+
+def label_to_binary(labels):
+    """
+    Converts ground-truth labels to a float array of 1/0, NaN where a label is missing.
+
+    Strings such as 'Eligible', 'true' or 'yes' count as positive, like the
+    conversion /predict_csv always applied to non-numeric labels.
+    """
+    labels = pd.Series(labels)
+    if pd.api.types.is_numeric_dtype(labels):
+        return labels.to_numpy(dtype=np.float64, na_value=np.nan)
+    positive = labels.astype(str).str.lower().isin(['eligible', '1', 'true', 'yes'])
+    return np.where(labels.isna(), np.nan, positive.astype(np.float64))
+
+
+class FairnessAggregator:
+    """
+    Running per-group confusion-matrix counters for group fairness metrics.
+
+    Each scored row updates a handful of integers of its group, so the
+    selection rate and true positive rate of every group, and the gaps
+    between groups, are always available without rescanning any data. The
+    counters can be persisted to a JSON file; updates never write it, a
+    FairnessSaver does.
+    """
+
+    def __init__(self, sensitive_column=SENSITIVE_COLUMN, model_version=None, counts=None, path=None):
+        self.sensitive_column = sensitive_column
+        self.model_version = model_version
+        self.path = path
+
+        self._counts = {}
+        for group, values in (counts or {}).items():
+            self._counts[group] = {name: int(values.get(name, 0)) for name in COUNTERS}
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    def update(self, group, prediction, label=None):
+        """
+        Counts one scored row; label is the ground truth (1/0) if known.
+        """
+        group = 'Unknown' if group is None else str(group)
+        selected = int(prediction) == 1
+        with self._lock:
+            counts = self._counts.get(group)
+            if counts is None:
+                counts = self._counts[group] = dict.fromkeys(COUNTERS, 0)
+            counts['scored'] += 1
+            counts['selected'] += selected
+            if label is not None and not pd.isna(label):
+                positive = int(label) == 1
+                counts['tp' if positive and selected else 'fn' if positive else 'fp' if selected else 'tn'] += 1
+            self._dirty = True
+
+    def update_batch(self, groups, predictions, labels=None):
+        """
+        Counts many scored rows at once; labels may contain NaN for unlabeled rows.
+        """
+        groups = pd.Series(groups, dtype=object)
+        groups = groups.where(groups.notna(), 'Unknown').astype(str).to_numpy()
+        if len(groups) == 0:
+            return
+        names, inverse = np.unique(groups, return_inverse=True)
+        selected = np.asarray(predictions).astype(np.int64) == 1
+        batch = {
+            'scored': np.bincount(inverse, minlength=len(names)),
+            'selected': np.bincount(inverse, weights=selected, minlength=len(names)),
+        }
+        if labels is not None:
+            labels = label_to_binary(labels)
+            labeled = ~np.isnan(labels)
+            positive = labels == 1
+            for name, mask in (('tp', positive & selected), ('fn', positive & ~selected),
+                               ('fp', labeled & ~positive & selected), ('tn', labeled & ~positive & ~selected)):
+                batch[name] = np.bincount(inverse, weights=mask, minlength=len(names))
+
+        with self._lock:
+            for i, group in enumerate(names):
+                counts = self._counts.get(group)
+                if counts is None:
+                    counts = self._counts[group] = dict.fromkeys(COUNTERS, 0)
+                for name, values in batch.items():
+                    counts[name] += int(values[i])
+            self._dirty = True
+
+    def merge(self, other):
+        """
+        Adds the counters of another aggregator to this one.
+        """
+        with self._lock:
+            for group, values in other.counts().items():
+                counts = self._counts.setdefault(group, dict.fromkeys(COUNTERS, 0))
+                for name in COUNTERS:
+                    counts[name] += values[name]
+            self._dirty = True
+
+    def combined(self, snapshots):
+        """
+        Returns a new aggregator with these counters plus those of to_dict() snapshots of the same model.
+        """
+        combined = FairnessAggregator(self.sensitive_column, self.model_version, self.counts())
+        for snapshot in snapshots:
+            if snapshot.get('model_version') == self.model_version:
+                combined.merge(FairnessAggregator(counts=snapshot['counts']))
+        return combined
+
+    def counts(self):
+        """
+        Returns a copy of the per-group counters.
+        """
+        with self._lock:
+            return {group: dict(values) for group, values in self._counts.items()}
+
+    def report(self):
+        """
+        Returns per-group selection rate and true positive rate, and the gaps between groups.
+        """
+        counts = self.counts()
+        selection_rate = {g: c['selected'] / c['scored'] for g, c in counts.items() if c['scored']}
+        equal_opportunity = {g: c['tp'] / (c['tp'] + c['fn']) for g, c in counts.items() if c['tp'] + c['fn']}
+
+        observation = "Not enough scored rows per group to compare approval rates yet."
+        if len(selection_rate) > 1:
+            max_group = max(selection_rate, key=selection_rate.get)
+            min_group = min(selection_rate, key=selection_rate.get)
+            diff = selection_rate[max_group] - selection_rate[min_group]
+            observation = f"{max_group} group approval rate is {diff:.2%} higher than {min_group} group."
+            if abs(diff) > GAP_THRESHOLD:
+                observation += " Mitigation recommended: Consider reweighting or post-processing."
+
+        return {
+            'sensitive_column': self.sensitive_column,
+            'model_version': self.model_version,
+            'groups': counts,
+            'selection_rate': selection_rate,
+            'equal_opportunity': equal_opportunity,
+            'selection_rate_gap': _gap(selection_rate),
+            'equal_opportunity_gap': _gap(equal_opportunity),
+            'observation': observation,
+        }
+
+    def to_dict(self):
+        return {
+            'sensitive_column': self.sensitive_column,
+            'model_version': self.model_version,
+            'counts': self.counts(),
+        }
+
+    def save(self, path=None):
+        """
+        Writes the counters to a JSON file atomically.
+        """
+        path = path or self.path
+        if path is None:
+            return
+        with self._lock:
+            self._dirty = False
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """
+        Reads counters written by save(), or returns None if the file does not exist.
+        """
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        return cls(state.get('sensitive_column', SENSITIVE_COLUMN), state.get('model_version'),
+                   state.get('counts'), path=path, **kwargs)
+
+    def save_if_changed(self):
+        """
+        Saves the counters if they changed since the last save.
+        """
+        if self.path is not None and self._dirty:
+            self.save()
+
+
+class FairnessSaver:
+    """
+    Saves the fairness counters of the served model from a background thread.
+
+    Scoring only updates the counters in memory, so no request waits on the
+    JSON file. Every interval seconds this thread saves the aggregator
+    current() returns, which changes on a hot swap, if its counters changed;
+    stop() saves it once more.
+    """
+
+    def __init__(self, current, interval=FAIRNESS_SAVE_SECONDS):
+        self.current = current
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='nova-fairness-saver', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the saver thread and saves the counters if they changed.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._save()
+
+    def _save(self):
+        fairness = self.current()
+        if fairness is not None:
+            fairness.save_if_changed()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._save()
+            except Exception as e:
+                print(f"Could not save the fairness counters: {e}")
+
+
+def _gap(rates):
+    return max(rates.values()) - min(rates.values()) if len(rates) > 1 else 0.0
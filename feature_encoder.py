@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+
+class FeatureEncoder:
+    """
+    Encodes raw partner records straight into the training feature layout.
+
+    The encoder is compiled once from the training columns. One-hot columns are
+    recognised by the '<feature>_<category>' names produced by pd.get_dummies,
+    every other column is treated as numeric. Encoding a record is then a
+    handful of dict lookups into a float32 row, with no DataFrame involved.
+    """
+
+    def __init__(self, train_columns):
+        self.columns = list(train_columns)
+        self.n_features = len(self.columns)
+
+        # field name -> column index for numeric features
+        self.numeric_index = {}
+        # field name -> {category: column index} for one-hot encoded features
+        self.categorical_index = {}
+
+        column_set = set(self.columns)
+        for i, col in enumerate(self.columns):
+            base, sep, category = col.rpartition('_')
+            if sep and base and base not in column_set:
+                self.categorical_index.setdefault(base, {})[category] = i
+            else:
+                self.numeric_index[col] = i
+
+        self._numeric_items = list(self.numeric_index.items())
+        self._categorical_items = list(self.categorical_index.items())
+
+    @property
+    def input_fields(self):
+        """
+        Names of the raw fields the encoder reads, in training column order.
+        """
+        return list(self.numeric_index) + list(self.categorical_index)
+
+    def encode_row(self, record):
+        """
+        Encodes a single JSON record (dict) into a (1, n_features) float32 row.
+
+        Missing fields are left at 0, unknown categories and extra keys are
+        ignored, matching preprocess_user_data. Numeric values that cannot be
+        converted raise a ValueError naming the offending field.
+        """
+        row = np.zeros((1, self.n_features), dtype=np.float32)
+        values = row[0]
+
+        for field, idx in self._numeric_items:
+            value = record.get(field)
+            if value is None:
+                continue
+            try:
+                values[idx] = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid value for '{field}': {value!r}. Expected a number.")
+
+        for field, categories in self._categorical_items:
+            value = record.get(field)
+            if value is None:
+                continue
+            idx = categories.get(str(value))
+            if idx is not None:
+                values[idx] = 1.0
+
+        return row
+
+    def canonical_values(self, record):
+        """
+        Returns a hashable tuple of the normalized values of every field the model reads.
+
+        Numeric values are converted to float and categories to str, so payloads
+        that only differ in number formatting, key order or fields the model
+        ignores (such as 'Partner ID') map to the same tuple.
+        """
+        values = []
+        for field, _ in self._numeric_items:
+            value = record.get(field)
+            if value is not None:
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    raise ValueError(f"Invalid value for '{field}': {value!r}. Expected a number.")
+            values.append(value)
+        for field, _ in self._categorical_items:
+            value = record.get(field)
+            values.append(None if value is None else str(value))
+        return tuple(values)
+
+    def encode_frame(self, df):
+        """
+        Encodes a DataFrame of raw records into an (n_rows, n_features) float32 matrix.
+
+        Numeric columns are coerced with pd.to_numeric (invalid values become
+        NaN and are treated as missing by XGBoost); categorical columns are
+        compared against the known categories in one vectorized pass each, on
+        the integer codes for pandas categoricals.
+        """
+        n_rows = len(df)
+        matrix = np.zeros((n_rows, self.n_features), dtype=np.float32)
+
+        for field, idx in self._numeric_items:
+            if field in df.columns:
+                matrix[:, idx] = pd.to_numeric(df[field], errors='coerce').to_numpy(dtype=np.float32, na_value=np.nan)
+
+        for field, categories in self._categorical_items:
+            if field not in df.columns:
+                continue
+            if isinstance(df[field].dtype, pd.CategoricalDtype):
+                # Compare the integer codes instead of the strings
+                codes = df[field].cat.codes.to_numpy()
+                code_of = {str(category): code for code, category in enumerate(df[field].cat.categories)}
+                for category, idx in categories.items():
+                    if category in code_of:
+                        matrix[:, idx] = codes == code_of[category]
+                continue
+            column = df[field].astype(str).to_numpy()
+            for category, idx in categories.items():
+                matrix[:, idx] = column == category
+
+        return matrix
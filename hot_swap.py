@@ -0,0 +1,396 @@
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from flask import jsonify
+
+from drift import DriftMonitor, DriftProfile
+from explain import ContributionExplainer, SegmentedExplainer
+from feature_encoder import FeatureEncoder
+from model_artifacts import ARTIFACTS_DIR, latest_bundle_path
+from segments import SegmentedModel
+from validation import SchemaValidator
+
+# Rows of the all-zero probe batch every candidate model must score before it is served
+PROBE_ROWS = 8
+
+
+class ServingModel:
+    """
+    Everything a request needs from one model, swapped in and out as a unit.
+
+    Request handlers read ModelManager.current once and use only that object,
+    so a request that started on the old model finishes on it even if a new
+    model is swapped in meanwhile.
+    """
+
+    def __init__(self, model, feature_columns, metrics=None, version=None, predictor=None, input_columns=None,
+                 manifest=None, path=None):
+        self.model = model
+        self.predictor = predictor if predictor is not None else model
+        self.feature_columns = pd.Index(feature_columns)
+        self.encoder = FeatureEncoder(self.feature_columns)
+        self.validator = SchemaValidator(self.feature_columns)
+        self.metrics = metrics or {}
+        self.version = version
+        self.input_columns = list(input_columns or [])
+        self.manifest = manifest or {}
+        self.path = path
+        self.fairness = None  # per-model FairnessAggregator, attached by main.py
+        self.drift = None  # DriftMonitor against the bundle's training-time feature profile
+        self.explained_model = model  # a SegmentedModel for segmented bundles
+        self._explainer = None
+
+    @classmethod
+    def from_bundle(cls, bundle, engine='xgboost', model_threads=0):
+        """
+        Builds the serving objects of a loaded ModelBundle.
+        """
+        model = bundle.model
+        if model_threads:
+            model.set_params(n_jobs=model_threads)
+        # The XGBoost models (segmented or not) are what /explain explains, whatever the inference engine
+        explained = bundle.segmented(model, 'xgboost', model_threads)
+        predictor = bundle.segmented(bundle.tree_ensemble(), engine, model_threads) if engine == 'numpy' else explained
+        serving = cls(model, bundle.feature_columns, bundle.metrics, version=bundle.version, predictor=predictor,
+                      input_columns=bundle.input_columns, manifest=bundle.manifest, path=bundle.path)
+        serving.explained_model = explained
+        reference = DriftProfile.load(bundle.path)
+        if reference is not None:
+            serving.drift = DriftMonitor(reference, bundle.version)
+        return serving
+
+    @property
+    def explainer(self):
+        """
+        Explainer of this model, created on the first /explain request.
+
+        Segmented bundles get a SegmentedExplainer, so every row is explained
+        by the same segment model that scores it in /predict.
+        """
+        if self._explainer is None:
+            if isinstance(self.explained_model, SegmentedModel):
+                self._explainer = SegmentedExplainer(self.explained_model, self.encoder, self.input_columns)
+            else:
+                self._explainer = ContributionExplainer(self.explained_model, self.encoder, self.input_columns)
+        return self._explainer
+
+    def check(self, reference=None):
+        """
+        Raises ValueError unless the model scores a probe batch and keeps the schema of reference.
+        """
+        if reference is not None and list(self.feature_columns) != list(reference.feature_columns):
+            raise ValueError("feature columns differ from the served model; restart the server to change the schema")
+        probe = np.zeros((PROBE_ROWS, len(self.feature_columns)), dtype=np.float32)
+        probabilities = np.asarray(self.model.predict_proba(probe))
+        if probabilities.shape != (PROBE_ROWS, 2) or not np.isfinite(probabilities).all():
+            raise ValueError(f"probe batch returned probabilities of shape {probabilities.shape}")
+        if probabilities.min() < 0 or probabilities.max() > 1:
+            raise ValueError("probe batch returned probabilities outside [0, 1]")
+        predictions = np.asarray(self.predictor.predict(probe))
+        if predictions.shape != (PROBE_ROWS,):
+            raise ValueError(f"probe batch returned predictions of shape {predictions.shape}")
+
+
+class ShadowScorer:
+    """
+    Scores copies of live traffic with a candidate model on a background thread.
+
+    submit() only queues the raw input and the live model's predictions (the
+    queue is bounded and full queues drop work instead of slowing requests).
+    The thread encodes the input with the candidate's own encoder, predicts
+    and records how often the candidate agrees with the live model and how
+    much slower or faster its predict calls are.
+    """
+
+    def __init__(self, serving, max_queue=1000):
+        self.serving = serving
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._started_at = time.time()
+        self._rows = 0
+        self._agreed = 0
+        self._batches = 0
+        self._dropped = 0
+        self._errors = 0
+        self._timed_batches = 0
+        self._live_seconds = 0.0
+        self._candidate_seconds = 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='nova-shadow-scorer', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Stops the thread after the queued work is scored.
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, features, live_predictions, live_seconds=None):
+        """
+        Queues one request for shadow scoring.
+
+        features is a single JSON record or a DataFrame of raw rows,
+        live_predictions the live model's 0/1 predictions of those rows and
+        live_seconds the duration of the live predict call, if it was timed.
+        """
+        try:
+            self._queue.put_nowait((features, np.asarray(live_predictions, dtype=bool).reshape(-1), live_seconds))
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'version': self.serving.version,
+                'shadow_seconds': time.time() - self._started_at,
+                'rows': self._rows,
+                'batches': self._batches,
+                'agreement_rate': self._agreed / self._rows if self._rows else None,
+                'live_predict_ms_mean': (self._live_seconds * 1000 / self._timed_batches
+                                         if self._timed_batches else None),
+                'candidate_predict_ms_mean': (self._candidate_seconds * 1000 / self._timed_batches
+                                              if self._timed_batches else None),
+                'latency_delta_ms_mean': ((self._candidate_seconds - self._live_seconds) * 1000 / self._timed_batches
+                                          if self._timed_batches else None),
+                'dropped': self._dropped,
+                'errors': self._errors,
+            }
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            features, live, live_seconds = item
+            try:
+                if isinstance(features, dict):
+                    X = self.serving.encoder.encode_row(features)
+                else:
+                    X = self.serving.encoder.encode_frame(features)
+                started = time.perf_counter()
+                predictions = np.asarray(self.serving.predictor.predict(X)) == 1
+                seconds = time.perf_counter() - started
+            except Exception as e:
+                print(f"Shadow scoring with model {self.serving.version} failed: {e}")
+                with self._lock:
+                    self._errors += 1
+                continue
+            with self._lock:
+                self._batches += 1
+                self._rows += len(live)
+                self._agreed += int(np.sum(predictions == live))
+                if live_seconds is not None:
+                    self._timed_batches += 1
+                    self._live_seconds += live_seconds
+                    self._candidate_seconds += seconds
+
+
+class ModelManager:
+    """
+    Holds the served model and swaps in new bundles without a restart.
+
+    A watcher thread polls the LATEST pointer of the artifacts directory.
+    When it names a different bundle, the thread loads it with load_fn,
+    checks it (ServingModel.check) and either swaps it in right away, or in
+    shadow mode keeps it as a candidate that scores copies of live traffic
+    until it is promoted (by POST /model/promote, or automatically after
+    promote_after_rows rows at min_agreement or better). The swap itself is a
+    single attribute assignment, so no request is dropped or sees a
+    half-replaced model. Bundles that fail their checks are remembered and
+    not retried.
+    """
+
+    def __init__(self, load_fn, artifacts_dir=ARTIFACTS_DIR, poll_interval=10.0, shadow=False,
+                 promote_after_rows=0, min_agreement=0.95, on_activate=None):
+        self.load_fn = load_fn
+        self.artifacts_dir = artifacts_dir
+        self.poll_interval = poll_interval
+        self.shadow_mode = shadow
+        self.promote_after_rows = promote_after_rows
+        self.min_agreement = min_agreement
+        self.on_activate = on_activate
+
+        self.current = None
+        self.shadow = None  # ShadowScorer of the candidate model, in shadow mode
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()  # one bundle load at a time (watcher and background retraining)
+        self._stop = threading.Event()
+        self._thread = None
+        self._swaps = 0
+        self._rejected = {}
+        self._history = []
+
+    def activate(self, serving, reason='loaded'):
+        """
+        Makes serving the model that answers requests.
+        """
+        previous = self.current
+        self.current = serving
+        self._history.append({'version': serving.version, 'reason': reason,
+                              'at': time.strftime('%Y-%m-%dT%H:%M:%S%z')})
+        del self._history[:-20]
+        if previous is not None:
+            self._swaps += 1
+            print(f"Model {serving.version} is now serving (was {previous.version}, {reason})")
+        if self.on_activate is not None:
+            self.on_activate(previous, serving)
+
+    def start(self):
+        """
+        Starts the watcher thread, unless polling is turned off.
+        """
+        if self._thread is None and self.poll_interval > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='nova-model-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        shadow = self.shadow
+        if shadow is not None:
+            shadow.stop()
+
+    def poll(self):
+        """
+        Loads and checks the bundle LATEST points to, if it is new. Returns True if something changed.
+        """
+        with self._poll_lock:
+            return self._poll()
+
+    def _poll(self):
+        self._maybe_auto_promote()
+        path = latest_bundle_path(self.artifacts_dir)
+        if path is None:
+            return False
+        version = os.path.basename(os.path.normpath(path))
+        shadow = self.shadow
+        if (self.current is not None and self.current.version == version) or version in self._rejected \
+                or (shadow is not None and shadow.serving.version == version):
+            return False
+
+        print(f"New model bundle {version} found, loading it in the background...")
+        try:
+            candidate = self.load_fn(path)
+            candidate.check(self.current)
+        except Exception as e:
+            self._rejected[version] = str(e)
+            print(f"Model bundle {version} rejected: {e}")
+            return False
+
+        if self.shadow_mode and self.current is not None:
+            with self._lock:
+                previous, self.shadow = self.shadow, ShadowScorer(candidate).start()
+            if previous is not None:
+                previous.stop()
+                self._rejected[previous.serving.version] = 'replaced by a newer candidate'
+            print(f"Model {version} is shadow scoring live traffic; promote it with POST /model/promote")
+        else:
+            self.activate(candidate, reason='hot swap')
+        return True
+
+    def submit_shadow(self, features, live_predictions, live_seconds=None):
+        """
+        Sends a copy of a scored request to the candidate model, if one is shadowing.
+        """
+        shadow = self.shadow
+        if shadow is not None:
+            shadow.submit(features, live_predictions, live_seconds)
+
+    def promote(self, reason='promoted'):
+        """
+        Swaps the shadowing candidate in. Returns its final shadow stats, or None without a candidate.
+        """
+        with self._lock:
+            shadow, self.shadow = self.shadow, None
+        if shadow is None:
+            return None
+        shadow.stop()
+        stats = shadow.stats()
+        self.activate(shadow.serving, reason=reason)
+        self._history[-1]['shadow'] = stats
+        return stats
+
+    def reject(self, reason='rejected'):
+        """
+        Drops the shadowing candidate; its version is not loaded again.
+        """
+        with self._lock:
+            shadow, self.shadow = self.shadow, None
+        if shadow is None:
+            return None
+        shadow.stop()
+        self._rejected[shadow.serving.version] = reason
+        print(f"Model {shadow.serving.version} {reason}")
+        return shadow.stats()
+
+    def stats(self):
+        shadow = self.shadow
+        return {
+            'version': self.current.version if self.current is not None else None,
+            'shadow_mode': self.shadow_mode,
+            'candidate': shadow.stats() if shadow is not None else None,
+            'swaps': self._swaps,
+            'history': list(self._history),
+            'rejected': dict(self._rejected),
+            'poll_interval_seconds': self.poll_interval,
+        }
+
+    def register(self, app):
+        """
+        Adds GET /model, POST /model/promote and POST /model/reject to a Flask app.
+        """
+        @app.route('/model', methods=['GET'])
+        def model_status():
+            return jsonify(self.stats())
+
+        @app.route('/model/promote', methods=['POST'])
+        def promote_model():
+            stats = self.promote()
+            if stats is None:
+                return jsonify({'error': 'No candidate model is being shadow scored.'}), 409
+            return jsonify({'promoted': self.current.version, 'shadow': stats})
+
+        @app.route('/model/reject', methods=['POST'])
+        def reject_model():
+            stats = self.reject()
+            if stats is None:
+                return jsonify({'error': 'No candidate model is being shadow scored.'}), 409
+            return jsonify({'rejected': stats['version'], 'shadow': stats})
+
+        return self
+
+    def _maybe_auto_promote(self):
+        shadow = self.shadow
+        if shadow is None or not self.promote_after_rows:
+            return
+        stats = shadow.stats()
+        if stats['rows'] < self.promote_after_rows:
+            return
+        if stats['agreement_rate'] >= self.min_agreement:
+            self.promote(reason=f"auto-promoted at {stats['agreement_rate']:.1%} agreement")
+        else:
+            self.reject(reason=f"rejected at {stats['agreement_rate']:.1%} agreement")
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as e:
+                # The watcher must outlive a broken artifacts directory
+                print(f"Model watcher error: {e}")
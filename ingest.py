@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+
+from validation import NOT_NUMERIC_ATTR
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet and Arrow IPC uploads are optional
+    pa = None
+    pq = None
+
+# Leading bytes of the binary upload formats; anything else is parsed as CSV
+PARQUET_MAGIC = b'PAR1'
+ARROW_FILE_MAGIC = b'ARROW1'
+ARROW_STREAM_MAGIC = b'\xff\xff\xff\xff'
+
+UPLOAD_FORMATS = ('csv', 'parquet', 'arrow')
+
+
+def sniff_format(stream):
+    """
+    Returns 'parquet', 'arrow' or 'csv' from the first bytes of a seekable binary stream.
+    """
+    head = stream.read(8)
+    stream.seek(0)
+    if head.startswith(PARQUET_MAGIC):
+        return 'parquet'
+    if head.startswith(ARROW_FILE_MAGIC) or head.startswith(ARROW_STREAM_MAGIC):
+        return 'arrow'
+    return 'csv'
+
+
+def schema_dtypes(validator):
+    """
+    CSV dtypes of the fields the model reads: float32 for numeric features, category for categorical ones.
+    """
+    dtypes = {field: 'float32' for field in validator.numeric}
+    dtypes.update({field: 'category' for field in validator.categorical})
+    return dtypes
+
+
+def read_upload(stream, validator):
+    """
+    Parses an uploaded CSV, Parquet or Arrow IPC file (a seekable binary stream) into a DataFrame.
+
+    CSV is parsed straight from the bytes with the dtypes of the training
+    schema, so numeric features arrive as float32 and categorical ones as
+    categoricals, with no str decoding or dtype inference. If a numeric field
+    holds text the upload is parsed again with only the categorical dtypes and
+    the numeric fields are converted to float32 afterwards; the index labels
+    of the cells that were not numbers are kept in df.attrs[NOT_NUMERIC_ATTR],
+    so validation still rejects those rows. Parquet and Arrow uploads keep the
+    types they were written with.
+    """
+    fmt = sniff_format(stream)
+    if fmt != 'csv':
+        if pa is None:
+            raise ImportError(f"pyarrow is required to read {fmt.title()} uploads.")
+        if fmt == 'parquet':
+            table = pq.read_table(stream)
+        elif stream.read(6) == ARROW_FILE_MAGIC:
+            stream.seek(0)
+            table = pa.ipc.open_file(stream).read_all()
+        else:
+            stream.seek(0)
+            table = pa.ipc.open_stream(stream).read_all()
+        return table.to_pandas()
+
+    dtypes = schema_dtypes(validator)
+    try:
+        return pd.read_csv(stream, dtype=dtypes)
+    except ValueError:
+        stream.seek(0)
+    df = pd.read_csv(stream, dtype={field: 'category' for field in validator.categorical})
+    unparsed = {}
+    for field in validator.numeric:
+        if field not in df.columns:
+            continue
+        values = pd.to_numeric(df[field], errors='coerce')
+        failed = values.isna() & df[field].notna()
+        if failed.any():
+            unparsed[field] = df.index[failed].tolist()
+        df[field] = values.astype('float32')
+    df.attrs[NOT_NUMERIC_ATTR] = unparsed
+    return df
+
+
+def widen_float32(df):
+    """
+    Returns df with its float32 columns converted to float64 through their shortest decimal form.
+
+    A rating parsed as float32 then serializes as 4.3 and not 4.300000190734863.
+    """
+    widened = {column: shortest_float64(df[column].to_numpy())
+               for column in df.columns if df[column].dtype == np.float32}
+    return df.assign(**widened) if widened else df
+
+
+def shortest_float64(values):
+    """
+    Converts float32 values to the float64 of their shortest round-tripping decimal (as repr() prints them).
+
+    Every value is rounded to 1, 2, ... 9 significant digits until the
+    rounded value converts back to the same float32; each step is one
+    vectorized pass over the values not settled yet, about five times faster
+    than formatting them as strings.
+    """
+    x = values.astype(np.float64)
+    out = x.copy()
+    pending = np.flatnonzero(np.isfinite(x) & (x != 0))
+    exponent = np.floor(np.log10(np.abs(x[pending])))
+    for digits in range(1, 10):
+        if len(pending) == 0:
+            break
+        power = digits - 1 - exponent
+        # Dividing by an exact power of ten, never multiplying by an inexact 10 ** -n
+        scale = 10.0 ** np.abs(power)
+        candidate = np.where(power >= 0, np.round(x[pending] * scale) / scale, np.round(x[pending] / scale) * scale)
+        settled = candidate.astype(np.float32) == values[pending]
+        out[pending[settled]] = candidate[settled]
+        pending, exponent = pending[~settled], exponent[~settled]
+    return out
+
+
+def json_records(df):
+    """
+    Converts a DataFrame into a list of dicts for a JSON response.
+    """
+    return widen_float32(df).to_dict('records')
@@ -0,0 +1,400 @@
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from flask import jsonify, request, send_file
+
+from batch_score import run_batch
+from ingest import sniff_format
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single server process, which always owns the queue
+    fcntl = None
+
+# Files of a job directory
+STATUS_FILE = 'status.json'
+RESULT_FILE = 'predictions.csv'
+JOB_FILE = 'job.json'  # input and bundle paths, kept out of the status clients see
+
+# Entries of jobs_dir shared by every process serving it
+PENDING_DIR = '.pending'  # one marker file per queued or running job, named so they sort by submission
+SUBMIT_LOCK = '.submit.lock'
+DISPATCHER_LOCK = '.dispatcher.lock'
+
+# Seconds between two looks at the pending jobs, and between two attempts to become the queue owner
+JOB_POLL_SECONDS = 1.0
+
+FINISHED_STATES = ('succeeded', 'failed')
+
+
+class JobQueue:
+    """
+    Asynchronous batch scoring of uploads too large for one HTTP request.
+
+    POST /jobs stores the upload in its own directory under jobs_dir and
+    queues it on disk, in jobs_dir/.pending. Every process serving jobs_dir
+    (each serve.py worker) runs a dispatcher thread, but only the one that
+    holds the lock on jobs_dir/.dispatcher.lock owns the queue: it runs one
+    job at a time with batch_score.run_batch on a pool of `workers` spawned
+    processes, so the server never runs more than one such pool, and the web
+    processes never parse or score the file themselves. When the owner
+    exits, another process takes the lock over; jobs still queued are run,
+    and a job that was running is marked failed. Job state is kept in a
+    status.json file next to the upload, which makes GET /jobs/<id> and the
+    result download work from any worker. At most max_queued jobs wait or run
+    at once across all workers (more are refused with 429), and finished jobs
+    are deleted ttl_seconds after they finish.
+    """
+
+    def __init__(self, model_manager, jobs_dir='jobs', workers=None, max_queued=4, ttl_seconds=86400,
+                 engine='xgboost', shard_mb=16, chunk_rows=100_000, poll_seconds=JOB_POLL_SECONDS):
+        self.model_manager = model_manager
+        self.jobs_dir = jobs_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queued = max_queued
+        self.ttl_seconds = ttl_seconds
+        self.engine = engine
+        self.shard_mb = shard_mb
+        self.chunk_rows = chunk_rows
+        self.poll_seconds = poll_seconds
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._owner_file = None  # open while this process owns the queue
+        self._thread = None
+        # Spawned rather than forked: the web process has threads and XGBoost's OpenMP state
+        self._mp_context = multiprocessing.get_context('spawn')
+
+    @property
+    def pending_dir(self):
+        return os.path.join(self.jobs_dir, PENDING_DIR)
+
+    @property
+    def owner(self):
+        """
+        True while this process owns the queue and runs the jobs.
+        """
+        return self._owner_file is not None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='nova-job-dispatcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, upload, filename=None):
+        """
+        Stores an upload (a FileStorage or a binary stream) as a new job and queues it. Returns its status.
+
+        Raises OverflowError when the queue is full and ValueError when no
+        model bundle is served or the upload is empty or not CSV or Parquet.
+        """
+        serving = self.model_manager.current
+        if serving is None or serving.path is None:
+            raise ValueError("Jobs need a model bundle; export one with train_and_export_model.py.")
+        pending = self.pending()
+        if pending >= self.max_queued:
+            raise OverflowError(f"{pending} jobs are already queued or running; retry later.")
+
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.jobs_dir, job_id)
+        try:
+            os.makedirs(job_dir)
+            upload_path = os.path.join(job_dir, 'upload')
+            with open(upload_path, 'wb') as f:
+                shutil.copyfileobj(getattr(upload, 'stream', upload), f, 1 << 20)
+            if os.path.getsize(upload_path) == 0:
+                raise ValueError("The upload is empty.")
+            with open(upload_path, 'rb') as f:
+                fmt = sniff_format(f)
+            if fmt == 'arrow':
+                raise ValueError("Jobs accept CSV or Parquet uploads.")
+            # batch_score tells the formats apart by extension
+            input_path = os.path.join(job_dir, f'input.{fmt}')
+            os.replace(upload_path, input_path)
+            status = {
+                'id': job_id,
+                'status': 'queued',
+                'filename': filename,
+                'input_format': fmt,
+                'input_bytes': os.path.getsize(input_path),
+                'model_version': serving.version,
+                'created_at': time.time(),
+            }
+            self._write_status(job_id, status)
+            with open(os.path.join(job_dir, JOB_FILE), 'w', encoding='utf-8') as f:
+                json.dump({'input_path': input_path, 'bundle_path': serving.path}, f)
+            # The limit is checked again under the lock every process takes, so concurrent uploads cannot exceed it
+            with self._submit_lock():
+                pending = self.pending()
+                if pending >= self.max_queued:
+                    raise OverflowError(f"{pending} jobs are already queued or running; retry later.")
+                os.makedirs(self.pending_dir, exist_ok=True)
+                open(os.path.join(self.pending_dir, f"{time.time_ns():020d}-{job_id}"), 'w').close()
+        except BaseException:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+        self._wake.set()
+        return status
+
+    def pending(self):
+        """
+        Number of jobs queued or running, across every process serving jobs_dir.
+        """
+        try:
+            return len(os.listdir(self.pending_dir))
+        except FileNotFoundError:
+            return 0
+
+    def status(self, job_id):
+        """
+        Returns the status of a job, or None for an unknown (or already deleted) job.
+        """
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(os.path.join(self.jobs_dir, job_id, STATUS_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def result_path(self, job_id):
+        return os.path.join(self.jobs_dir, job_id, RESULT_FILE)
+
+    def cleanup(self, now=None):
+        """
+        Deletes the directories of jobs that finished more than ttl_seconds ago. Returns their ids.
+        """
+        now = now or time.time()
+        removed = []
+        if not os.path.isdir(self.jobs_dir):
+            return removed
+        for job_id in os.listdir(self.jobs_dir):
+            status = self.status(job_id)
+            if status is not None and status['status'] in FINISHED_STATES \
+                    and now - status.get('finished_at', now) > self.ttl_seconds:
+                shutil.rmtree(os.path.join(self.jobs_dir, job_id), ignore_errors=True)
+                removed.append(job_id)
+        return removed
+
+    def stats(self):
+        return {'pending': self.pending(), 'max_queued': self.max_queued, 'workers': self.workers,
+                'owner': self.owner}
+
+    def register(self, app):
+        """
+        Adds POST /jobs, GET /jobs/<id> and GET /jobs/<id>/result to a Flask app.
+        """
+        @app.route('/jobs', methods=['POST'])
+        def create_job():
+            # A multipart upload in the 'file' field, or the file itself as the request body
+            upload = request.files.get('file')
+            filename = upload.filename if upload is not None else None
+            if upload is None:
+                if not request.content_length:
+                    return jsonify({'error': "Send the file in a 'file' form field or as the request body."}), 400
+                upload = request.stream
+            try:
+                status = self.submit(upload, filename)
+            except OverflowError as e:
+                return jsonify({'error': str(e)}), 429, {'Retry-After': '30'}
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            return jsonify(status), 202, {'Location': f"/jobs/{status['id']}"}
+
+        @app.route('/jobs/<job_id>', methods=['GET'])
+        def job_status(job_id):
+            status = self.status(job_id)
+            if status is None:
+                return jsonify({'error': 'Unknown job.'}), 404
+            return jsonify(status)
+
+        @app.route('/jobs/<job_id>/result', methods=['GET'])
+        def job_result(job_id):
+            status = self.status(job_id)
+            if status is None:
+                return jsonify({'error': 'Unknown job.'}), 404
+            if status['status'] != 'succeeded':
+                return jsonify({'error': f"Job is {status['status']}.", 'status': status['status']}), 409
+            # Streamed from disk in blocks, with Range support for resumed downloads
+            return send_file(os.path.abspath(self.result_path(job_id)), mimetype='text/csv', as_attachment=True,
+                             download_name=f'predictions-{job_id}.csv', conditional=True)
+
+        return self
+
+    def _write_status(self, job_id, status):
+        path = os.path.join(self.jobs_dir, job_id, STATUS_FILE)
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(status, f)
+        os.replace(tmp, path)  # readers never see a half-written file
+
+    def _submit_lock(self):
+        return _FileLock(os.path.join(self.jobs_dir, SUBMIT_LOCK), self._lock)
+
+    def _acquire_ownership(self):
+        """
+        Takes the dispatcher lock if no other process holds it. Returns True if this process owns the queue.
+        """
+        if self._owner_file is not None:
+            return True
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        f = open(os.path.join(self.jobs_dir, DISPATCHER_LOCK), 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                return False
+        self._owner_file = f
+        print(f"Process {os.getpid()} now runs the batch jobs in {self.jobs_dir}")
+        self._recover()
+        return True
+
+    def _recover(self):
+        """
+        Fails the jobs a previous queue owner was running when it stopped; queued jobs simply run next.
+
+        Jobs that are queued but have no pending marker (the process stopped
+        halfway through accepting them) are failed as well.
+        """
+        with self._submit_lock():
+            markers = self._markers()
+            queued = {marker.split('-', 1)[1] for marker in markers}
+            for job_id in os.listdir(self.jobs_dir):
+                status = self.status(job_id)
+                if status is not None and status['status'] not in FINISHED_STATES and job_id not in queued \
+                        and time.time() - status['created_at'] > 60:
+                    status.update(status='failed', finished_at=time.time(),
+                                  error="The server stopped before the job was queued; submit it again.")
+                    self._write_status(job_id, status)
+        for marker in markers:
+            job_id = marker.split('-', 1)[1]
+            status = self.status(job_id)
+            if status is None or status['status'] in FINISHED_STATES:
+                self._remove_marker(marker)
+            elif status['status'] == 'running':
+                print(f"Job {job_id} was running when the server stopped; marking it failed.")
+                status.update(status='failed', error="The server stopped while the job was running; submit it again.",
+                              finished_at=time.time())
+                self._write_status(job_id, status)
+                self._remove_partial_result(job_id)
+                self._remove_marker(marker)
+
+    def _markers(self):
+        try:
+            return sorted(os.listdir(self.pending_dir))
+        except FileNotFoundError:
+            return []
+
+    def _remove_marker(self, marker):
+        try:
+            os.remove(os.path.join(self.pending_dir, marker))
+        except FileNotFoundError:
+            pass
+
+    def _remove_partial_result(self, job_id):
+        try:
+            os.remove(self.result_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def _run(self):
+        last_cleanup = 0.0
+        while True:
+            if not self._acquire_ownership():
+                time.sleep(self.poll_seconds)
+                continue
+            markers = self._markers()
+            if markers:
+                marker = markers[0]
+                try:
+                    self._run_job(marker.split('-', 1)[1])
+                except Exception as e:
+                    print(f"Job {marker} could not be run: {e}")
+                self._remove_marker(marker)
+            elif time.monotonic() - last_cleanup >= 60:
+                self._cleanup_quietly()
+                last_cleanup = time.monotonic()
+            else:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+
+    def _run_job(self, job_id):
+        status = self.status(job_id)
+        if status is None or status['status'] != 'queued':
+            return
+        with open(os.path.join(self.jobs_dir, job_id, JOB_FILE), 'r', encoding='utf-8') as f:
+            job = json.load(f)
+        input_path, bundle_path = job['input_path'], job['bundle_path']
+        status.update(status='running', started_at=time.time(), units_done=0, units_total=None, rows_scored=0,
+                      rows_rejected=0, rows_per_second=0.0)
+        self._write_status(job_id, status)
+
+        def progress(done, total, result):
+            status['units_done'] = done
+            status['units_total'] = total
+            if result is not None:
+                status['rows_scored'] += result['rows']
+                status['rows_rejected'] += result.get('rejected', 0)
+            status['rows_per_second'] = status['rows_scored'] / max(time.time() - status['started_at'], 1e-9)
+            self._write_status(job_id, status)
+
+        try:
+            summary = run_batch(input_path, self.result_path(job_id), bundle_path=bundle_path, workers=self.workers,
+                                chunk_rows=self.chunk_rows, shard_mb=self.shard_mb, engine=self.engine,
+                                progress=progress, mp_context=self._mp_context)
+            if summary['rows_scored'] == 0:
+                raise ValueError(f"No row of the upload could be scored ({summary['rows_rejected']} rejected); "
+                                 "check that it is a CSV or Parquet file with the training columns.")
+            status.update(status='succeeded', rows_scored=summary['rows_scored'],
+                          rows_rejected=summary['rows_rejected'], rows_per_second=summary['rows_per_second'],
+                          result=f'/jobs/{job_id}/result')
+            os.remove(input_path)
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            status.update(status='failed', error=str(e))
+            self._remove_partial_result(job_id)
+        status['finished_at'] = time.time()
+        self._write_status(job_id, status)
+
+    def _cleanup_quietly(self):
+        try:
+            self.cleanup()
+        except OSError as e:
+            print(f"Job cleanup failed: {e}")
+
+
+class _FileLock:
+    """
+    Exclusive lock shared by the threads of this process (lock) and, through flock, by other processes.
+    """
+
+    def __init__(self, path, lock):
+        self.path = path
+        self.lock = lock
+        self._file = None
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, 'a')
+            if fcntl is not None:
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+        except BaseException:
+            if self._file is not None:
+                self._file.close()
+            self.lock.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()  # closing releases the flock
+        self.lock.release()
+        return False
@@ -3,37 +3,7 @@ import numpy as np
 from sklearn.model_selection import train_test_split
 from xgboost import XGBClassifier
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
-
-def load_and_preprocess_data(csv_path):
-    """
-    Loads and preprocesses the dataset.
-    """
-    try:
-        df = pd.read_csv(csv_path)
-    except FileNotFoundError:
-        print(f"Error: The file {csv_path} was not found.")
-        return None, None
-    
-    target_column = 'Creditworthy'
-    
-    # Drop columns that are not features for the model
-    df = df.drop(columns=['Partner ID'], errors='ignore')
-    
-    # Identify non-numeric columns
-    categorical_cols = df.select_dtypes(include=['object']).columns.tolist()
-    
-    # One-hot encode categorical features
-    df = pd.get_dummies(df, columns=categorical_cols, drop_first=True)
-    
-    # Ensure all remaining feature columns are numeric
-    for col in df.columns:
-        if col != target_column:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    
-    # Drop any rows that now have NaN values after the coercion
-    df = df.dropna()
-    
-    return df, target_column
+from preprocessing import load_and_preprocess_data
 
 def train_model(df, target_column):
     """
@@ -100,7 +70,7 @@ def main():
     
     # Step 1: Data Loading and Preprocessing
     # Ensure catalyst_train.csv exists before running
-    train_df, target_column = load_and_preprocess_data('catalyst_train.csv')
+    train_df, target_column = load_and_preprocess_data('catalyst_train.csv', cache=True)
     
     if train_df is None:
         print("Please run the 'generate_datasets.py' script first to create the training data.")
@@ -1,90 +1,115 @@
-from fairlearn.metrics import MetricFrame, selection_rate, true_positive_rate
-from sklearn.metrics import accuracy_score
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
 from xgboost import XGBClassifier
-from sklearn.metrics import precision_score, recall_score, f1_score
-from io import StringIO
 import os
-
-# ===============================================================================
-# Input Validation Functions
-# ===============================================================================
-def validate_input(data, trips_col='Number of Trips', earnings_col='Earnings', min_trips=0, max_trips=1000, min_earnings=0, max_earnings=100000):
-    """
-    Validates input data for negative trips and unrealistic earnings.
-    Returns (True, None) if valid, else (False, error_message).
-    """
-    # Check for single row (dict or DataFrame)
-    if isinstance(data, dict):
-        trips = data.get(trips_col, None)
-        earnings = data.get(earnings_col, None)
-        if trips is not None and (trips < min_trips or trips > max_trips):
-            return False, f"Invalid number of trips: {trips}. Must be between {min_trips} and {max_trips}."
-        if earnings is not None and (earnings < min_earnings or earnings > max_earnings):
-            return False, f"Invalid earnings: {earnings}. Must be between {min_earnings} and {max_earnings}."
-    elif isinstance(data, pd.DataFrame):
-        if trips_col in data.columns:
-            invalid_trips = data[(data[trips_col] < min_trips) | (data[trips_col] > max_trips)]
-            if not invalid_trips.empty:
-                return False, f"Invalid number of trips in rows: {invalid_trips.index.tolist()}"
-        if earnings_col in data.columns:
-            invalid_earnings = data[(data[earnings_col] < min_earnings) | (data[earnings_col] > max_earnings)]
-            if not invalid_earnings.empty:
-                return False, f"Invalid earnings in rows: {invalid_earnings.index.tolist()}"
-    return True, None
+from micro_batching import MicroBatcher
+from prediction_cache import PredictionCache
+from evaluation import evaluate_model, load_sensitive_features
+from fairness import SENSITIVE_COLUMN, FairnessAggregator, FairnessSaver, label_to_binary
+from drift import DRIFT_PROFILE_FILE, DriftMonitor, DriftProfile
+from segments import SEGMENT_COLUMN, SegmentedModel, fit_segment_models
+from audit_log import AUDIT_FORMATS, AuditLogWriter
+from ingest import read_upload
+from preprocessing import load_and_preprocess_data
+from response_formats import available_formats, negotiate, render_predictions
+from streaming import STREAM_MIMETYPES, detach_upload, iter_csv_chunks, score_chunks, serialize_chunks
+from model_artifacts import ARTIFACTS_DIR, file_sha256, latest_bundle_path, load_bundle, read_manifest, save_bundle
+from hot_swap import ModelManager, ServingModel
+from jobs import JobQueue
+from telemetry import Telemetry
+import argparse
+import atexit
+import json
+import threading
+import time
+import traceback
 
 # ==============================================================================
 # Step 1: Initialize Flask App and Model Variables
 # ==============================================================================
 app = Flask(__name__)
 CORS(app)  # Enable CORS to allow the frontend to access this API
-
-# Global variables to hold the trained model and features
-model = None
-train_features_columns = None
-evaluation_metrics = {}
+# Request counters, per-stage latency and model batch size histograms, served on /metrics
+telemetry = Telemetry().instrument(app)
+
+# Set NOVA_FEATURE_ENCODER=0 to fall back to the pandas preprocessing path for /predict
+USE_FEATURE_ENCODER = os.environ.get('NOVA_FEATURE_ENCODER', '1') != '0'
+
+# Inference engine for /predict and /predict_csv: 'xgboost' or 'numpy' (vectorized tree evaluator)
+INFERENCE_ENGINE = os.environ.get('NOVA_INFERENCE_ENGINE', 'xgboost')
+
+# XGBoost threads per prediction; 0 keeps XGBoost's default (all cores). serve.py sets it per worker
+MODEL_THREADS = int(os.environ.get('NOVA_MODEL_THREADS', '0'))
+
+# Opt-in micro-batching of concurrent /predict calls into one model.predict call
+USE_MICRO_BATCHING = os.environ.get('NOVA_MICRO_BATCHING', '0') == '1'
+BATCH_MAX_WAIT_MS = float(os.environ.get('NOVA_BATCH_MAX_WAIT_MS', '2'))
+BATCH_MAX_SIZE = int(os.environ.get('NOVA_BATCH_MAX_SIZE', '32'))
+
+# LRU/TTL cache of /predict results, keyed on the canonical feature values and model version
+USE_PREDICTION_CACHE = os.environ.get('NOVA_PREDICTION_CACHE', '1') != '0'
+PREDICTION_CACHE_SIZE = int(os.environ.get('NOVA_PREDICTION_CACHE_SIZE', '10000'))
+PREDICTION_CACHE_TTL_SECONDS = float(os.environ.get('NOVA_PREDICTION_CACHE_TTL_SECONDS', '300'))
+
+# Rows parsed and scored per chunk by the streaming mode of /predict_csv
+STREAM_CHUNK_ROWS = int(os.environ.get('NOVA_STREAM_CHUNK_ROWS', '10000'))
+
+# Background audit log of scored records (written by a writer thread, not the request)
+AUDIT_LOG_FORMAT = os.environ.get('NOVA_AUDIT_LOG_FORMAT', 'csv')
+AUDIT_LOG_PATH = os.environ.get('NOVA_AUDIT_LOG_PATH',
+                                os.path.join('logs', 'online_testcases' + AUDIT_FORMATS.get(AUDIT_LOG_FORMAT, '.csv')))
+AUDIT_QUEUE_SIZE = int(os.environ.get('NOVA_AUDIT_QUEUE_SIZE', '10000'))
+AUDIT_WHEN_FULL = os.environ.get('NOVA_AUDIT_WHEN_FULL', 'drop')
+AUDIT_BLOCK_TIMEOUT_SECONDS = float(os.environ.get('NOVA_AUDIT_BLOCK_TIMEOUT_SECONDS', '5'))
+AUDIT_MAX_BYTES = int(float(os.environ.get('NOVA_AUDIT_MAX_MB', '50')) * 1024 * 1024)
+AUDIT_MAX_AGE_SECONDS = float(os.environ.get('NOVA_AUDIT_MAX_AGE_HOURS', '24')) * 3600
+
+# Running per-group fairness counters, persisted across restarts of the same model
+FAIRNESS_PATH = os.environ.get('NOVA_FAIRNESS_PATH', 'fairness_counts.json')
+
+# Hot swap: check the artifacts directory for a new LATEST bundle every N seconds (0 disables)
+MODEL_WATCH_SECONDS = float(os.environ.get('NOVA_MODEL_WATCH_SECONDS', '10'))
+# Shadow mode: a new bundle first scores copies of live traffic and only serves once promoted
+USE_SHADOW_MODE = os.environ.get('NOVA_SHADOW_MODE', '0') == '1'
+SHADOW_PROMOTE_ROWS = int(os.environ.get('NOVA_SHADOW_PROMOTE_ROWS', '0'))  # 0 = promote by hand only
+SHADOW_MIN_AGREEMENT = float(os.environ.get('NOVA_SHADOW_MIN_AGREEMENT', '0.95'))
+
+# Asynchronous batch jobs (POST /jobs): uploads and results live under NOVA_JOBS_DIR
+JOBS_DIR = os.environ.get('NOVA_JOBS_DIR', 'jobs')
+JOB_WORKERS = int(os.environ.get('NOVA_JOB_WORKERS', '0'))  # 0 = one process per core
+JOB_MAX_QUEUED = int(os.environ.get('NOVA_JOB_MAX_QUEUED', '4'))
+JOB_TTL_SECONDS = float(os.environ.get('NOVA_JOB_TTL_HOURS', '24')) * 3600
+
+# Global variables to hold the served model and the serving components.
+# model_manager.current is the ServingModel (model, encoder, validator, metrics,
+# fairness counters) answering requests; it is replaced as a whole on a hot swap
+model_manager = ModelManager(lambda path: load_serving_model(path), poll_interval=MODEL_WATCH_SECONDS,
+                             shadow=USE_SHADOW_MODE, promote_after_rows=SHADOW_PROMOTE_ROWS,
+                             min_agreement=SHADOW_MIN_AGREEMENT,
+                             on_activate=lambda previous, serving: on_model_swap(previous, serving)).register(app)
+# Large uploads are scored off the request path by a local job queue and process pool
+job_queue = JobQueue(model_manager, jobs_dir=JOBS_DIR, workers=JOB_WORKERS, max_queued=JOB_MAX_QUEUED,
+                     ttl_seconds=JOB_TTL_SECONDS, engine=INFERENCE_ENGINE).register(app)
+micro_batcher = None
+audit_log = None
+# Saves the served model's fairness counters off the request path
+fairness_saver = FairnessSaver(lambda: model_manager.current.fairness if model_manager.current is not None else None)
+# Set by serve.py when several workers serve: /metrics, /fairness, /drift and /stats then cover all of them
+worker_state = None
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL_SECONDS) if USE_PREDICTION_CACHE else None
 
 # ==============================================================================
 # Step 2: Core ML Functions (from your original script)
 # ==============================================================================
-def load_and_preprocess_data(csv_path):
-    """
-    Loads and preprocesses the dataset.
-    """
-    try:
-        df = pd.read_csv(csv_path)
-    except FileNotFoundError:
-        print(f"Error: The file {csv_path} was not found.")
-        return None, None
-
-    target_column = 'Creditworthy'
-
-    # Drop columns that are not features for the model
-    df = df.drop(columns=['Partner ID'], errors='ignore')
-
-    # Identify non-numeric columns
-    categorical_cols = df.select_dtypes(include=['object']).columns.tolist()
-
-    # One-hot encode categorical features
-    df = pd.get_dummies(df, columns=categorical_cols, drop_first=True)
-
-    # Ensure all remaining feature columns are numeric
-    for col in df.columns:
-        if col != target_column:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-
-    # Drop any rows that now have NaN values after the coercion
-    df = df.dropna()
-
-    return df, target_column
-
-def train_model(df, target_column):
+def train_model(df, target_column, segments=None):
     """
     Splits data and trains an XGBoost classifier.
+    With segments (the raw Partner Type of every row of df) it also trains one
+    classifier per Partner Type and returns a SegmentedModel that falls back
+    to the global classifier for segments without one.
     """
     X = df.drop(target_column, axis=1)
     y = df[target_column]
@@ -94,38 +119,12 @@ def train_model(df, target_column):
     model = XGBClassifier(eval_metric='logloss')
     model.fit(X_train, y_train)
 
-    return model, X_test, y_test
-
-def evaluate_model(model, X_test, y_test):
-    """
-    Evaluates the trained model using key metrics.
-    Returns the metrics as a dictionary.
-    """
-    y_pred = model.predict(X_test)
-    evaluation_metrics = {
-        'accuracy': accuracy_score(y_test, y_pred),
-        'precision': precision_score(y_test, y_pred),
-        'recall': recall_score(y_test, y_pred),
-        'f1_score': f1_score(y_test, y_pred)
-    }
+    if segments is not None:
+        segment_models = fit_segment_models(X_train, y_train, segments.loc[X_train.index].to_numpy(),
+                                            lambda: XGBClassifier(eval_metric='logloss'))
+        model = SegmentedModel(model, segment_models, X.columns)
 
-    # Fairness metrics using Fairlearn (if sensitive attribute exists)
-    sensitive_attr = None
-    # Try common sensitive attribute names
-    for col in ['gender', 'Gender', 'partner_gender', 'Partner Gender']:
-        if col in X_test.columns:
-            sensitive_attr = X_test[col]
-            break
-    if sensitive_attr is not None:
-        mf = MetricFrame(metrics={'accuracy': accuracy_score, 'selection_rate': selection_rate},
-                         y_true=y_test,
-                         y_pred=y_pred,
-                         sensitive_features=sensitive_attr)
-        print("\nFairness metrics by group (Fairlearn):")
-        print(mf.by_group)
-    else:
-        print("No sensitive attribute found for group fairness metrics.")
-    return evaluation_metrics
+    return model, X_test, y_test
 
 def preprocess_user_data(user_df, train_columns):
     """
@@ -166,9 +165,24 @@ def save_to_csv(data_df, filename='online_testcases.csv'):
     # Drop any other columns that are all NaN
     data_df = data_df.dropna(axis=1, how='all')
     file_exists = os.path.isfile(filename)
+    if os.path.dirname(filename):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
     data_df.to_csv(filename, mode='a', header=not file_exists, index=False)
     print(f"Data successfully saved to {filename}")
 
+def log_predictions(records):
+    """
+    Hands scored records (a dict or a DataFrame) to the background audit log.
+    Falls back to a synchronous save_to_csv (a CSV next to AUDIT_LOG_PATH) when the audit log is not running.
+    """
+    filename = os.path.splitext(AUDIT_LOG_PATH)[0] + '.csv'
+    if audit_log is not None:
+        audit_log.submit(records)
+    elif isinstance(records, dict):
+        save_to_csv(pd.DataFrame([records]), filename)
+    else:
+        save_to_csv(records, filename)
+
 # ==============================================================================
 # Step 3: API Endpoint for Prediction (Single Input)
 # ==============================================================================
@@ -177,32 +191,72 @@ def predict():
     """
     Endpoint to receive a single user input, make a prediction, and return metrics.
     """
-    # Check if global variables are None. This is the correct way to handle this.
-    if model is None or train_features_columns is None or evaluation_metrics is None:
+    # The whole request uses this one model, even if a new one is swapped in meanwhile
+    serving = model_manager.current
+    if serving is None:
         return jsonify({'error': 'Model is not trained or loaded. Please check backend logs.'}), 500
 
     try:
-        user_input = request.json
-        # Input validation
-        valid, error_msg = validate_input(user_input)
-        if not valid:
-            return jsonify({'error': error_msg}), 400
-
-        user_df = pd.DataFrame([user_input])
-        # Preprocess the user's data to match the training data format
-        user_features_processed = preprocess_user_data(user_df.copy(), train_features_columns)
-        # Make the prediction
-        prediction = model.predict(user_features_processed)
-        result = "Eligible" if prediction[0] == 1 else "Not Eligible"
-        # Add prediction to the original DataFrame for logging
-        user_df['Creditworthy_Prediction'] = result
-        # Save the original user input plus prediction to the CSV file
-        save_to_csv(user_df)
+        with telemetry.timed('/predict', 'parse'):
+            user_input = request.json
+        if not isinstance(user_input, dict):
+            return jsonify({'error': 'Request body must be a JSON object.'}), 400
+        telemetry.count_rows('/predict', 1)
+        # Input validation against the training schema
+        with telemetry.timed('/predict', 'validation'):
+            error_bits = serving.validator.validate_record(user_input)
+        if error_bits:
+            return jsonify({'error': '; '.join(serving.validator.describe(error_bits)) + '.'}), 400
+        # Feature drift sketch of the scored traffic
+        if serving.drift is not None:
+            with telemetry.timed('/predict', 'drift'):
+                serving.drift.update_record(user_input)
+
+        # Repeat checks of the same partner features are answered from the cache
+        result = None
+        cache_key = None
+        live_seconds = None
+        if prediction_cache is not None:
+            with telemetry.timed('/predict', 'cache_lookup'):
+                cache_key = prediction_cache.key(serving.version, serving.encoder.canonical_values(user_input))
+                result = prediction_cache.get(cache_key)
+
+        if result is None:
+            with telemetry.timed('/predict', 'preprocess'):
+                if USE_FEATURE_ENCODER:
+                    # Encode the JSON record straight into a float32 row in training column order
+                    user_features_processed = serving.encoder.encode_row(user_input)
+                else:
+                    # Preprocess the user's data to match the training data format
+                    user_df = pd.DataFrame([user_input])
+                    user_features_processed = preprocess_user_data(user_df, serving.feature_columns)
+            # Make the prediction, coalesced with concurrent requests if micro-batching is on
+            with telemetry.timed('/predict', 'predict'):
+                if micro_batcher is not None:
+                    prediction = micro_batcher.predict(user_features_processed)
+                else:
+                    telemetry.record_model_batch('/predict', 1)
+                    started = time.perf_counter()
+                    prediction = serving.predictor.predict(user_features_processed)[0]
+                    live_seconds = time.perf_counter() - started
+            result = "Eligible" if prediction == 1 else "Not Eligible"
+            if cache_key is not None:
+                prediction_cache.put(cache_key, result)
+        # A candidate model in shadow mode scores a copy of the request off the request path
+        model_manager.submit_shadow(user_input, [result == "Eligible"], live_seconds)
+        with telemetry.timed('/predict', 'audit_log'):
+            if serving.fairness is not None:
+                label = user_input.get('Creditworthy')
+                serving.fairness.update(user_input.get(SENSITIVE_COLUMN), result == "Eligible",
+                                        None if label is None else label_to_binary([label])[0])
+            # Log the original user input plus prediction to the audit log
+            log_predictions(dict(user_input, Creditworthy_Prediction=result))
         # Return the prediction and evaluation metrics
-        return jsonify({
-            'prediction': result,
-            'metrics': evaluation_metrics
-        })
+        with telemetry.timed('/predict', 'serialize'):
+            return jsonify({
+                'prediction': result,
+                'metrics': serving.metrics
+            })
 
     except Exception as e:
         # Gracefully handle any errors during the process
@@ -211,11 +265,87 @@ def predict():
 # ==============================================================================
 # Step 4: API Endpoint for Bulk Prediction (CSV Upload)
 # ==============================================================================
+def stream_predictions(file, stream_format, serving):
+    """
+    Scores an uploaded CSV chunk by chunk and streams the results back as NDJSON or CSV.
+    Memory use is bounded by the chunk size instead of the size of the upload.
+    """
+    if stream_format not in STREAM_MIMETYPES:
+        return jsonify({'error': f"Unsupported stream format '{stream_format}'. Use one of: {', '.join(STREAM_MIMETYPES)}."}), 400
+
+    # Parsed here rather than with type=int, which would quietly fall back to the default
+    try:
+        chunk_size = int(request.args.get('chunk_size', STREAM_CHUNK_ROWS))
+    except ValueError:
+        chunk_size = 0
+    if chunk_size <= 0:
+        return jsonify({'error': 'chunk_size must be a positive integer'}), 400
+
+    upload = detach_upload(file)
+    rejected_rows = []
+
+    def validated(chunks):
+        # Invalid rows are left out of the scored output and reported at the end
+        for chunk in chunks:
+            telemetry.count_rows('/predict_csv', len(chunk))
+            with telemetry.timed('/predict_csv', 'validation'):
+                error_bits = serving.validator.validate_frame(chunk)
+            if error_bits.any():
+                ids = chunk['Partner ID'].to_numpy() if 'Partner ID' in chunk.columns else None
+                rejected_rows.extend(serving.validator.rejected_rows(error_bits, chunk.index, ids))
+                chunk = chunk[error_bits == 0]
+            if len(chunk):
+                if serving.drift is not None:
+                    with telemetry.timed('/predict_csv', 'drift'):
+                        serving.drift.update_frame(chunk)
+                yield chunk
+
+    def logged(scored_chunks):
+        for chunk in scored_chunks:
+            eligible = chunk['Creditworthy_Prediction'] == 'Eligible'
+            model_manager.submit_shadow(chunk, eligible)
+            with telemetry.timed('/predict_csv', 'audit_log'):
+                log_predictions(chunk)
+                if serving.fairness is not None and SENSITIVE_COLUMN in chunk.columns:
+                    serving.fairness.update_batch(chunk[SENSITIVE_COLUMN], eligible,
+                                                  chunk['Creditworthy'] if 'Creditworthy' in chunk.columns else None)
+            yield chunk
+
+    def timed_predict(X):
+        telemetry.record_model_batch('/predict_csv', len(X))
+        with telemetry.timed('/predict_csv', 'predict'):
+            return serving.predictor.predict(X)
+
+    def generate():
+        chunks = validated(iter_csv_chunks(upload, chunk_size))
+        scored = logged(score_chunks(chunks, serving.encoder, timed_predict))
+        try:
+            yield from serialize_chunks(scored, stream_format)
+            if rejected_rows:
+                print(f"Streaming upload: {len(rejected_rows)} rows rejected by input validation")
+                if stream_format == 'ndjson':
+                    # NDJSON clients get the rejected rows as a final record
+                    yield json.dumps({'rejected_rows': rejected_rows}) + '\n'
+        except Exception as e:
+            # Headers are already sent, so the error can only be reported in-band.
+            # NDJSON clients get a final error record; CSV output simply ends.
+            print(traceback.format_exc())
+            if stream_format == 'ndjson':
+                yield json.dumps({'error': f"Error processing file: {str(e)}"}) + '\n'
+        finally:
+            upload.close()
+
+    return Response(stream_with_context(generate()), mimetype=STREAM_MIMETYPES[stream_format])
+
 @app.route('/predict_csv', methods=['POST'])
 def predict_csv():
     """
     Endpoint to receive a CSV file, make bulk predictions, and return results.
     """
+    serving = model_manager.current
+    if serving is None:
+        return jsonify({'error': 'Model is not trained or loaded. Please check backend logs.'}), 500
+
     if 'file' not in request.files:
         return jsonify({'error': 'No file part in the request'}), 400
 
@@ -224,10 +354,21 @@ def predict_csv():
         return jsonify({'error': 'No selected file'}), 400
 
     if file:
+        # ?stream=ndjson|csv scores the upload in chunks and streams the results
+        stream_format = request.args.get('stream')
+        if stream_format:
+            return stream_predictions(file, stream_format, serving)
+
+        # Response format from ?format= or the Accept header; plain JSON records by default
+        response_format = negotiate(request)
+        if response_format is None:
+            return jsonify({'error': f"Unknown format; use one of {', '.join(available_formats())}."}), 406
+
         try:
-            # Read the CSV file from the request
-            csv_data = StringIO(file.read().decode('utf-8'))
-            input_df = pd.read_csv(csv_data)
+            # Parse the CSV, Parquet or Arrow upload straight from its bytes, typed by the training schema
+            with telemetry.timed('/predict_csv', 'parse'):
+                input_df = read_upload(file.stream, serving.validator)
+            telemetry.count_rows('/predict_csv', len(input_df))
 
             # Check if ground truth is present
             has_ground_truth = 'Creditworthy' in input_df.columns
@@ -239,105 +380,445 @@ def predict_csv():
             else:
                 input_df_features = input_df
 
+            # Input validation for all rows; only the valid ones are scored
+            with telemetry.timed('/predict_csv', 'validation'):
+                error_bits = serving.validator.validate_frame(input_df_features)
+                ids = input_df['Partner ID'].to_numpy() if 'Partner ID' in input_df.columns else None
+                rejected_rows = serving.validator.rejected_rows(error_bits, input_df.index, ids)
+            if rejected_rows:
+                if len(rejected_rows) == len(input_df):
+                    return jsonify({'error': 'No valid rows to score.', 'rejected_rows': rejected_rows}), 400
+                valid_rows = error_bits == 0
+                input_df = input_df[valid_rows]
+                input_df_features = input_df_features[valid_rows]
+                if has_ground_truth:
+                    y_true = y_true[valid_rows]
+
+            # Feature drift sketch of the scored rows
+            if serving.drift is not None:
+                with telemetry.timed('/predict_csv', 'drift'):
+                    serving.drift.update_frame(input_df_features)
+
             # Remove any other empty columns
             input_df_features = input_df_features.dropna(axis=1, how='all')
 
-            # Input validation for all rows
-            valid, error_msg = validate_input(input_df_features)
-            if not valid:
-                return jsonify({'error': error_msg}), 400
-
-            # Preprocess the entire DataFrame
-            user_features_processed = preprocess_user_data(input_df_features.copy(), train_features_columns)
+            # Encode the entire DataFrame into a float32 matrix in training column order
+            with telemetry.timed('/predict_csv', 'preprocess'):
+                user_features_processed = serving.encoder.encode_frame(input_df_features)
             # Make the predictions
-            predictions = model.predict(user_features_processed)
+            telemetry.record_model_batch('/predict_csv', len(user_features_processed))
+            with telemetry.timed('/predict_csv', 'predict'):
+                predictions = serving.predictor.predict(user_features_processed)
             # Add the predictions to the original DataFrame
             input_df['Creditworthy_Prediction'] = np.where(predictions == 1, 'Eligible', 'Not Eligible')
 
             # Remove any empty columns again before saving/returning
             input_df = input_df.dropna(axis=1, how='all')
 
-            # Save the entire DataFrame to the CSV file
-            save_to_csv(input_df)
+            # A candidate model in shadow mode scores the same rows; the live call scored a
+            # DataFrame and the candidate an encoded array, so their latency is not compared here
+            model_manager.submit_shadow(input_df, predictions == 1)
+
+            # Log the entire DataFrame to the audit log
+            with telemetry.timed('/predict_csv', 'audit_log'):
+                log_predictions(input_df)
 
             # --- Fairness & Bias Reporting ---
             fairness_metrics = {}
             fairness_observation = "Fairness metrics require ground truth labels and are not available for this upload."
-            if has_ground_truth:
-                # Only compute fairness if ground truth is present
-                sensitive_col = 'Partner Type'
-                if sensitive_col in input_df.columns:
-                    y_pred = (input_df['Creditworthy_Prediction'] == 'Eligible').astype(int)
-                    # If Creditworthy is string, convert to binary
-                    if y_true.dtype == object:
-                        y_true_bin = y_true.map(lambda x: 1 if str(x).lower() in ['eligible', '1', 'true', 'yes'] else 0)
-                    else:
-                        y_true_bin = y_true
-                    sensitive_features = input_df[sensitive_col]
-                    mf = MetricFrame(
-                        metrics={
-                            'selection_rate': selection_rate,
-                            'equal_opportunity': true_positive_rate
-                        },
-                        y_true=y_true_bin,
-                        y_pred=y_pred,
-                        sensitive_features=sensitive_features
-                    )
+            if SENSITIVE_COLUMN in input_df.columns:
+                # Per-group counts of this upload, also added to the running counters
+                upload_fairness = FairnessAggregator()
+                upload_fairness.update_batch(input_df[SENSITIVE_COLUMN],
+                                             input_df['Creditworthy_Prediction'] == 'Eligible',
+                                             y_true if has_ground_truth else None)
+                if serving.fairness is not None:
+                    serving.fairness.merge(upload_fairness)
+                if has_ground_truth:
+                    # Only report fairness if ground truth is present
+                    report = upload_fairness.report()
                     fairness_metrics = {
-                        'selection_rate': mf.by_group['selection_rate'].to_dict(),
-                        'equal_opportunity': mf.by_group['equal_opportunity'].to_dict()
+                        'selection_rate': report['selection_rate'],
+                        'equal_opportunity': report['equal_opportunity']
                     }
-                    # Observations
-                    rates = mf.by_group['selection_rate']
-                    max_group = rates.idxmax()
-                    min_group = rates.idxmin()
-                    diff = rates[max_group] - rates[min_group]
-                    fairness_observation = f"{max_group} group approval rate is {diff:.2%} higher than {min_group} group."
-                    if abs(diff) > 0.1:
-                        fairness_observation += " Mitigation recommended: Consider reweighting or post-processing."
-
-            # Convert DataFrame to a list of dictionaries for JSON response
-            results = input_df.to_dict('records')
-            return jsonify({
-                'predictions': results,
-                'metrics': evaluation_metrics,
-                'fairness_metrics': fairness_metrics,
-                'fairness_observation': fairness_observation
-            })
+                    fairness_observation = report['observation']
+
+            # Serialize the scored DataFrame in the negotiated format
+            with telemetry.timed('/predict_csv', 'serialize'):
+                return render_predictions(input_df, response_format, {
+                    'metrics': serving.metrics,
+                    'fairness_metrics': fairness_metrics,
+                    'fairness_observation': fairness_observation,
+                    'rejected_rows': rejected_rows
+                })
+        except ImportError as e:
+            return jsonify({'error': str(e)}), 415
         except Exception as e:
-            import traceback
             print(traceback.format_exc())
             return jsonify({'error': f"Error processing file: {str(e)}"}), 500
 
     return jsonify({'error': 'An unknown error occurred.'}), 500
 
+# ==============================================================================
+# Step 4.2: API Endpoints for Explanations (TreeSHAP)
+# ==============================================================================
+@app.route('/explain', methods=['POST'])
+def explain():
+    """
+    Endpoint to explain the prediction of a single user input, feature by feature.
+    """
+    serving = model_manager.current
+    if serving is None:
+        return jsonify({'error': 'Model is not trained or loaded. Please check backend logs.'}), 500
+
+    try:
+        with telemetry.timed('/explain', 'parse'):
+            user_input = request.json
+        if not isinstance(user_input, dict):
+            return jsonify({'error': 'Request body must be a JSON object.'}), 400
+        telemetry.count_rows('/explain', 1)
+        with telemetry.timed('/explain', 'validation'):
+            error_bits = serving.validator.validate_record(user_input)
+        if error_bits:
+            return jsonify({'error': '; '.join(serving.validator.describe(error_bits)) + '.'}), 400
+
+        with telemetry.timed('/explain', 'preprocess'):
+            user_features_processed = serving.encoder.encode_row(user_input)
+        telemetry.record_model_batch('/explain', 1)
+        with telemetry.timed('/explain', 'explain'):
+            explainer = serving.explainer
+            explanation = explainer.explain(user_features_processed)
+        with telemetry.timed('/explain', 'serialize'):
+            # Contributions are in log-odds: base_value plus their sum is the model's margin
+            return jsonify(dict(explainer.records(*explanation)[0], model_version=serving.version))
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/explain_csv', methods=['POST'])
+def explain_csv():
+    """
+    Endpoint to explain the predictions of every row of a CSV file in one batch.
+    """
+    serving = model_manager.current
+    if serving is None:
+        return jsonify({'error': 'Model is not trained or loaded. Please check backend logs.'}), 500
+
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file part in the request'}), 400
+
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No selected file'}), 400
+
+    try:
+        with telemetry.timed('/explain_csv', 'parse'):
+            input_df = read_upload(file.stream, serving.validator)
+        telemetry.count_rows('/explain_csv', len(input_df))
+
+        # Invalid rows are reported and not explained, as in /predict_csv
+        with telemetry.timed('/explain_csv', 'validation'):
+            error_bits = serving.validator.validate_frame(input_df.drop(columns=['Creditworthy'], errors='ignore'))
+            ids = input_df['Partner ID'].to_numpy() if 'Partner ID' in input_df.columns else None
+            rejected_rows = serving.validator.rejected_rows(error_bits, input_df.index, ids)
+        if rejected_rows:
+            if len(rejected_rows) == len(input_df):
+                return jsonify({'error': 'No valid rows to explain.', 'rejected_rows': rejected_rows}), 400
+            input_df = input_df[error_bits == 0]
+
+        with telemetry.timed('/explain_csv', 'preprocess'):
+            user_features_processed = serving.encoder.encode_frame(input_df)
+        telemetry.record_model_batch('/explain_csv', len(user_features_processed))
+        with telemetry.timed('/explain_csv', 'explain'):
+            explainer = serving.explainer
+            explanation = explainer.explain(user_features_processed)
+
+        with telemetry.timed('/explain_csv', 'serialize'):
+            records = explainer.records(*explanation)
+            if 'Partner ID' in input_df.columns:
+                for record, partner_id in zip(records, input_df['Partner ID'].tolist()):
+                    record['Partner ID'] = partner_id
+            return jsonify({
+                'explanations': records,
+                'features': explainer.features,
+                'base_value': explainer.base_value,
+                'model_version': serving.version,
+                'rejected_rows': rejected_rows
+            })
+    except ImportError as e:
+        return jsonify({'error': str(e)}), 415
+    except Exception as e:
+        print(traceback.format_exc())
+        return jsonify({'error': f"Error processing file: {str(e)}"}), 500
 
 # ==============================================================================
-# Step 5: Main function to train the model once and run the server
+# Step 4.5: Runtime Statistics and Health Checks
 # ==============================================================================
-def main():
+@app.route('/stats', methods=['GET'])
+def stats():
     """
-    Initializes the model and runs the Flask server.
+    Endpoint to report runtime counters of the optional serving components.
+    Under serve.py the counters of the other workers are listed under 'other_workers'.
     """
-    global model, train_features_columns, evaluation_metrics
+    stats = runtime_stats()
+    if worker_state is not None:
+        stats['worker'] = worker_state.worker
+        stats['other_workers'] = worker_state.others('stats')
+    return jsonify(stats)
 
-    print("--- Starting the Nova Backend ---")
-    print("Step 1: Loading and preprocessing data...")
-    train_df, target_column = load_and_preprocess_data('catalyst_train.csv')
 
+def runtime_stats():
+    """
+    Returns the runtime counters of this process's serving components.
+    """
+    return {
+        'micro_batching': micro_batcher.stats() if micro_batcher is not None else None,
+        'prediction_cache': prediction_cache.stats() if prediction_cache is not None else None,
+        'model': model_manager.stats(),
+        'jobs': job_queue.stats(),
+        'audit_log': audit_log.stats() if audit_log is not None else None
+    }
+
+
+@app.route('/fairness', methods=['GET'])
+def fairness_report():
+    """
+    Endpoint to report the running per-group selection rate and equal-opportunity gaps.
+    """
+    serving = model_manager.current
+    if serving is None or serving.fairness is None:
+        return jsonify({'error': 'Model is not trained or loaded. Please check backend logs.'}), 500
+    if worker_state is not None:
+        return jsonify(serving.fairness.combined(worker_state.others('fairness')).report())
+    return jsonify(serving.fairness.report())
+
+
+@app.route('/drift', methods=['GET'])
+def drift_report():
+    """
+    Endpoint to report per-feature drift (PSI and KS) of the scored traffic against the training data.
+    """
+    serving = model_manager.current
+    if serving is None:
+        return jsonify({'error': 'Model is not trained or loaded. Please check backend logs.'}), 500
+    if serving.drift is None:
+        return jsonify({'error': 'The served bundle has no training-time feature profile; export a new one.'}), 404
+    return jsonify(serving.drift.report(worker_state.others('drift') if worker_state is not None else ()))
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """
+    Liveness probe: the process is up and answering requests.
+    """
+    return jsonify({'status': 'ok', 'model_loaded': model_manager.current is not None, 'pid': os.getpid()})
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """
+    Readiness probe: 200 once a model is loaded and can serve predictions, 503 before.
+    """
+    serving = model_manager.current
+    if serving is None:
+        return jsonify({'status': 'not ready', 'model_loaded': False}), 503
+    return jsonify({'status': 'ready', 'model_loaded': True, 'model_version': serving.version})
+
+
+# ==============================================================================
+# Step 5: Model Artifacts
+# ==============================================================================
+def train_and_export(data_path='catalyst_train.csv', artifacts_dir=ARTIFACTS_DIR, data_hash=None, segmented=False):
+    """
+    Trains the model on data_path and exports it as a new versioned bundle.
+    With segmented=True the bundle also holds one model per Partner Type.
+    Returns the bundle directory, or None if the training data is missing.
+    """
+    print("Loading and preprocessing data...")
+    train_df, target_column = load_and_preprocess_data(data_path, cache=True)
     if train_df is None:
-        print("Please ensure 'catalyst_train.csv' exists. Exiting.")
-        return
+        return None
+
+    print("Training the model and evaluating performance...")
+    segments = None
+    if segmented:
+        segments = pd.read_csv(data_path, usecols=[SEGMENT_COLUMN])[SEGMENT_COLUMN].loc[train_df.index]
+    trained_model, X_test, y_test = train_model(train_df, target_column, segments)
+    # The test rows' fairness counts seed the running counters of the served model
+    fairness_seed = FairnessAggregator()
+    metrics = evaluate_model(trained_model, X_test, y_test, load_sensitive_features(data_path, X_test.index),
+                             fairness_seed)
+
+    feature_columns = train_df.drop(columns=[target_column]).columns
+    # Reference distribution of every feature, which /drift compares the scored traffic with
+    drift_profile = DriftProfile.build([pd.read_csv(data_path)], feature_columns)
+    extra_manifest = {'fairness_seed': fairness_seed.counts()}
+    segment_models = None
+    if segmented:
+        # The holdout metrics of the global model alone, for comparison with the segmented ones
+        print("Global model alone:")
+        extra_manifest['training'] = {
+            'mode': 'segmented',
+            'global_metrics': {k: float(v) for k, v in evaluate_model(trained_model.global_model, X_test, y_test).items()},
+        }
+        segment_models = trained_model.segment_models
+        trained_model = trained_model.global_model
+    bundle_path = save_bundle(trained_model, feature_columns, metrics,
+                              data_path, data_hash=data_hash, artifacts_dir=artifacts_dir,
+                              extra_manifest=extra_manifest,
+                              extra_files={DRIFT_PROFILE_FILE: drift_profile.to_dict()},
+                              segment_models=segment_models)
+    print(f"Model bundle exported to {bundle_path}")
+    return bundle_path
+
+def initialize_backend(retrain=False, data_path='catalyst_train.csv', artifacts_dir=ARTIFACTS_DIR):
+    """
+    Loads the latest model bundle and makes it the served model.
 
-    print("Step 2: Training the model and evaluating performance...")
-    model, X_test, y_test = train_model(train_df, target_column)
-    train_features_columns = train_df.drop(columns=[target_column]).columns
-    evaluation_metrics = evaluate_model(model, X_test, y_test)
+    A new bundle is trained only when none exists yet, or with retrain=True when
+    the hash of the training data differs from the one recorded in the latest
+    bundle. In the latter case the latest bundle serves right away and the new
+    one is trained in the background and then hot-swapped in. Returns False if
+    no model could be loaded.
+    """
+    retrain_hash = None
+    bundle_path = latest_bundle_path(artifacts_dir)
+    if bundle_path is None or retrain:
+        if not os.path.isfile(data_path):
+            print(f"Error: The file {data_path} was not found.")
+            if bundle_path is None:
+                return False
+        else:
+            data_hash = file_sha256(data_path)
+            if bundle_path is not None and read_manifest(bundle_path).get('data_hash') == data_hash:
+                print(f"Training data unchanged since bundle {os.path.basename(bundle_path)}, skipping retraining.")
+            elif bundle_path is not None:
+                retrain_hash = data_hash
+            else:
+                bundle_path = train_and_export(data_path, artifacts_dir, data_hash=data_hash)
+                if bundle_path is None:
+                    return False
+
+    started = time.perf_counter()
+    serving = load_serving_model(bundle_path)
+    # The watcher looks for newer bundles in the same directory
+    model_manager.artifacts_dir = artifacts_dir
+    model_manager.activate(serving)
+    print(f"Loaded model bundle {serving.version} in {(time.perf_counter() - started) * 1000:.0f} ms "
+          f"({INFERENCE_ENGINE} inference engine)")
+    if retrain_hash is not None:
+        print("Training data changed; retraining in the background while the current model serves.")
+        threading.Thread(target=retrain_in_background, args=(data_path, artifacts_dir, retrain_hash),
+                         name='nova-retrain', daemon=True).start()
+    return True
+
+def retrain_in_background(data_path, artifacts_dir, data_hash):
+    """
+    Trains and exports a new bundle, then hands it to the model manager to check and swap in.
+    """
+    try:
+        if train_and_export(data_path, artifacts_dir, data_hash=data_hash) is not None:
+            model_manager.poll()
+    except Exception:
+        print(traceback.format_exc())
 
-    print("\nModel trained successfully! Metrics:")
-    for key, value in evaluation_metrics.items():
+def load_serving_model(bundle_path):
+    """
+    Loads a bundle into a ServingModel, together with the fairness counters and drift monitor of that model.
+    """
+    bundle = load_bundle(bundle_path)
+    serving = ServingModel.from_bundle(bundle, INFERENCE_ENGINE, MODEL_THREADS)
+    # Resume the fairness counters of this model, or start from its training evaluation
+    fairness = FairnessAggregator.load(FAIRNESS_PATH)
+    if fairness is None or fairness.model_version != serving.version:
+        fairness = FairnessAggregator(model_version=serving.version, counts=bundle.manifest.get('fairness_seed'),
+                                      path=FAIRNESS_PATH)
+    serving.fairness = fairness
+    # Bundles exported before drift monitoring get their profile from the training data, if it is unchanged
+    data_path = bundle.manifest.get('data_path')
+    if serving.drift is None and data_path and os.path.isfile(data_path) \
+            and file_sha256(data_path) == bundle.manifest.get('data_hash'):
+        reference = DriftProfile.build([pd.read_csv(data_path)], serving.feature_columns)
+        serving.drift = DriftMonitor(reference, serving.version)
+    return serving
+
+def on_model_swap(previous, serving):
+    """
+    Called by the model manager whenever a model starts serving.
+    """
+    if prediction_cache is not None:
+        # Cached answers belong to the previous model; drop them all
+        prediction_cache.set_model_version(serving.version)
+    if previous is not None and serving.fairness is not None:
+        # The counters file now tracks the new model
+        serving.fairness.save()
+
+def start_background_services():
+    """
+    Starts the audit log writer, the fairness saver, the model watcher, the job dispatcher and, if enabled, the
+    /predict micro-batcher.
+    """
+    global micro_batcher, audit_log
+
+    # Fairness counters are saved by a background thread while scoring and once more on exit
+    fairness_saver.start()
+    atexit.register(fairness_saver.stop)
+
+    # Scored records are appended to the audit log by a background writer thread
+    serving = model_manager.current
+    audit_columns = ((list(serving.input_columns) if serving is not None else [])
+                     or pd.read_csv('catalyst_train.csv', nrows=0).columns.tolist())
+    audit_log = AuditLogWriter(AUDIT_LOG_PATH, audit_columns + ['Creditworthy_Prediction'], fmt=AUDIT_LOG_FORMAT,
+                               max_queue=AUDIT_QUEUE_SIZE, max_bytes=AUDIT_MAX_BYTES,
+                               max_age=AUDIT_MAX_AGE_SECONDS, when_full=AUDIT_WHEN_FULL,
+                               block_timeout=AUDIT_BLOCK_TIMEOUT_SECONDS).start()
+
+    if USE_MICRO_BATCHING:
+        print(f"Micro-batching /predict: up to {BATCH_MAX_SIZE} rows or {BATCH_MAX_WAIT_MS} ms per batch")
+        micro_batcher = MicroBatcher(predict_micro_batch, max_wait_ms=BATCH_MAX_WAIT_MS,
+                                     max_batch_size=BATCH_MAX_SIZE).start()
+
+    if model_manager.poll_interval > 0:
+        mode = 'shadow scored until promoted' if model_manager.shadow_mode else 'swapped in'
+        print(f"Watching '{model_manager.artifacts_dir}' every {model_manager.poll_interval:g} s; "
+              f"new bundles are {mode}")
+        model_manager.start()
+
+    job_queue.start()
+
+def predict_micro_batch(X):
+    """
+    Scores one coalesced batch of /predict rows for the micro-batcher.
+    """
+    telemetry.record_model_batch('/predict', len(X))
+    # Hot swaps keep the feature columns, so rows encoded for the previous model still fit
+    return model_manager.current.predictor.predict(X)
+
+# ==============================================================================
+# Step 6: Main function to load the model and run the server
+# ==============================================================================
+def main(argv=None):
+    """
+    Initializes the model and runs the Flask server.
+    """
+    parser = argparse.ArgumentParser(description="Nova loan eligibility backend.")
+    parser.add_argument('--retrain', action='store_true',
+                        help="Retrain and export a new model bundle if the training data changed.")
+    parser.add_argument('--data', default='catalyst_train.csv', help="Training data CSV.")
+    parser.add_argument('--artifacts', default=ARTIFACTS_DIR, help="Directory holding the model bundles.")
+    args = parser.parse_args(argv)
+
+    print("--- Starting the Nova Backend ---")
+    if not initialize_backend(retrain=args.retrain, data_path=args.data, artifacts_dir=args.artifacts):
+        print(f"Please ensure '{args.data}' exists. Exiting.")
+        return
+
+    print("\nModel metrics:")
+    for key, value in model_manager.current.metrics.items():
         print(f"- {key.capitalize()}: {value:.4f}")
 
+    start_background_services()
+
     print("\n--- Starting Flask server on http://127.0.0.1:5000 ---")
     # This will serve the API, ready to accept requests from the frontend
     app.run(debug=True, port=5000, use_reloader=False)
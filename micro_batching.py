@@ -0,0 +1,139 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-row predictions into batched predict calls.
+
+    Requests are queued by submit(). A background thread takes the first
+    waiting row, keeps collecting rows until either max_batch_size rows are
+    queued or max_wait_ms has passed since that first row arrived, scores the
+    whole batch with one predict_fn call and hands every caller its own row of
+    the result through a Future.
+    """
+
+    def __init__(self, predict_fn, max_wait_ms=2.0, max_batch_size=32):
+        self.predict_fn = predict_fn
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max(1, int(max_batch_size))
+
+        self._queue = queue.Queue()
+        self._thread = None
+
+        # Counters, written by the worker thread and read by stats()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._rows = 0
+        self._errors = 0
+        self._batch_sizes = {}
+        self._queued_seconds_total = 0.0
+        self._queued_seconds_max = 0.0
+
+    def start(self):
+        """
+        Starts the background batching thread.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='nova-micro-batcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Stops the batching thread after the rows already queued are scored.
+        """
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, row):
+        """
+        Queues a single encoded row and returns a Future for its prediction.
+        """
+        future = Future()
+        self._queue.put((np.asarray(row, dtype=np.float32).reshape(1, -1), future, time.perf_counter()))
+        return future
+
+    def predict(self, row, timeout=None):
+        """
+        Queues a single encoded row and blocks until its prediction is ready.
+        """
+        return self.submit(row).result(timeout)
+
+    def stats(self):
+        """
+        Returns the batch-size distribution and queueing time counters.
+        """
+        with self._lock:
+            return {
+                'batches': self._batches,
+                'rows': self._rows,
+                'errors': self._errors,
+                'mean_batch_size': self._rows / self._batches if self._batches else 0.0,
+                'batch_size_counts': dict(sorted(self._batch_sizes.items())),
+                'queued_ms_total': self._queued_seconds_total * 1000.0,
+                'queued_ms_mean': self._queued_seconds_total * 1000.0 / self._rows if self._rows else 0.0,
+                'queued_ms_max': self._queued_seconds_max * 1000.0,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'max_batch_size': self.max_batch_size,
+            }
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+
+            batch = [item]
+            stopping = False
+            deadline = item[2] + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    if remaining > 0:
+                        item = self._queue.get(timeout=remaining)
+                    else:
+                        # Window is over, but still take whatever is already waiting
+                        item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._score(batch)
+            if stopping:
+                return
+
+    def _score(self, batch):
+        started = time.perf_counter()
+        waits = [started - enqueued for _, _, enqueued in batch]
+
+        try:
+            predictions = self.predict_fn(np.vstack([row for row, _, _ in batch]))
+        except Exception as e:
+            with self._lock:
+                self._errors += 1
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        with self._lock:
+            size = len(batch)
+            self._batches += 1
+            self._rows += size
+            self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+            self._queued_seconds_total += sum(waits)
+            self._queued_seconds_max = max(self._queued_seconds_max, max(waits))
+
+        for (_, future, _), prediction in zip(batch, predictions):
+            future.set_result(prediction)
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import platform
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+import sklearn
+import xgboost
+from xgboost import XGBClassifier
+
+from segments import SEGMENT_COLUMN, SegmentedModel
+from tree_engine import TreeEnsemble
+
+# Default location of the versioned bundles; each version lives in its own sub-directory
+ARTIFACTS_DIR = os.environ.get('NOVA_ARTIFACTS_DIR', 'artifacts')
+LATEST_FILE = 'LATEST'
+MANIFEST_FILE = 'manifest.json'
+MODEL_FILE = 'model.ubj'
+TREE_ENSEMBLE_FILE = 'tree_ensemble.npz'
+BUNDLE_FORMAT_VERSION = 1
+
+
+class ModelBundle:
+    """
+    A loaded artifact bundle: the model plus everything needed to serve it.
+    """
+
+    def __init__(self, path, manifest, model):
+        self.path = path
+        self.manifest = manifest
+        self.model = model
+        self.version = manifest['version']
+        self.feature_columns = list(manifest['feature_columns'])
+        self.input_columns = list(manifest.get('input_columns', []))
+        self.metrics = dict(manifest.get('metrics', {}))
+        self.data_hash = manifest.get('data_hash')
+
+    def tree_ensemble(self):
+        """
+        Returns the model as a NumPy TreeEnsemble, from the exported arrays when present.
+        """
+        exported = self.manifest.get('tree_ensemble_file')
+        if exported and os.path.isfile(os.path.join(self.path, exported)):
+            return TreeEnsemble.load(os.path.join(self.path, exported))
+        return TreeEnsemble.from_booster(self.model)
+
+    def segmented(self, predictor, engine='xgboost', n_jobs=0):
+        """
+        Wraps predictor (the global model) in a SegmentedModel when the bundle has per-segment models.
+
+        The segment models are loaded for the same inference engine as
+        predictor. Bundles without segments return predictor unchanged.
+        """
+        segments = self.manifest.get('segments')
+        if not segments:
+            return predictor
+        models = {}
+        for category, files in segments['models'].items():
+            model = XGBClassifier()
+            model.load_model(os.path.join(self.path, files['model_file']))
+            if engine == 'numpy':
+                models[category] = TreeEnsemble.load(os.path.join(self.path, files['tree_ensemble_file']))
+            else:
+                if n_jobs:
+                    model.set_params(n_jobs=n_jobs)
+                models[category] = model
+        return SegmentedModel(predictor, models, self.feature_columns, column=segments['column'])
+
+
+def file_sha256(path, block_size=1 << 20):
+    """
+    Returns the SHA-256 hex digest of a file, read in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def library_versions():
+    """
+    Versions of the libraries that determine how a bundle is loaded and scored.
+    """
+    return {
+        'python': platform.python_version(),
+        'xgboost': xgboost.__version__,
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'scikit-learn': sklearn.__version__,
+    }
+
+
+def latest_bundle_path(artifacts_dir=ARTIFACTS_DIR):
+    """
+    Returns the directory of the newest bundle, or None if nothing was exported yet.
+    """
+    pointer = os.path.join(artifacts_dir, LATEST_FILE)
+    if not os.path.isfile(pointer):
+        return None
+    with open(pointer, 'r', encoding='utf-8') as f:
+        version = f.read().strip()
+    path = os.path.join(artifacts_dir, version)
+    return path if os.path.isfile(os.path.join(path, MANIFEST_FILE)) else None
+
+
+def read_manifest(bundle_path):
+    """
+    Reads the manifest of a bundle directory.
+    """
+    with open(os.path.join(bundle_path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_bundle(model, feature_columns, metrics, data_path, data_hash=None, input_columns=None,
+                artifacts_dir=ARTIFACTS_DIR, extra_manifest=None, extra_files=None, segment_models=None):
+    """
+    Writes a new versioned bundle and points LATEST at it.
+
+    The bundle is staged in a temporary directory and renamed into place, so a
+    reader never sees a half-written version. extra_files maps file names to
+    JSON-serializable objects written next to the manifest. segment_models
+    maps Partner Types to models trained on their rows only (see
+    segments.SegmentedModel); model is then the global fallback. Returns the
+    bundle directory.
+    """
+    if data_hash is None:
+        data_hash = file_sha256(data_path)
+    if input_columns is None:
+        input_columns = pd.read_csv(data_path, nrows=0).columns.tolist()
+
+    os.makedirs(artifacts_dir, exist_ok=True)
+    version = f"{time.strftime('%Y%m%d-%H%M%S')}-{data_hash[:8]}"
+    suffix = 1
+    while os.path.exists(os.path.join(artifacts_dir, version)):
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{data_hash[:8]}-{suffix}"
+        suffix += 1
+    staging = os.path.join(artifacts_dir, f".staging-{version}-{os.getpid()}")
+    final = os.path.join(artifacts_dir, version)
+    os.makedirs(staging)
+
+    try:
+        model.save_model(os.path.join(staging, MODEL_FILE))
+        TreeEnsemble.from_booster(model).save(os.path.join(staging, TREE_ENSEMBLE_FILE))
+        manifest = {
+            'format_version': BUNDLE_FORMAT_VERSION,
+            'version': version,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'model_file': MODEL_FILE,
+            'tree_ensemble_file': TREE_ENSEMBLE_FILE,
+            'feature_columns': [str(c) for c in feature_columns],
+            'input_columns': [str(c) for c in input_columns],
+            'metrics': {k: float(v) for k, v in metrics.items()},
+            'data_path': os.path.basename(data_path),
+            'data_hash': data_hash,
+            'libraries': library_versions(),
+        }
+        if segment_models:
+            files = {}
+            for number, (category, segment_model) in enumerate(segment_models.items(), start=1):
+                files[category] = {'model_file': f'segment-{number}.ubj',
+                                   'tree_ensemble_file': f'segment-{number}.npz'}
+                segment_model.save_model(os.path.join(staging, files[category]['model_file']))
+                TreeEnsemble.from_booster(segment_model).save(
+                    os.path.join(staging, files[category]['tree_ensemble_file']))
+            manifest['segments'] = {'column': SEGMENT_COLUMN, 'models': files}
+        if extra_manifest:
+            manifest.update(extra_manifest)
+        for name, content in (extra_files or {}).items():
+            with open(os.path.join(staging, name), 'w', encoding='utf-8') as f:
+                json.dump(content, f, indent=2)
+        with open(os.path.join(staging, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(staging, final)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    _write_latest(artifacts_dir, version)
+    return final
+
+
+def load_bundle(bundle_path=None, artifacts_dir=ARTIFACTS_DIR):
+    """
+    Loads a bundle directory (the latest one by default) into a ModelBundle.
+    """
+    if bundle_path is None:
+        bundle_path = latest_bundle_path(artifacts_dir)
+        if bundle_path is None:
+            raise FileNotFoundError(f"No model bundle found in '{artifacts_dir}'.")
+
+    manifest = read_manifest(bundle_path)
+    model = XGBClassifier()
+    model.load_model(os.path.join(bundle_path, manifest.get('model_file', MODEL_FILE)))
+    return ModelBundle(bundle_path, manifest, model)
+
+
+def _write_latest(artifacts_dir, version):
+    pointer = os.path.join(artifacts_dir, LATEST_FILE)
+    tmp = f"{pointer}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(version + '\n')
+    os.replace(tmp, pointer)
@@ -0,0 +1,223 @@
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from drift import DRIFT_PROFILE_FILE, DriftProfile
+from fairness import SENSITIVE_COLUMN, FairnessAggregator
+from feature_encoder import FeatureEncoder
+from model_artifacts import ARTIFACTS_DIR, file_sha256, save_bundle
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet input is optional
+    pq = None
+
+# Columns that are never model features, as in load_and_preprocess_data
+DROPPED_COLUMNS = ('Partner ID',)
+
+# Same model as the in-memory XGBClassifier(eval_metric='logloss') with default parameters
+TRAIN_PARAMS = {
+    'objective': 'binary:logistic',
+    'eval_metric': 'logloss',
+    'tree_method': 'hist',
+}
+NUM_BOOST_ROUND = 100
+
+
+def iter_raw_chunks(path, chunk_rows):
+    """
+    Yields DataFrames of at most chunk_rows raw rows from a CSV file, a Parquet
+    file or a directory of Parquet part files.
+    """
+    if os.path.isdir(path) or path.endswith('.parquet'):
+        if pq is None:
+            raise ImportError("pyarrow is required to train from Parquet input.")
+        files = sorted(glob.glob(os.path.join(path, '*.parquet'))) if os.path.isdir(path) else [path]
+        for name in files:
+            for batch in pq.ParquetFile(name).iter_batches(batch_size=chunk_rows):
+                yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+
+
+def data_hash(path):
+    """
+    SHA-256 of the training data; a Parquet directory hashes its part files in order.
+    """
+    if not os.path.isdir(path):
+        return file_sha256(path)
+    digest = hashlib.sha256()
+    for name in sorted(glob.glob(os.path.join(path, '*.parquet'))):
+        digest.update(file_sha256(name).encode('ascii'))
+    return digest.hexdigest()
+
+
+def scan_schema(path, chunk_rows, target_column='Creditworthy'):
+    """
+    Reads the data once to find the training feature columns.
+
+    A column is one-hot encoded when it is non-numeric in any chunk, and the
+    categories are collected over the whole file, so the columns come out
+    the same as pd.get_dummies(drop_first=True) on the fully loaded data.
+    """
+    input_columns = None
+    categorical = {}
+    rows = 0
+    for chunk in iter_raw_chunks(path, chunk_rows):
+        if input_columns is None:
+            input_columns = chunk.columns.tolist()
+        rows += len(chunk)
+        for col in chunk.columns:
+            if col in DROPPED_COLUMNS or col == target_column:
+                continue
+            if col in categorical or not pd.api.types.is_numeric_dtype(chunk[col]):
+                categorical.setdefault(col, set()).update(chunk[col].dropna().astype(str).unique())
+
+    if input_columns is None:
+        raise ValueError(f"No rows found in '{path}'.")
+
+    numeric = [c for c in input_columns if c not in DROPPED_COLUMNS and c != target_column and c not in categorical]
+    feature_columns = list(numeric)
+    for col in input_columns:
+        if col in categorical:
+            feature_columns += [f"{col}_{category}" for category in sorted(categorical[col])[1:]]
+    return {
+        'input_columns': input_columns,
+        'feature_columns': feature_columns,
+        'target_column': target_column,
+        'rows': rows,
+    }
+
+
+def iter_encoded_chunks(path, schema, chunk_rows, holdout=False, test_size=0.2, seed=42, with_groups=False):
+    """
+    Yields (X, y) float32 arrays of the training (or holdout) rows of every chunk,
+    plus the raw SENSITIVE_COLUMN values of those rows with with_groups=True.
+
+    Rows with missing or non-numeric values are dropped, as in
+    load_and_preprocess_data. The split is drawn from a generator seeded with
+    the chunk number, so every pass over the data sees the same rows.
+    """
+    encoder = FeatureEncoder(schema['feature_columns'])
+    target_column = schema['target_column']
+    for index, chunk in enumerate(iter_raw_chunks(path, chunk_rows)):
+        X = encoder.encode_frame(chunk)
+        y = pd.to_numeric(chunk[target_column], errors='coerce').to_numpy(dtype=np.float32, na_value=np.nan)
+        keep = ~(np.isnan(X).any(axis=1) | np.isnan(y))
+        in_holdout = np.random.default_rng([seed, index]).random(len(chunk)) < test_size
+        keep &= in_holdout if holdout else ~in_holdout
+        if not keep.any():
+            continue
+        if with_groups:
+            groups = chunk[SENSITIVE_COLUMN].to_numpy()[keep] if SENSITIVE_COLUMN in chunk.columns else None
+            yield X[keep], y[keep], groups
+        else:
+            yield X[keep], y[keep]
+
+
+class ChunkIterator(xgb.DataIter):
+    """
+    Feeds the encoded training chunks to XGBoost's external-memory interface.
+    """
+
+    def __init__(self, path, schema, chunk_rows, cache_prefix, test_size=0.2, seed=42):
+        super().__init__(cache_prefix=cache_prefix)
+        self.path = path
+        self.schema = schema
+        self.chunk_rows = chunk_rows
+        self.test_size = test_size
+        self.seed = seed
+        self._chunks = None
+
+    def next(self, input_data):
+        if self._chunks is None:
+            self._chunks = iter_encoded_chunks(self.path, self.schema, self.chunk_rows,
+                                               test_size=self.test_size, seed=self.seed)
+        for X, y in self._chunks:
+            input_data(data=X, label=y)
+            return True
+        return False
+
+    def reset(self):
+        self._chunks = None
+
+
+def evaluate_chunks(booster, path, schema, chunk_rows, test_size=0.2, seed=42, fairness_counts=None):
+    """
+    Computes the evaluate_model metrics on the holdout rows, one chunk at a time.
+    Per-group counts are added to fairness_counts if given.
+    """
+    tp = fp = tn = fn = 0
+    for X, y, groups in iter_encoded_chunks(path, schema, chunk_rows, holdout=True, test_size=test_size,
+                                            seed=seed, with_groups=True):
+        predicted = booster.inplace_predict(X) > 0.5
+        if fairness_counts is not None and groups is not None:
+            fairness_counts.update_batch(groups, predicted, y)
+        actual = y == 1
+        tp += int(np.sum(predicted & actual))
+        fp += int(np.sum(predicted & ~actual))
+        tn += int(np.sum(~predicted & ~actual))
+        fn += int(np.sum(~predicted & actual))
+
+    total = tp + fp + tn + fn
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return {
+        'accuracy': (tp + tn) / total if total else 0.0,
+        'precision': precision,
+        'recall': recall,
+        'f1_score': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+    }
+
+
+def train_out_of_core(data_path, artifacts_dir=ARTIFACTS_DIR, chunk_rows=100_000, test_size=0.2, seed=42):
+    """
+    Trains the credit model on data that does not fit in memory and exports a bundle.
+
+    The data is read chunk by chunk: once to find the schema, then by XGBoost
+    through ChunkIterator while it builds its quantized pages in an on-disk
+    cache, once more for the holdout metrics and once for the drift reference
+    profile (binned at the first chunk's deciles). Peak memory is bounded by
+    the chunk size plus XGBoost's page cache, not by the size of the data.
+    Returns the bundle directory.
+    """
+    print(f"Scanning the schema of {data_path}...")
+    schema = scan_schema(data_path, chunk_rows)
+    print(f"{schema['rows']} rows, {len(schema['feature_columns'])} features")
+
+    cache_dir = tempfile.mkdtemp(prefix='nova-xgb-cache-')
+    try:
+        print("Training the model from chunks (external memory)...")
+        iterator = ChunkIterator(data_path, schema, chunk_rows, os.path.join(cache_dir, 'cache'),
+                                 test_size=test_size, seed=seed)
+        dtrain = xgb.ExtMemQuantileDMatrix(iterator)
+        booster = xgb.train(TRAIN_PARAMS, dtrain, num_boost_round=NUM_BOOST_ROUND)
+        del dtrain
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    booster.feature_names = list(schema['feature_columns'])
+
+    print("Evaluating on the holdout rows...")
+    fairness_seed = FairnessAggregator()
+    metrics = evaluate_chunks(booster, data_path, schema, chunk_rows, test_size=test_size, seed=seed,
+                              fairness_counts=fairness_seed)
+
+    print("Profiling the feature distributions for drift monitoring...")
+    drift_profile = DriftProfile.build(iter_raw_chunks(data_path, chunk_rows), schema['feature_columns'])
+
+    # A plain Booster file loads into XGBClassifier, so app.py and main.py serve it unchanged
+    bundle_path = save_bundle(booster, schema['feature_columns'], metrics, data_path,
+                              data_hash=data_hash(data_path), input_columns=schema['input_columns'],
+                              artifacts_dir=artifacts_dir,
+                              extra_manifest={'training': {'mode': 'out_of_core', 'chunk_rows': chunk_rows,
+                                                           'rows': schema['rows']},
+                                              'fairness_seed': fairness_seed.counts()},
+                              extra_files={DRIFT_PROFILE_FILE: drift_profile.to_dict()})
+    print(f"Model bundle exported to {bundle_path}")
+    return bundle_path
@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of predictions with a per-entry time-to-live.
+
+    Keys are built by key() from the version of the model that scores the
+    request and the canonical feature values of a record, so a cached answer
+    can never be served for a different model. set_model_version() drops
+    every entry when the served model changes, which frees the memory held by
+    the old version, and put() ignores answers of any other version, so a
+    request that started before a swap cannot fill the cache again.
+    """
+
+    def __init__(self, max_size=10000, ttl=300.0):
+        self.max_size = max(1, int(max_size))
+        self.ttl = ttl
+        self.model_version = None
+
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    def key(self, model_version, canonical_values):
+        """
+        Returns the cache key for a record's canonical feature values scored by model_version.
+        """
+        return (model_version,) + tuple(canonical_values)
+
+    def get(self, key):
+        """
+        Returns the cached value for key, or None on a miss or an expired entry.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Stores value under key, evicting the least recently used entries beyond max_size.
+        """
+        with self._lock:
+            if key[0] != self.model_version:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def set_model_version(self, version):
+        """
+        Switches the cache to a new model version, dropping all entries if it changed.
+        """
+        with self._lock:
+            if version != self.model_version:
+                if self._entries:
+                    self._invalidations += 1
+                self._entries.clear()
+                self.model_version = version
+
+    def stats(self):
+        """
+        Returns hit, miss and eviction counters.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'model_version': self.model_version,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'invalidations': self._invalidations,
+            }
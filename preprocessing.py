@@ -0,0 +1,165 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from model_artifacts import ARTIFACTS_DIR, file_sha256
+
+# Set NOVA_PREPROCESS_CACHE=0 to always parse the CSV and never write a cache
+USE_PREPROCESS_CACHE = os.environ.get('NOVA_PREPROCESS_CACHE', '1') != '0'
+
+# Cached training matrices, one directory per CSV content hash
+PREPROCESS_CACHE_DIR = os.path.join(ARTIFACTS_DIR, 'preprocess_cache')
+
+# Cached matrices kept; older ones are deleted when a new one is written
+PREPROCESS_CACHE_KEEP = 3
+
+# Bump whenever load_and_preprocess_data changes its output, so existing caches are rebuilt
+PREPROCESSING_VERSION = 1
+
+TARGET_COLUMN = 'Creditworthy'
+
+# Files of a preprocessing cache directory
+FEATURES_FILE = 'features.npy'
+LABELS_FILE = 'labels.npy'
+INDEX_FILE = 'index.npy'
+META_FILE = 'meta.json'
+
+
+def load_and_preprocess_data(csv_path, cache=False, cache_root=PREPROCESS_CACHE_DIR):
+    """
+    Loads and preprocesses the dataset.
+
+    Returns the preprocessed DataFrame (features plus the target column, with
+    the CSV row numbers as index) and the name of the target column, or
+    (None, None) if the file does not exist. The features are float32, which
+    is what XGBoost trains on anyway. Training code passes cache=True: the
+    finished matrix is then kept in cache_root/<SHA-256 of the CSV> and
+    memory-mapped on later calls, unless NOVA_PREPROCESS_CACHE=0. The
+    mapping is copy-on-write, so the frame is writable and writes never
+    reach the cache.
+    """
+    if not os.path.isfile(csv_path):
+        print(f"Error: The file {csv_path} was not found.")
+        return None, None
+
+    cache = cache and USE_PREPROCESS_CACHE
+    data_hash = file_sha256(csv_path) if cache else None
+    arrays = load_cached_matrix(data_hash, cache_root) if cache else None
+    if arrays is None:
+        arrays = preprocess_csv(csv_path)
+        if cache:
+            save_cached_matrix(data_hash, *arrays, cache_root=cache_root)
+    X, y, index, feature_columns, columns = arrays
+
+    # Wraps the (memory-mapped) matrix without copying it
+    df = pd.DataFrame(X, columns=feature_columns, index=pd.Index(index), copy=False)
+    if y is not None:
+        df.insert(columns.index(TARGET_COLUMN), TARGET_COLUMN, y)
+    return df, TARGET_COLUMN
+
+
+def preprocess_csv(csv_path):
+    """
+    Parses and one-hot encodes a CSV. Returns (X, y, index, feature_columns, columns).
+
+    y is None when the file has no target column; columns is the order of the
+    preprocessed columns including the target.
+    """
+    df = pd.read_csv(csv_path)
+
+    # Drop columns that are not features for the model
+    df = df.drop(columns=['Partner ID'], errors='ignore')
+
+    # Identify non-numeric columns
+    categorical_cols = df.select_dtypes(include=['object']).columns.tolist()
+
+    # One-hot encode categorical features
+    df = pd.get_dummies(df, columns=categorical_cols, drop_first=True)
+
+    # Ensure all remaining feature columns are numeric
+    for col in df.columns:
+        if col != TARGET_COLUMN:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    # Drop any rows that now have NaN values after the coercion
+    df = df.dropna()
+
+    feature_columns = [col for col in df.columns if col != TARGET_COLUMN]
+    X = df[feature_columns].to_numpy(dtype=np.float32)
+    y = df[TARGET_COLUMN].to_numpy() if TARGET_COLUMN in df.columns else None
+    return X, y, df.index.to_numpy(), feature_columns, [str(col) for col in df.columns]
+
+
+def cache_dir(data_hash, cache_root=PREPROCESS_CACHE_DIR):
+    return os.path.join(cache_root, data_hash)
+
+
+def load_cached_matrix(data_hash, cache_root=PREPROCESS_CACHE_DIR):
+    """
+    Memory-maps the cached arrays of a CSV's content hash. Returns None if there is no cache or it is stale.
+    """
+    directory = cache_dir(data_hash, cache_root)
+    try:
+        with open(os.path.join(directory, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('preprocessing_version') != PREPROCESSING_VERSION or meta.get('data_hash') != data_hash:
+        return None
+    try:
+        # Copy-on-write: pages stay shared with the file until the caller writes to them
+        X = np.load(os.path.join(directory, FEATURES_FILE), mmap_mode='c')
+        y = np.load(os.path.join(directory, LABELS_FILE)) if meta['has_target'] else None
+        index = np.load(os.path.join(directory, INDEX_FILE))
+    except (OSError, ValueError):
+        return None
+    return X, y, index, meta['feature_columns'], meta['columns']
+
+
+def save_cached_matrix(data_hash, X, y, index, feature_columns, columns, cache_root=PREPROCESS_CACHE_DIR):
+    """
+    Writes the preprocessed arrays of a CSV to the cache directory of its hash, replacing any older cache.
+
+    The files are written to a staging directory that is then renamed into
+    place, so a concurrent reader sees either the old cache or the new one.
+    Only the PREPROCESS_CACHE_KEEP most recent caches are kept. A cache that
+    cannot be written (e.g. a read-only directory) is skipped.
+    """
+    directory = cache_dir(data_hash, cache_root)
+    staging = f"{directory}.{os.getpid()}.tmp"
+    meta = {
+        'preprocessing_version': PREPROCESSING_VERSION,
+        'data_hash': data_hash,
+        'rows': int(X.shape[0]),
+        'feature_columns': [str(col) for col in feature_columns],
+        'columns': columns,
+        'has_target': y is not None,
+    }
+    try:
+        os.makedirs(staging)
+        np.save(os.path.join(staging, FEATURES_FILE), np.ascontiguousarray(X, dtype=np.float32))
+        if y is not None:
+            np.save(os.path.join(staging, LABELS_FILE), y)
+        np.save(os.path.join(staging, INDEX_FILE), index)
+        with open(os.path.join(staging, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(staging, directory)
+    except OSError as e:
+        print(f"Could not write the preprocessing cache {directory}: {e}")
+        shutil.rmtree(staging, ignore_errors=True)
+        return
+    prune_cache(cache_root)
+
+
+def prune_cache(cache_root=PREPROCESS_CACHE_DIR, keep=PREPROCESS_CACHE_KEEP):
+    """
+    Deletes all but the keep most recently written caches.
+    """
+    entries = [os.path.join(cache_root, name) for name in os.listdir(cache_root) if not name.endswith('.tmp')]
+    entries.sort(key=os.path.getmtime, reverse=True)
+    for path in entries[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
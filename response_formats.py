@@ -0,0 +1,97 @@
+import json
+
+from flask import Response, jsonify
+
+from ingest import json_records, widen_float32
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # Arrow responses and the faster CSV writer are optional
+    pa = None
+    pa_csv = None
+
+# Response formats of the bulk prediction endpoints. The first one is the default
+# (also for Accept: */* and requests without an Accept header)
+RESPONSE_MIMETYPES = {
+    'json': 'application/json',
+    'columnar': 'application/vnd.nova.columnar+json',
+    'compact': 'application/vnd.nova.compact+json',
+    'csv': 'text/csv',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+# Columns kept by the compact format
+COMPACT_COLUMNS = ('Partner ID', 'Creditworthy_Prediction')
+
+
+def available_formats():
+    """
+    Response formats this process can produce (Arrow needs pyarrow).
+    """
+    return [fmt for fmt in RESPONSE_MIMETYPES if fmt != 'arrow' or pa is not None]
+
+
+def negotiate(request):
+    """
+    Picks the response format of a request: ?format=<name> if given, else the best match of its Accept header.
+
+    Returns None for an unknown ?format=; an Accept header that matches
+    nothing gets the default format, as before formats were negotiable.
+    """
+    formats = available_formats()
+    requested = request.args.get('format')
+    if requested:
+        return requested if requested in formats else None
+    best = request.accept_mimetypes.best_match([RESPONSE_MIMETYPES[fmt] for fmt in formats])
+    for fmt in formats:
+        if RESPONSE_MIMETYPES[fmt] == best:
+            return fmt
+    return formats[0]
+
+
+def render_predictions(df, fmt, extra):
+    """
+    Builds the response of a scored DataFrame in the negotiated format.
+
+    'json' is the original body: one dict per row under 'predictions', next to
+    the entries of extra (metrics, fairness results, rejected rows).
+    'columnar' has the same keys, with 'predictions' holding one list per
+    column, and 'compact' only the Partner IDs, predictions and rejected rows.
+    Both are written column by column with pandas' C JSON encoder instead of
+    building a dict per row. 'csv' is the scored table alone and 'arrow' an
+    Arrow IPC stream whose schema metadata carries extra as JSON under 'nova'.
+    """
+    if fmt == 'json':
+        response = jsonify(dict(predictions=json_records(df), **extra))
+    elif fmt in ('columnar', 'compact'):
+        if fmt == 'compact':
+            df = df[[column for column in COMPACT_COLUMNS if column in df.columns]]
+            extra = {'rejected_rows': extra.get('rejected_rows', [])}
+        df = widen_float32(df)
+        columns = ','.join(f"{json.dumps(str(column))}:{df[column].to_json(orient='values', double_precision=15)}"
+                           for column in df.columns)
+        rest = json.dumps(extra, default=str)[1:-1]
+        body = '{"predictions":{' + columns + '}' + (',' + rest if rest else '') + '}'
+        response = Response(body, mimetype=RESPONSE_MIMETYPES[fmt])
+    elif fmt == 'csv':
+        if pa is not None:
+            # Arrow's CSV writer is several times faster than DataFrame.to_csv
+            sink = pa.BufferOutputStream()
+            pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), sink)
+            body = sink.getvalue().to_pybytes()
+        else:
+            body = df.to_csv(index=False)
+        response = Response(body, mimetype=RESPONSE_MIMETYPES[fmt])
+        response.headers['X-Rejected-Rows'] = str(len(extra.get('rejected_rows', [])))
+    else:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[b'nova'] = json.dumps(extra, default=str).encode('utf-8')
+        table = table.replace_schema_metadata(metadata)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        response = Response(sink.getvalue().to_pybytes(), mimetype=RESPONSE_MIMETYPES[fmt])
+    response.headers['Vary'] = 'Accept'
+    return response
@@ -0,0 +1,86 @@
+import numpy as np
+
+from feature_encoder import FeatureEncoder
+
+# Raw column whose value selects the model that scores a row
+SEGMENT_COLUMN = 'Partner Type'
+
+# Segments with fewer training rows than this (or only one class) are scored by the global model
+SEGMENT_MIN_ROWS = 200
+
+
+class SegmentedModel:
+    """
+    One model per Partner Type behind the predict/predict_proba interface of a single model.
+
+    The segment of a row is read from its one-hot columns in the encoded
+    matrix (a row with none of them set belongs to the category
+    pd.get_dummies dropped), so callers pass the same float32 matrix as to
+    any other model. A batch is split with one vectorized mask per segment,
+    every sub-batch is scored by its segment's model in a single call and the
+    results are scattered back into the original row order; a batch from one
+    segment goes straight to its model. Segments without a model of their own
+    are scored by the global model.
+    """
+
+    def __init__(self, global_model, segment_models, feature_columns, column=SEGMENT_COLUMN):
+        self.global_model = global_model
+        self.segment_models = dict(segment_models)
+        self.column = column
+        # models[0] is the global model, models[i] the model of the i-th segment
+        self.models = [global_model] + list(self.segment_models.values())
+        numbers = {category: i for i, category in enumerate(self.segment_models, start=1)}
+        dummies = FeatureEncoder(feature_columns).categorical_index.get(column, {})
+        self._dummies = [(index, numbers.get(category, 0)) for category, index in dummies.items()]
+        baseline = [category for category in self.segment_models if category not in dummies]
+        self._baseline = numbers[baseline[0]] if baseline else 0
+
+    def segment_numbers(self, X):
+        """
+        Returns the index into self.models of the model that scores each row of an encoded matrix.
+        """
+        numbers = np.full(len(X), self._baseline, dtype=np.intp)
+        for index, number in self._dummies:
+            numbers[X[:, index] == 1] = number
+        return numbers
+
+    def predict_proba(self, X):
+        return self._route(X, 'predict_proba')
+
+    def predict(self, X):
+        return self._route(X, 'predict')
+
+    def _route(self, X, method):
+        X = np.asarray(X, dtype=np.float32)
+        numbers = self.segment_numbers(X)
+        present = np.flatnonzero(np.bincount(numbers, minlength=len(self.models)))
+        if len(present) <= 1:
+            return getattr(self.models[present[0]] if len(present) else self.global_model, method)(X)
+        out = None
+        for number in present:
+            rows = np.flatnonzero(numbers == number)
+            scored = np.asarray(getattr(self.models[number], method)(X[rows]))
+            if out is None:
+                out = np.empty((len(X),) + scored.shape[1:], dtype=scored.dtype)
+            out[rows] = scored
+        return out
+
+
+def fit_segment_models(X_train, y_train, segments, make_model, min_rows=SEGMENT_MIN_ROWS):
+    """
+    Fits one model per segment of the training rows. Returns {segment: model}.
+
+    segments holds the raw segment value of every training row; make_model()
+    returns a new unfitted model. Segments too small to train on are left
+    out, so the global model scores them.
+    """
+    segments = np.asarray(segments, dtype=object)
+    models = {}
+    for category in sorted({value for value in segments if isinstance(value, str)}):
+        rows = segments == category
+        if rows.sum() < min_rows or len(np.unique(y_train[rows])) < 2:
+            print(f"Segment '{category}' has {int(rows.sum())} training rows; the global model scores it.")
+            continue
+        models[category] = make_model().fit(X_train[rows], y_train[rows])
+        print(f"Trained the '{category}' segment model on {int(rows.sum())} rows.")
+    return models
@@ -0,0 +1,274 @@
+import argparse
+import gc
+import importlib
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from model_artifacts import ARTIFACTS_DIR, latest_bundle_path
+from worker_state import WorkerState
+
+# Seconds a worker gets to finish its in-flight requests after SIGTERM before it is killed
+GRACEFUL_TIMEOUT_SECONDS = float(os.environ.get('NOVA_GRACEFUL_TIMEOUT_SECONDS', '30'))
+
+
+class _RequestHandler(WSGIRequestHandler):
+    # One request per connection, so an idle keep-alive client never holds a pool thread
+    protocol_version = 'HTTP/1.0'
+
+
+class _QuietRequestHandler(_RequestHandler):
+    def log_request(self, code='-', size='-'):
+        pass
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    Werkzeug WSGI server that handles connections on a fixed-size thread pool.
+
+    The listening socket is passed in as a file descriptor, so every worker
+    process accepts from the socket the parent bound before forking.
+    """
+
+    multithread = True
+
+    def __init__(self, host, port, app, fd, threads, access_log=False):
+        super().__init__(host, port, app, handler=_RequestHandler if access_log else _QuietRequestHandler, fd=fd)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='nova-http')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def drain(self):
+        """
+        Waits for the requests already accepted to finish.
+        """
+        self.pool.shutdown(wait=True)
+
+
+def model_threads(workers, threads, cores=None):
+    """
+    XGBoost threads per prediction, so that workers x threads x model threads fits the cores.
+    """
+    return max(1, (cores or os.cpu_count() or 1) // (workers * threads))
+
+
+def worker_path(path, index):
+    """
+    Per-worker variant of a state file path: 'audit.csv' -> 'audit.worker-1.csv'.
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}.worker-{index}{ext}"
+
+
+def preload(app_name, artifacts_dir):
+    """
+    Imports the app module and loads the model bundle once, before any worker is forked.
+    """
+    module = importlib.import_module(app_name)
+    if app_name == 'app':
+        # app.py loads the default artifacts directory on import
+        if os.path.abspath(module.model_manager.artifacts_dir) != os.path.abspath(artifacts_dir):
+            module.load_latest(artifacts_dir)
+    if app_name == 'main':
+        # Workers never train: OpenMP state created by training does not survive fork()
+        if latest_bundle_path(artifacts_dir) is None:
+            raise SystemExit(f"No model bundle found in '{artifacts_dir}'. "
+                             "Run train_and_export_model.py before starting the server.")
+        if not module.initialize_backend(artifacts_dir=artifacts_dir):
+            raise SystemExit("No model could be loaded.")
+    return module
+
+
+def share_state(module, directory, index):
+    """
+    Publishes this worker's counters to the directory all workers share, and merges theirs into its reports.
+    """
+    def drift():
+        serving = module.model_manager.current
+        return serving.drift.snapshot() if serving is not None and serving.drift is not None else None
+
+    state = WorkerState(directory, index).register('telemetry', module.telemetry.snapshot).register('drift', drift)
+    if module.__name__ == 'main':
+        def fairness():
+            serving = module.model_manager.current
+            return serving.fairness.to_dict() if serving is not None and serving.fairness is not None else None
+
+        state.register('fairness', fairness).register('stats', module.runtime_stats)
+    module.telemetry.workers = state
+    module.worker_state = state
+    return state
+
+
+def run_worker(module, listener, index, args):
+    """
+    Serves requests in a forked worker until SIGTERM, then drains and flushes its state.
+    """
+    gc.enable()
+    if module.__name__ == 'main':
+        if args.workers > 1:
+            # Each worker appends to its own audit log and keeps its own fairness counters
+            module.AUDIT_LOG_PATH = worker_path(module.AUDIT_LOG_PATH, index)
+            module.FAIRNESS_PATH = worker_path(module.FAIRNESS_PATH, index)
+            serving = module.model_manager.current
+            resumed = module.FairnessAggregator.load(module.FAIRNESS_PATH)
+            if resumed is not None and resumed.model_version == serving.version:
+                serving.fairness = resumed
+            else:
+                serving.fairness.path = module.FAIRNESS_PATH
+    state = share_state(module, args.state_dir, index).start() if args.state_dir else None
+    # Threads do not survive fork(), so the writer, batcher and model watcher threads start here
+    module.start_background_services()
+
+    host, port = listener.getsockname()[:2]
+    server = PooledWSGIServer(host, port, module.app, listener.fileno(), args.threads, access_log=args.access_log)
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever() to return, so it cannot run on this (the serving) thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"Worker {index} (pid {os.getpid()}) serving on http://{host}:{port}", flush=True)
+    server.serve_forever()
+
+    server.drain()
+    module.model_manager.stop()
+    if module.__name__ == 'main':
+        if module.micro_batcher is not None:
+            module.micro_batcher.stop()
+        if module.audit_log is not None:
+            module.audit_log.close()
+        module.fairness_saver.stop()
+    if state is not None:
+        state.stop()
+    print(f"Worker {index} (pid {os.getpid()}) stopped", flush=True)
+
+
+def spawn(module, listener, index, args):
+    pid = os.fork()
+    if pid:
+        return pid
+    code = 0
+    try:
+        run_worker(module, listener, index, args)
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+def serve(args):
+    """
+    Preloads the model, binds the socket and supervises the forked workers.
+    """
+    # Objects created during preload stay untouched by the collector, so their pages remain shared after fork()
+    gc.disable()
+    module = preload(args.app, args.artifacts)
+
+    listener = socket.create_server((args.host, args.port), backlog=args.backlog, reuse_port=False)
+    listener.set_inheritable(True)
+    # Workers publish their counters here, so every worker can report totals for the server
+    args.state_dir = tempfile.mkdtemp(prefix='nova-workers-') if args.workers > 1 else None
+    print(f"Serving {args.app}.py on http://{args.host}:{args.port} with {args.workers} workers x "
+          f"{args.threads} threads, {os.environ['NOVA_MODEL_THREADS']} XGBoost threads per prediction", flush=True)
+
+    gc.freeze()
+    workers = {spawn(module, listener, index, args): index for index in range(1, args.workers + 1)}
+
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        if not stopping.is_set():
+            print(f"Received signal {signum}, shutting down workers...", flush=True)
+            stopping.set()
+            for pid in list(workers):
+                _signal(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    deadline = None
+    while workers:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            if stopping.is_set():
+                deadline = deadline or time.monotonic() + args.graceful_timeout
+                if time.monotonic() > deadline:
+                    print("Graceful timeout reached, killing the remaining workers.", flush=True)
+                    for pid in list(workers):
+                        _signal(pid, signal.SIGKILL)
+                    deadline = float('inf')
+            time.sleep(0.2)
+            continue
+        index = workers.pop(pid, None)
+        if index is None or stopping.is_set():
+            continue
+        # A worker died on its own; replace it so the pool keeps its size
+        print(f"Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, restarting",
+              flush=True)
+        time.sleep(1)
+        workers[spawn(module, listener, index, args)] = index
+
+    listener.close()
+    if args.state_dir:
+        shutil.rmtree(args.state_dir, ignore_errors=True)
+    print("Server stopped.")
+    return 0
+
+
+def _signal(pid, signum):
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:
+        pass
+
+
+def main(argv=None):
+    """
+    Command-line entry point of the production server.
+    """
+    parser = argparse.ArgumentParser(description="Serve the Nova API with preforked workers.")
+    parser.add_argument('--app', choices=('main', 'app'), default='main', help="App module to serve.")
+    parser.add_argument('--host', default=os.environ.get('NOVA_HOST', '0.0.0.0'), help="Interface to bind.")
+    parser.add_argument('--port', type=int, default=int(os.environ.get('NOVA_PORT', '5000')), help="Port to bind.")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('NOVA_WORKERS', os.cpu_count() or 1)),
+                        help="Worker processes (defaults to the number of cores).")
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('NOVA_THREADS', '4')),
+                        help="Request threads per worker.")
+    parser.add_argument('--backlog', type=int, default=1024, help="Listen backlog of the shared socket.")
+    parser.add_argument('--graceful-timeout', type=float, default=GRACEFUL_TIMEOUT_SECONDS,
+                        help="Seconds to wait for in-flight requests on shutdown.")
+    parser.add_argument('--artifacts', default=ARTIFACTS_DIR, help="Directory holding the model bundles.")
+    parser.add_argument('--access-log', action='store_true', help="Log every request.")
+    args = parser.parse_args(argv)
+    if args.workers < 1 or args.threads < 1:
+        parser.error("--workers and --threads must be at least 1")
+
+    # Read by the app module when it loads the model, so it must be set before the import
+    os.environ.setdefault('NOVA_MODEL_THREADS', str(model_threads(args.workers, args.threads)))
+    return serve(args)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
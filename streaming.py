@@ -0,0 +1,71 @@
+import io
+import os
+
+import pandas as pd
+
+# Response formats supported by the streaming mode of /predict_csv
+STREAM_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def detach_upload(file):
+    """
+    Returns a binary stream over an uploaded file that stays open after the view returns.
+
+    Flask closes request.files when the view function returns, before a
+    streamed response body is generated. Uploads spooled to a temporary file
+    are re-opened through a duplicated descriptor; in-memory uploads are copied.
+    """
+    stream = file.stream
+    try:
+        fd = stream.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return io.BytesIO(stream.read())
+    detached = os.fdopen(os.dup(fd), 'rb')
+    detached.seek(0)
+    return detached
+
+
+def iter_csv_chunks(stream, chunk_size):
+    """
+    Parses a CSV byte stream into DataFrames of at most chunk_size rows.
+
+    The stream is consumed incrementally, so only one chunk of parsed rows is
+    held in memory at a time.
+    """
+    reader = pd.read_csv(stream, chunksize=chunk_size)
+    for chunk in reader:
+        yield chunk
+
+
+def score_chunks(chunks, feature_encoder, predict_fn, target_column='Creditworthy'):
+    """
+    Encodes and scores each chunk, yielding it with a 'Creditworthy_Prediction' column.
+
+    Every chunk is encoded with the training schema, so a chunk that happens to
+    miss a category is still laid out exactly like the training data.
+    """
+    for chunk in chunks:
+        features = chunk.drop(columns=[target_column], errors='ignore')
+        predictions = predict_fn(feature_encoder.encode_frame(features))
+        chunk['Creditworthy_Prediction'] = pd.Series(predictions, index=chunk.index).map(
+            {1: 'Eligible', 0: 'Not Eligible'})
+        yield chunk
+
+
+def serialize_chunks(scored_chunks, fmt):
+    """
+    Serializes scored chunks into NDJSON lines or CSV text, one piece per chunk.
+    """
+    first = True
+    for chunk in scored_chunks:
+        if chunk.empty:
+            continue
+        if fmt == 'ndjson':
+            body = chunk.to_json(orient='records', lines=True)
+            yield body if body.endswith('\n') else body + '\n'
+        else:
+            yield chunk.to_csv(index=False, header=first)
+        first = False
@@ -0,0 +1,221 @@
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, request
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0, 30.0)
+
+# Upper bounds of the model batch size histogram buckets (rows)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# name -> (type, help) of every metric family
+METRICS = {
+    'nova_requests_total': ('counter', 'HTTP requests by endpoint and status code.'),
+    'nova_errors_total': ('counter', 'HTTP requests answered with a 4xx or 5xx status, by endpoint.'),
+    'nova_request_duration_seconds': ('histogram', 'Time from request start to response headers, by endpoint.'),
+    'nova_stage_duration_seconds': ('histogram', 'Time spent in each stage of an endpoint.'),
+    'nova_rows_total': ('counter', 'Input rows received, by endpoint.'),
+    'nova_model_batch_rows': ('histogram', 'Rows per model.predict call, by endpoint.'),
+}
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram; observe() is a bisect plus three additions under a lock.
+    """
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class _Timer:
+    __slots__ = ('_histogram', '_started')
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.observe(time.perf_counter() - self._started)
+        return False
+
+
+class Telemetry:
+    """
+    In-process counters and histograms exported in the Prometheus text format.
+
+    Series are created on first use and keyed by their label values, so the
+    hot path is a dict lookup plus a histogram update. instrument() adds
+    request counting and latency to every endpoint of a Flask app and serves
+    everything on /metrics. Under serve.py, workers is the WorkerState the
+    other workers publish their snapshot() to, and render() adds their series
+    to this worker's, so a scrape reports totals for the whole server.
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self.workers = None
+
+    def inc(self, name, amount=1, **labels):
+        """
+        Adds amount to a counter series.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def histogram(self, name, **labels):
+        """
+        Returns the histogram series of a metric, creating it on first use.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(_bounds(name)))
+        return histogram
+
+    def observe(self, name, value, **labels):
+        self.histogram(name, **labels).observe(value)
+
+    def timed(self, endpoint, stage):
+        """
+        Context manager that records the duration of one stage of an endpoint.
+        """
+        return _Timer(self.histogram('nova_stage_duration_seconds', endpoint=endpoint, stage=stage))
+
+    def count_rows(self, endpoint, rows):
+        """
+        Counts the input rows received by an endpoint.
+        """
+        self.inc('nova_rows_total', rows, endpoint=endpoint)
+
+    def record_model_batch(self, endpoint, rows):
+        """
+        Records the number of rows handed to one model.predict call.
+        """
+        self.observe('nova_model_batch_rows', rows, endpoint=endpoint)
+
+    def snapshot(self):
+        """
+        Returns all series as JSON-serializable lists, the form published to the other workers.
+        """
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = list(self._histograms.items())
+        return {
+            'counters': [[name, [list(label) for label in labels], value] for (name, labels), value in counters],
+            'histograms': [[name, [list(label) for label in labels]] + list(histogram.snapshot())
+                           for (name, labels), histogram in histograms],
+        }
+
+    def render(self):
+        """
+        Returns all series, summed over the workers if there are several, in the Prometheus text exposition format.
+        """
+        merged_counters, merged_histograms = {}, {}
+        snapshots = [self.snapshot()] + (self.workers.others('telemetry') if self.workers is not None else [])
+        for snapshot in snapshots:
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(tuple(label) for label in labels))
+                merged_counters[key] = merged_counters.get(key, 0) + value
+            for name, labels, counts, total, count in snapshot['histograms']:
+                key = (name, tuple(tuple(label) for label in labels))
+                merged = merged_histograms.get(key)
+                if merged is None:
+                    merged_histograms[key] = [list(counts), total, count]
+                else:
+                    merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                    merged[1] += total
+                    merged[2] += count
+        counters = sorted(merged_counters.items())
+        histograms = sorted(merged_histograms.items(), key=lambda item: item[0])
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == 'counter':
+                for (series, labels), value in counters:
+                    if series == name:
+                        lines.append(f"{name}{_labels(labels)} {value}")
+                continue
+            for (series, labels), (counts, total, count) in histograms:
+                if series != name:
+                    continue
+                cumulative = 0
+                for bound, bucket in zip(_bounds(name) + (float('inf'),), counts):
+                    cumulative += bucket
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {total}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def instrument(self, app):
+        """
+        Records request counts, errors and latency of every endpoint of app and adds /metrics.
+        Returns self, so an app module can create and attach its Telemetry in one line.
+        """
+        @app.before_request
+        def _start_timer():
+            g.telemetry_started = time.perf_counter()
+
+        @app.after_request
+        def _record_request(response):
+            started = g.pop('telemetry_started', None)
+            # The route pattern, not the URL, so unknown paths do not create new series
+            endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            if started is not None:
+                self.observe('nova_request_duration_seconds', time.perf_counter() - started, endpoint=endpoint)
+            self.inc('nova_requests_total', endpoint=endpoint, code=str(response.status_code))
+            if response.status_code >= 400:
+                self.inc('nova_errors_total', endpoint=endpoint)
+            return response
+
+        @app.route('/metrics', methods=['GET'])
+        def metrics():
+            return Response(self.render(), content_type=METRICS_CONTENT_TYPE)
+
+        return self
+
+
+def _bounds(name):
+    return BATCH_SIZE_BUCKETS if name == 'nova_model_batch_rows' else LATENCY_BUCKETS
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
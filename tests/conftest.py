@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# The application modules live at the top level of the repository
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CATEGORICAL_COLUMNS = ['Partner Type', 'Earnings (Stability Type)']
+
+
+@pytest.fixture(scope='session')
+def raw_train():
+    """
+    catalyst_train.csv as read from disk: raw records plus 'Partner ID' and the target.
+    """
+    return pd.read_csv(os.path.join(ROOT, 'catalyst_train.csv'))
+
+
+@pytest.fixture(scope='session')
+def raw_features(raw_train):
+    """
+    The raw model inputs of catalyst_train.csv, without 'Partner ID' and the target.
+    """
+    return raw_train.drop(columns=['Partner ID', 'Creditworthy'])
+
+
+@pytest.fixture(scope='session')
+def train_columns(raw_features):
+    """
+    Training feature columns, as pd.get_dummies(drop_first=True) names them.
+    """
+    return pd.get_dummies(raw_features, columns=CATEGORICAL_COLUMNS, drop_first=True).columns.tolist()
@@ -0,0 +1,103 @@
+import glob
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from audit_log import AuditLogWriter
+
+COLUMNS = ['Partner ID', 'Earnings (Value)', 'Creditworthy_Prediction']
+
+
+def records(n, start=0):
+    return [{'Partner ID': i, 'Earnings (Value)': 1000.0 + i, 'Creditworthy_Prediction': 'Eligible'}
+            for i in range(start, start + n)]
+
+
+def read_all(pattern, fmt='csv'):
+    read = pd.read_csv if fmt == 'csv' else pd.read_parquet
+    frames = [read(path) for path in sorted(glob.glob(pattern))]
+    return pd.concat(frames, ignore_index=True).sort_values('Partner ID', ignore_index=True)
+
+
+def test_csv_rows_read_back(tmp_path):
+    path = str(tmp_path / 'audit.csv')
+    writer = AuditLogWriter(path, COLUMNS, flush_interval=0.01).start()
+    for record in records(3):
+        assert writer.submit(record)
+    # A frame with an extra column and a missing one is written in the fixed layout
+    writer.submit(pd.DataFrame(records(2, start=3)).drop(columns=['Earnings (Value)']).assign(extra=1))
+    writer.close()
+
+    df = pd.read_csv(path)
+    assert df.columns.tolist() == COLUMNS
+    assert df['Partner ID'].tolist() == [0, 1, 2, 3, 4]
+    assert df['Earnings (Value)'].iloc[:3].tolist() == [1000.0, 1001.0, 1002.0]
+    assert df['Earnings (Value)'].iloc[3:].isna().all()
+    assert writer.stats()['written_rows'] == 5
+
+
+def test_parquet_rows_read_back(tmp_path):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'audit.parquet')
+    writer = AuditLogWriter(path, COLUMNS, fmt='parquet', flush_rows=2).start()
+    writer.submit(pd.DataFrame(records(3)))
+    for record in records(2, start=3):
+        writer.submit(record)
+    writer.close()
+
+    df = pd.read_parquet(path)
+    assert df.columns.tolist() == COLUMNS
+    assert df['Partner ID'].tolist() == list(range(5))
+
+
+def test_rotation_by_size(tmp_path):
+    path = str(tmp_path / 'audit.csv')
+    writer = AuditLogWriter(path, COLUMNS, flush_rows=1, max_bytes=1).start()
+    for record in records(4):
+        writer.submit(record)
+    writer.close()
+
+    # Every flush finds the file over the limit and starts a new one
+    rotated = glob.glob(str(tmp_path / 'audit.*.csv'))
+    assert len(rotated) == 3
+    assert writer.stats()['rotations'] == 3
+    assert read_all(str(tmp_path / 'audit*.csv'))['Partner ID'].tolist() == [0, 1, 2, 3]
+
+
+def test_foreign_file_is_not_renamed(tmp_path):
+    path = str(tmp_path / 'audit.csv')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('some,other,layout\n1,2,3\n')
+    writer = AuditLogWriter(path, COLUMNS, flush_rows=1, max_bytes=1).start()
+    for record in records(2):
+        writer.submit(record)
+    writer.close()
+
+    with open(path, 'r', encoding='utf-8') as f:
+        assert f.read() == 'some,other,layout\n1,2,3\n'
+    assert os.path.basename(writer.stats()['path']) != 'audit.csv'
+    assert read_all(str(tmp_path / 'audit.*.csv'))['Partner ID'].tolist() == [0, 1]
+
+
+def test_drop_policy_counts_dropped_rows(tmp_path):
+    # Not started, so nothing drains the queue
+    writer = AuditLogWriter(str(tmp_path / 'audit.csv'), COLUMNS, max_queue=2, when_full='drop')
+    assert writer.submit(records(1)[0])
+    assert writer.submit(records(1)[0])
+    assert not writer.submit(records(1)[0])
+    assert not writer.submit(pd.DataFrame(records(3)))
+    stats = writer.stats()
+    assert stats['submitted_rows'] == 2
+    assert stats['dropped_rows'] == 4
+
+
+def test_block_policy_gives_up_after_timeout(tmp_path):
+    writer = AuditLogWriter(str(tmp_path / 'audit.csv'), COLUMNS, max_queue=1, when_full='block',
+                            block_timeout=0.05)
+    assert writer.submit(records(1)[0])
+    started = time.monotonic()
+    assert not writer.submit(records(1)[0])
+    assert time.monotonic() - started >= 0.05
+    assert writer.stats()['dropped_rows'] == 1
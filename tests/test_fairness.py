@@ -0,0 +1,39 @@
+import time
+
+from fairness import FairnessAggregator, FairnessSaver
+
+
+def test_saver_persists_counters_on_stop(tmp_path):
+    path = str(tmp_path / 'fairness_counts.json')
+    fairness = FairnessAggregator(model_version='20260101-000000-abcdef12', path=path)
+    # A long interval: only stop() saves
+    saver = FairnessSaver(lambda: fairness, interval=3600).start()
+    fairness.update_batch(['Driver', 'Merchant', 'Driver', None], [1, 0, 0, 1], [1, 1, 0, float('nan')])
+    fairness.update('Merchant', 1, label=0)
+    assert not (tmp_path / 'fairness_counts.json').exists()
+
+    saver.stop()
+    loaded = FairnessAggregator.load(path)
+    assert loaded.model_version == '20260101-000000-abcdef12'
+    assert loaded.counts() == fairness.counts()
+    assert loaded.counts()['Driver'] == {'scored': 2, 'selected': 1, 'tp': 1, 'fp': 0, 'tn': 1, 'fn': 0}
+    assert loaded.counts()['Unknown']['scored'] == 1
+    assert loaded.report() == fairness.report()
+
+
+def test_saver_saves_the_current_model_periodically(tmp_path):
+    path = str(tmp_path / 'fairness_counts.json')
+    served = {'fairness': None}
+    saver = FairnessSaver(lambda: served['fairness'], interval=0.01).start()
+    try:
+        served['fairness'] = FairnessAggregator(model_version='v2', path=path)
+        served['fairness'].update('Driver', 1)
+        for _ in range(500):
+            loaded = FairnessAggregator.load(path)
+            if loaded is not None:
+                break
+            time.sleep(0.01)
+    finally:
+        saver.stop()
+    assert loaded.model_version == 'v2'
+    assert loaded.counts()['Driver']['scored'] == 1
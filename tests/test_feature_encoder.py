@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import CATEGORICAL_COLUMNS
+from feature_encoder import FeatureEncoder
+
+
+def get_dummies_matrix(df, train_columns):
+    """
+    The reference encoding: pd.get_dummies(drop_first=True) aligned to the training columns.
+    """
+    dummies = pd.get_dummies(df, columns=[c for c in CATEGORICAL_COLUMNS if c in df.columns], drop_first=True)
+    return dummies.reindex(columns=train_columns, fill_value=0).to_numpy(dtype=np.float32)
+
+
+def test_encode_frame_matches_get_dummies(raw_features, train_columns):
+    encoder = FeatureEncoder(train_columns)
+    encoded = encoder.encode_frame(raw_features)
+    assert encoded.dtype == np.float32
+    np.testing.assert_array_equal(encoded, get_dummies_matrix(raw_features, train_columns))
+
+
+def test_encode_frame_matches_get_dummies_on_categorical_dtype(raw_features, train_columns):
+    df = raw_features.astype({column: 'category' for column in CATEGORICAL_COLUMNS})
+    encoded = FeatureEncoder(train_columns).encode_frame(df)
+    np.testing.assert_array_equal(encoded, get_dummies_matrix(raw_features, train_columns))
+
+
+def test_encode_row_matches_encode_frame(raw_features, train_columns):
+    encoder = FeatureEncoder(train_columns)
+    sample = raw_features.iloc[:200]
+    rows = np.vstack([encoder.encode_row(record) for record in sample.to_dict(orient='records')])
+    np.testing.assert_array_equal(rows, encoder.encode_frame(sample))
+
+
+def test_categories_split_into_one_hot_columns(raw_features, train_columns):
+    encoder = FeatureEncoder(train_columns)
+    assert set(encoder.categorical_index) == set(CATEGORICAL_COLUMNS)
+    # drop_first=True leaves no column for the first category in sorted order
+    assert 'Driver' not in encoder.categorical_index['Partner Type']
+    assert sorted(encoder.input_fields) == sorted(raw_features.columns)
+
+
+def test_unknown_category_and_missing_field_encode_as_zero(train_columns):
+    encoder = FeatureEncoder(train_columns)
+    row = encoder.encode_row({'Partner Type': 'Courier'})
+    assert row.shape == (1, len(train_columns))
+    assert not row.any()
+
+
+def test_invalid_number_names_the_field(train_columns):
+    encoder = FeatureEncoder(train_columns)
+    with pytest.raises(ValueError, match="'Earnings \\(Value\\)'"):
+        encoder.encode_row({'Earnings (Value)': 'a lot'})
+
+
+def test_canonical_values_ignore_formatting_and_extra_keys(raw_features, train_columns):
+    encoder = FeatureEncoder(train_columns)
+    record = raw_features.iloc[0].to_dict()
+    reformatted = {key: str(value) for key, value in reversed(list(record.items()))}
+    reformatted['Partner ID'] = '00042'
+    assert encoder.canonical_values(record) == encoder.canonical_values(reformatted)
@@ -0,0 +1,130 @@
+import io
+import os
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+from xgboost import XGBClassifier
+
+from conftest import ROOT
+from feature_encoder import FeatureEncoder
+from jobs import JobQueue
+from model_artifacts import save_bundle
+
+
+@pytest.fixture(scope='module')
+def model_manager(raw_train, raw_features, train_columns, tmp_path_factory):
+    """
+    Stands in for hot_swap.ModelManager: jobs only read the path and version of the served bundle.
+    """
+    X = FeatureEncoder(train_columns).encode_frame(raw_features)
+    model = XGBClassifier(n_estimators=10, eval_metric='logloss').fit(X, raw_train['Creditworthy'])
+    path = save_bundle(model, train_columns, {'accuracy': 1.0}, os.path.join(ROOT, 'catalyst_train.csv'),
+                       input_columns=raw_features.columns, artifacts_dir=str(tmp_path_factory.mktemp('artifacts')))
+    return SimpleNamespace(current=SimpleNamespace(path=path, version=os.path.basename(path)))
+
+
+def upload(raw_train, rows=50):
+    return io.BytesIO(raw_train.head(rows).to_csv(index=False).encode('utf-8'))
+
+
+def recorded(queue):
+    """
+    Records every status a job is given, in order.
+    """
+    states = {}
+    write_status = queue._write_status
+
+    def record(job_id, status):
+        states.setdefault(job_id, []).append(status['status'])
+        write_status(job_id, status)
+
+    queue._write_status = record
+    return states
+
+
+def wait_until_finished(queue, job_id, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = queue.status(job_id)
+        if status['status'] in ('succeeded', 'failed'):
+            return status
+        time.sleep(0.1)
+    raise AssertionError(f"job {job_id} did not finish: {queue.status(job_id)}")
+
+
+def test_job_runs_from_queued_to_succeeded(model_manager, raw_train, tmp_path):
+    queue = JobQueue(model_manager, jobs_dir=str(tmp_path), workers=1, poll_seconds=0.05)
+    states = recorded(queue)
+    job_id = queue.submit(upload(raw_train), 'train.csv')['id']
+    assert queue.status(job_id)['status'] == 'queued'
+    assert queue.pending() == 1
+
+    queue.start()
+    status = wait_until_finished(queue, job_id)
+    assert status['status'] == 'succeeded', status
+    assert states[job_id][0] == 'queued' and states[job_id][1] == 'running' and states[job_id][-1] == 'succeeded'
+    assert set(states[job_id][1:-1]) == {'running'}
+    assert status['rows_scored'] == 50
+    assert len(pd.read_csv(queue.result_path(job_id))) == 50
+    assert queue.pending() == 0
+
+
+def test_job_without_rows_fails(model_manager, raw_train, tmp_path):
+    queue = JobQueue(model_manager, jobs_dir=str(tmp_path), workers=1, poll_seconds=0.05)
+    states = recorded(queue)
+    job_id = queue.submit(upload(raw_train, rows=0))['id']
+
+    queue.start()
+    status = wait_until_finished(queue, job_id)
+    assert status['status'] == 'failed'
+    assert 'No row of the upload could be scored' in status['error']
+    assert states[job_id][:2] == ['queued', 'running']
+    assert not os.path.exists(queue.result_path(job_id))
+    assert queue.pending() == 0
+
+
+def test_restart_recovers_pending_markers(model_manager, raw_train, tmp_path):
+    # The previous owner accepted three jobs and stopped while running the first one
+    previous = JobQueue(model_manager, jobs_dir=str(tmp_path), workers=1)
+    running, queued, finished = (previous.submit(upload(raw_train))['id'] for _ in range(3))
+    previous._write_status(running, dict(previous.status(running), status='running'))
+    previous._write_status(finished, dict(previous.status(finished), status='succeeded', finished_at=time.time()))
+    assert previous.pending() == 3
+
+    queue = JobQueue(model_manager, jobs_dir=str(tmp_path), workers=1, poll_seconds=0.05)
+    assert queue._acquire_ownership()
+    status = queue.status(running)
+    assert status['status'] == 'failed'
+    assert 'stopped while the job was running' in status['error']
+    # Only the marker of the job still queued is left, and that job runs next
+    assert queue.pending() == 1
+    queue.start()
+    assert wait_until_finished(queue, queued)['status'] == 'succeeded'
+    assert queue.pending() == 0
+
+
+def test_one_dispatcher_per_jobs_dir(model_manager, tmp_path):
+    pytest.importorskip('fcntl')
+    owner = subprocess.Popen(
+        [sys.executable, '-c',
+         "import sys, time; from types import SimpleNamespace; from jobs import JobQueue; "
+         "queue = JobQueue(SimpleNamespace(current=None), jobs_dir=sys.argv[1]); "
+         "print(queue._acquire_ownership(), flush=True); time.sleep(60)",
+         str(tmp_path)],
+        cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    try:
+        lines = iter(owner.stdout.readline, '')
+        assert next(line for line in lines if line.strip() in ('True', 'False')).strip() == 'True'
+        queue = JobQueue(model_manager, jobs_dir=str(tmp_path))
+        assert not queue._acquire_ownership()
+        assert not queue.owner
+    finally:
+        owner.kill()
+        owner.wait()
+    # The lock goes away with the process that held it
+    assert queue._acquire_ownership()
+    assert queue.owner
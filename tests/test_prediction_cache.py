@@ -0,0 +1,68 @@
+import time
+
+from prediction_cache import PredictionCache
+
+
+def test_hit_after_put():
+    cache = PredictionCache()
+    cache.set_model_version('v1')
+    key = cache.key('v1', (1.0, 'Driver'))
+    assert cache.get(key) is None
+    cache.put(key, 'Eligible')
+    assert cache.get(key) == 'Eligible'
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_set_model_version_drops_every_entry():
+    cache = PredictionCache()
+    cache.set_model_version('v1')
+    cache.put(cache.key('v1', (1.0,)), 'Eligible')
+    cache.put(cache.key('v1', (2.0,)), 'Not Eligible')
+
+    cache.set_model_version('v2')
+    stats = cache.stats()
+    assert stats['size'] == 0 and stats['invalidations'] == 1 and stats['model_version'] == 'v2'
+    assert cache.get(cache.key('v1', (1.0,))) is None
+    assert cache.get(cache.key('v2', (1.0,))) is None
+
+
+def test_same_version_keeps_entries():
+    cache = PredictionCache()
+    cache.set_model_version('v1')
+    cache.put(cache.key('v1', (1.0,)), 'Eligible')
+    cache.set_model_version('v1')
+    assert cache.get(cache.key('v1', (1.0,))) == 'Eligible'
+    assert cache.stats()['invalidations'] == 0
+
+
+def test_answers_of_a_replaced_model_are_not_stored():
+    # A request that started on v1 finishes after the swap to v2
+    cache = PredictionCache()
+    cache.set_model_version('v1')
+    key = cache.key('v1', (1.0,))
+    cache.set_model_version('v2')
+    cache.put(key, 'Eligible')
+    assert cache.stats()['size'] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(max_size=2)
+    cache.set_model_version('v1')
+    a, b, c = (cache.key('v1', (value,)) for value in (1.0, 2.0, 3.0))
+    cache.put(a, 'A')
+    cache.put(b, 'B')
+    cache.get(a)
+    cache.put(c, 'C')
+    assert cache.get(b) is None
+    assert cache.get(a) == 'A' and cache.get(c) == 'C'
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_ttl():
+    cache = PredictionCache(ttl=0.05)
+    cache.set_model_version('v1')
+    key = cache.key('v1', (1.0,))
+    cache.put(key, 'Eligible')
+    time.sleep(0.1)
+    assert cache.get(key) is None
+    assert cache.stats()['expirations'] == 1
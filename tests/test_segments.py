@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from xgboost import XGBClassifier
+
+from explain import SegmentedExplainer
+from feature_encoder import FeatureEncoder
+from segments import SegmentedModel, fit_segment_models
+
+
+class TaggedModel:
+    """
+    Stand-in model whose outputs name the model and echo the first feature of every row.
+    """
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.batches = []
+
+    def predict_proba(self, X):
+        self.batches.append(len(X))
+        return np.column_stack([np.full(len(X), self.tag, dtype=np.float32), X[:, 0]])
+
+    def predict(self, X):
+        self.batches.append(len(X))
+        return np.full(len(X), self.tag, dtype=np.int64)
+
+
+@pytest.fixture
+def encoder(train_columns):
+    return FeatureEncoder(train_columns)
+
+
+def rows_of(encoder, partner_types):
+    """
+    Encoded rows of the given Partner Types, with the row number as the first feature.
+    """
+    X = np.zeros((len(partner_types), encoder.n_features), dtype=np.float32)
+    X[:, 0] = np.arange(len(partner_types))
+    for i, partner_type in enumerate(partner_types):
+        column = encoder.categorical_index['Partner Type'].get(partner_type)
+        if column is not None:
+            X[i, column] = 1
+    return X
+
+
+def test_scatter_keeps_the_row_order(encoder, train_columns):
+    models = {'Driver': TaggedModel(1), 'Merchant': TaggedModel(2)}
+    segmented = SegmentedModel(TaggedModel(0), models, train_columns)
+    types = ['Merchant', 'Driver', 'Driver', 'Merchant', 'Driver', 'Merchant', 'Merchant']
+    X = rows_of(encoder, types)
+
+    proba = segmented.predict_proba(X)
+    np.testing.assert_array_equal(proba[:, 0], [2, 1, 1, 2, 1, 2, 2])
+    np.testing.assert_array_equal(proba[:, 1], np.arange(len(types)))
+    np.testing.assert_array_equal(segmented.predict(X), [2, 1, 1, 2, 1, 2, 2])
+    # One call per segment and method, however the rows are interleaved
+    assert models['Driver'].batches == [3, 3] and models['Merchant'].batches == [4, 4]
+
+
+def test_dropped_category_is_routed_to_its_model(encoder, train_columns):
+    # 'Driver' has no one-hot column: a row with no Partner Type column set is a Driver
+    segmented = SegmentedModel(TaggedModel(0), {'Driver': TaggedModel(1), 'Merchant': TaggedModel(2)}, train_columns)
+    assert segmented.segment_numbers(rows_of(encoder, ['Driver', 'Merchant'])).tolist() == [1, 2]
+
+
+def test_segments_without_a_model_use_the_global_model(encoder, train_columns):
+    merchant = TaggedModel(2)
+    segmented = SegmentedModel(TaggedModel(0), {'Merchant': merchant}, train_columns)
+    proba = segmented.predict_proba(rows_of(encoder, ['Driver', 'Merchant', 'Driver']))
+    np.testing.assert_array_equal(proba[:, 0], [0, 2, 0])
+
+
+def test_single_segment_batch_goes_straight_to_its_model(encoder, train_columns):
+    driver = TaggedModel(1)
+    segmented = SegmentedModel(TaggedModel(0), {'Driver': driver, 'Merchant': TaggedModel(2)}, train_columns)
+    X = rows_of(encoder, ['Driver'] * 5)
+    np.testing.assert_array_equal(segmented.predict_proba(X)[:, 1], np.arange(5))
+    assert driver.batches == [5]
+
+
+def test_explanations_follow_the_segment_models(raw_train, raw_features, train_columns, encoder):
+    X = encoder.encode_frame(raw_features)
+    y = raw_train['Creditworthy'].to_numpy()
+
+    def make_model():
+        return XGBClassifier(n_estimators=20, max_depth=3, eval_metric='logloss')
+
+    models = fit_segment_models(X[:8000], y[:8000], raw_train['Partner Type'].to_numpy()[:8000], make_model)
+    segmented = SegmentedModel(make_model().fit(X[:8000], y[:8000]), models, train_columns)
+    explainer = SegmentedExplainer(segmented, encoder)
+
+    contributions, probabilities, base_values = explainer.explain(X[8000:])
+    np.testing.assert_allclose(probabilities, segmented.predict_proba(X[8000:])[:, 1], atol=1e-5)
+    # Every row adds up to the margin of the model that scored it
+    margins = np.log(probabilities / (1 - probabilities))
+    np.testing.assert_allclose(base_values + contributions.sum(axis=1), margins, atol=1e-3)
+    assert len(np.unique(base_values)) == len(models)
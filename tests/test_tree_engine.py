@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from xgboost import XGBClassifier
+
+from feature_encoder import FeatureEncoder
+from tree_engine import TreeEnsemble, check_agreement
+
+
+@pytest.fixture(scope='module')
+def encoded(raw_train, raw_features, train_columns):
+    X = FeatureEncoder(train_columns).encode_frame(raw_features)
+    return X, raw_train['Creditworthy'].to_numpy()
+
+
+def with_missing_values(X, seed=0):
+    """
+    A copy of X with a tenth of its cells set to NaN, to exercise the default directions.
+    """
+    X = X.copy()
+    rng = np.random.default_rng(seed)
+    mask = rng.random(X.shape) < 0.1
+    X[mask] = np.nan
+    return X
+
+
+def assert_bitwise_equal(model, ensemble, X):
+    agreement = check_agreement(model, ensemble, X)
+    assert agreement['margin_bitwise_equal'], agreement
+    assert agreement['proba_bitwise_equal'], agreement
+    np.testing.assert_array_equal(ensemble.predict(X), model.predict(X))
+    np.testing.assert_array_equal(ensemble.predict_proba(X).view(np.uint32),
+                                  model.predict_proba(X).astype(np.float32).view(np.uint32))
+
+
+@pytest.mark.parametrize('max_depth', [2, 6])
+def test_margins_and_probabilities_are_bit_identical_to_xgboost(encoded, max_depth):
+    X, y = encoded
+    model = XGBClassifier(n_estimators=40, max_depth=max_depth, eval_metric='logloss').fit(X[:8000], y[:8000])
+    ensemble = TreeEnsemble.from_booster(model)
+    assert ensemble.n_trees == 40
+    assert_bitwise_equal(model, ensemble, X[8000:])
+    assert_bitwise_equal(model, ensemble, with_missing_values(X[8000:]))
+
+
+def test_deep_trees_fall_back_to_node_walking(encoded):
+    X, y = encoded
+    model = XGBClassifier(n_estimators=5, max_depth=16, min_child_weight=0, eval_metric='logloss').fit(X, y)
+    ensemble = TreeEnsemble.from_booster(model)
+    assert ensemble.max_depth > TreeEnsemble.MAX_COMPLETE_DEPTH
+    assert_bitwise_equal(model, ensemble, with_missing_values(X[:2000]))
+
+
+def test_save_and_load_round_trip(encoded, tmp_path):
+    X, y = encoded
+    model = XGBClassifier(n_estimators=10, eval_metric='logloss').fit(X, y)
+    ensemble = TreeEnsemble.from_booster(model)
+    path = tmp_path / 'model.npz'
+    ensemble.save(path)
+    loaded = TreeEnsemble.load(path)
+    np.testing.assert_array_equal(loaded.predict_margin(X).view(np.uint32), ensemble.predict_margin(X).view(np.uint32))
@@ -0,0 +1,96 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ingest import read_upload
+from validation import SchemaValidator
+
+
+@pytest.fixture(scope='module')
+def validator(train_columns):
+    return SchemaValidator(train_columns)
+
+
+@pytest.fixture
+def record(raw_features):
+    return raw_features.iloc[0].to_dict()
+
+
+def errors_of(validator, record):
+    return validator.describe(validator.validate_record(record))
+
+
+def test_valid_training_rows_pass(validator, raw_features):
+    assert not validator.validate_frame(raw_features).any()
+    assert errors_of(validator, raw_features.iloc[0].to_dict()) == []
+
+
+@pytest.mark.parametrize('change, message', [
+    ({'Earnings (Value)': None}, "'Earnings (Value)' is missing"),
+    ({'Earnings (Value)': 'lots'}, "'Earnings (Value)' must be a number"),
+    ({'Earnings (Value)': -1}, "'Earnings (Value)' must be between 0 and 100000"),
+    ({'Perf. Rating (Avg)': 5.5}, "'Perf. Rating (Avg)' must be between 3.0 and 5.0"),
+    ({'Order/Trip Volume': -3}, "'Order/Trip Volume' must be at least 0"),
+    ({'Partner Type': None}, "'Partner Type' is missing"),
+    ({'Partner Type': 'Courier'}, "'Partner Type' must be one of Driver, Merchant"),
+    ({'Earnings (Stability Type)': 'Stable-ish'},
+     "'Earnings (Stability Type)' must be one of Seasonal, Stable, Variable"),
+])
+def test_rejection_messages(validator, record, change, message):
+    record.update(change)
+    assert errors_of(validator, record) == [message]
+
+
+def test_every_failed_check_is_reported(validator, record):
+    record.update({'Earnings (Value)': 'lots', 'Partner Type': 'Courier'})
+    del record['Earnings Volatility']
+    assert errors_of(validator, record) == [
+        "'Earnings (Value)' must be a number",
+        "'Earnings Volatility' is missing",
+        "'Partner Type' must be one of Driver, Merchant",
+    ]
+
+
+def test_frame_and_record_validation_agree(validator, raw_features):
+    df = raw_features.iloc[:6].astype(object).copy()
+    df.loc[df.index[1], 'Earnings (Value)'] = 'lots'
+    df.loc[df.index[2], 'Perf. Rating (Avg)'] = 2.0
+    df.loc[df.index[3], 'Partner Type'] = 'Courier'
+    df.loc[df.index[4], 'Earnings Volatility'] = np.nan
+    bits = validator.validate_frame(df)
+    expected = [validator.validate_record({k: (None if pd.isna(v) else v) for k, v in row.items()})
+                for row in df.to_dict(orient='records')]
+    assert bits.tolist() == expected
+    assert np.flatnonzero(bits).tolist() == [1, 2, 3, 4]
+
+
+def test_missing_column_rejects_every_row(validator, raw_features):
+    bits = validator.validate_frame(raw_features.iloc[:3].drop(columns=['Partner Type']))
+    assert [validator.describe(b) for b in bits] == [["'Partner Type' is missing"]] * 3
+
+
+def test_rejected_rows_report(validator, raw_train):
+    df = raw_train.iloc[:3].copy()
+    df['Perf. Rating (Avg)'] = [4.0, 9.0, 4.0]
+    bits = validator.validate_frame(df)
+    assert validator.rejected_rows(bits, df.index, ids=df['Partner ID'].to_numpy()) == [
+        {'row': 1, 'errors': ["'Perf. Rating (Avg)' must be between 3.0 and 5.0"], 'Partner ID': 2},
+    ]
+
+
+def test_csv_upload_with_text_in_a_numeric_column(validator, raw_features):
+    df = raw_features.iloc[:4].astype({'Earnings (Value)': object})
+    df.loc[df.index[1], 'Earnings (Value)'] = 'lots'
+    df.loc[df.index[2], 'Earnings (Value)'] = None
+    upload = read_upload(io.BytesIO(df.to_csv(index=False).encode('utf-8')), validator)
+
+    # Valid rows keep their numbers, typed as in a clean upload
+    assert upload['Earnings (Value)'].dtype == np.float32
+    assert upload['Earnings (Value)'].iloc[[0, 3]].tolist() == df['Earnings (Value)'].iloc[[0, 3]].tolist()
+    assert [validator.describe(b) for b in validator.validate_frame(upload)] == [
+        [], ["'Earnings (Value)' must be a number"], ["'Earnings (Value)' is missing"], []]
+    # The unparsed cells follow their rows through a selection
+    assert validator.describe(validator.validate_frame(upload.iloc[[3, 1]])[1]) == [
+        "'Earnings (Value)' must be a number"]
@@ -1,77 +1,70 @@
-import pandas as pd
-import joblib
-from xgboost import XGBClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
-from sklearn.compose import ColumnTransformer
-from sklearn.pipeline import Pipeline
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+import argparse
+import os
 
-# ----------------------------
-# 1. Load training data
-# ----------------------------
-csv_path = "catalyst_train.csv"
-target_column = "Creditworthy"
+from main import train_and_export
+from model_artifacts import ARTIFACTS_DIR
+from compaction import compact_and_export
+from out_of_core import train_out_of_core
+from tuning import tune_and_export
 
-df = pd.read_csv(csv_path)
 
-# Drop unnecessary column
-if "Partner ID" in df.columns:
-    df = df.drop(columns=["Partner ID"])
+def main(argv=None):
+    """
+    Trains the credit model and exports it as a versioned artifact bundle.
+    """
+    parser = argparse.ArgumentParser(description="Train the credit model and export a versioned artifact bundle.")
+    parser.add_argument("--data", default="catalyst_train.csv", help="Training data CSV.")
+    parser.add_argument("--artifacts", default=ARTIFACTS_DIR, help="Directory holding the model bundles.")
+    parser.add_argument("--out-of-core", action="store_true",
+                        help="Train from chunks of a CSV or Parquet input that does not fit in memory.")
+    parser.add_argument("--chunk-rows", type=int, default=100_000, help="Rows per chunk with --out-of-core.")
+    parser.add_argument("--segmented", action="store_true",
+                        help="Also train one model per Partner Type, with the global model as the fallback.")
+    parser.add_argument("--compact", action="store_true",
+                        help="Export the smallest model (early stopping, truncation, depth limits) within an accuracy budget.")
+    parser.add_argument("--max-accuracy-loss", type=float, default=0.005,
+                        help="Test accuracy a --compact model may lose against the default model.")
+    parser.add_argument("--test-data", default="catalyst_test.csv", help="Labelled test CSV scored by --compact.")
+    parser.add_argument("--tune", action="store_true",
+                        help="Cross-validated hyperparameter search with successive halving before exporting.")
+    parser.add_argument("--candidates", type=int, default=16, help="Configurations sampled with --tune.")
+    parser.add_argument("--cv-folds", type=int, default=5, help="Cross-validation folds with --tune.")
+    parser.add_argument("--workers", type=int, default=None, help="Search worker processes (defaults to all cores).")
+    parser.add_argument("--time-budget", type=float, default=600.0, help="Wall-clock budget of --tune in seconds.")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the --tune search.")
+    args = parser.parse_args(argv)
+    if args.segmented and (args.tune or args.out_of_core or args.compact):
+        parser.error("--segmented trains in memory with the default parameters; drop --tune, --out-of-core and --compact.")
+    if args.compact and (args.tune or args.out_of_core):
+        parser.error("--compact cannot be combined with --tune or --out-of-core.")
 
-# Identify column types
-categorical_cols = df.select_dtypes(include=["object"]).columns.tolist()
-if target_column in categorical_cols:
-    categorical_cols.remove(target_column)
-numerical_cols = df.drop(columns=[target_column] + categorical_cols).columns.tolist()
+    if not os.path.exists(args.data):
+        print(f"Please ensure '{args.data}' exists.")
+        return 1
 
-X = df.drop(target_column, axis=1)
-y = df[target_column]
+    # ----------------------------
+    # Train, evaluate and export
+    # ----------------------------
+    if args.tune:
+        bundle_path = tune_and_export(args.data, args.artifacts, n_candidates=args.candidates, folds=args.cv_folds,
+                                      workers=args.workers, time_budget=args.time_budget, seed=args.seed)
+    elif args.compact:
+        if not os.path.exists(args.test_data):
+            print(f"Please ensure '{args.test_data}' exists.")
+            return 1
+        bundle_path = compact_and_export(args.data, args.test_data, args.artifacts,
+                                         max_accuracy_loss=args.max_accuracy_loss)
+    elif args.out_of_core:
+        bundle_path = train_out_of_core(args.data, args.artifacts, chunk_rows=args.chunk_rows)
+    else:
+        bundle_path = train_and_export(args.data, args.artifacts, segmented=args.segmented)
+    if bundle_path is None:
+        print(f"Please ensure '{args.data}' exists.")
+        return 1
 
-# ----------------------------
-# 2. Define preprocessing
-# ----------------------------
-preprocessor = ColumnTransformer(
-    transformers=[
-        ("num", StandardScaler(), numerical_cols),
-        ("cat", OneHotEncoder(handle_unknown="ignore"), categorical_cols)
-    ]
-)
+    print(f"Artifacts saved: {bundle_path}")
+    return 0
 
-# ----------------------------
-# 3. Create pipeline
-# ----------------------------
-pipeline = Pipeline([
-    ("preprocess", preprocessor),
-    ("model", XGBClassifier(eval_metric="logloss", use_label_encoder=False))
-])
 
-# ----------------------------
-# 4. Train-test split & fit
-# ----------------------------
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-pipeline.fit(X_train, y_train)
-
-# ----------------------------
-# 5. Evaluate
-# ----------------------------
-y_pred = pipeline.predict(X_test)
-
-metrics = {
-    "accuracy": accuracy_score(y_test, y_pred),
-    "precision": precision_score(y_test, y_pred),
-    "recall": recall_score(y_test, y_pred),
-    "f1_score": f1_score(y_test, y_pred)
-}
-
-print("Evaluation metrics:")
-for k, v in metrics.items():
-    print(f"{k}: {v:.4f}")
-
-# ----------------------------
-# 6. Save pipeline + metrics
-# ----------------------------
-joblib.dump(pipeline, "xgboost_credit_model.joblib")
-joblib.dump(metrics, "evaluation_metrics.joblib")
-
-print("Artifacts saved: xgboost_credit_model.joblib, evaluation_metrics.joblib")
\ No newline at end of file
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,274 @@
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+# Objectives whose raw margin is turned into a probability with the logistic function
+LOGISTIC_OBJECTIVES = ('binary:logistic', 'reg:logistic')
+
+
+class TreeEnsemble:
+    """
+    A trained XGBoost booster flattened into NumPy arrays.
+
+    The export format is one set of node arrays for all trees (feature index,
+    threshold, left/right child, default direction, leaf value), addressed by
+    global node id, plus the root id of every tree.
+
+    For scoring, trees up to MAX_COMPLETE_DEPTH levels deep are re-laid out as
+    complete binary trees, where the children of position i are 2i+1 and 2i+2
+    and a leaf that ends early is copied into every slot below it. All rows
+    then walk all trees together with a fixed number of vectorized steps and
+    no child lookups. Deeper models fall back to walking the node arrays.
+
+    Leaf values are accumulated in float32, tree by tree, in the same order as
+    XGBoost, starting from a base margin computed the same way, so margins are
+    bit-for-bit identical to the booster's.
+    """
+
+    # Deeper trees would make the complete layout too large (2 ** depth slots per tree)
+    MAX_COMPLETE_DEPTH = 12
+
+    def __init__(self, feature, threshold, left, right, default_left, value, roots, base_margin,
+                 max_depth, objective='binary:logistic'):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float32)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.value = np.asarray(value, dtype=np.float32)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.base_margin = np.float32(base_margin)
+        self.max_depth = int(max_depth)
+        self.objective = objective
+
+        self._complete = self.max_depth <= self.MAX_COMPLETE_DEPTH
+        if self._complete:
+            self._compile_complete()
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @classmethod
+    def from_booster(cls, booster):
+        """
+        Exports an xgboost.Booster (or anything with get_booster()) into flat arrays.
+        """
+        if hasattr(booster, 'get_booster'):
+            booster = booster.get_booster()
+        learner = json.loads(booster.save_raw('json'))['learner']
+
+        params = learner['learner_model_param']
+        if int(params.get('num_class', 0)) > 1 or int(params.get('num_target', 1)) > 1:
+            raise NotImplementedError("Only single-output models can be exported to a TreeEnsemble.")
+        objective = learner['objective']['name']
+        base_score = np.float32(params['base_score'].strip('[]'))
+        if objective in LOGISTIC_OBJECTIVES:
+            # Same float32 arithmetic as XGBoost's ProbToMargin, so the margins match exactly
+            base_margin = -np.log(np.float32(1.0) / base_score - np.float32(1.0))
+        else:
+            base_margin = base_score
+
+        trees = learner['gradient_booster']['model']['trees']
+        features, thresholds, lefts, rights, defaults, values, roots = [], [], [], [], [], [], []
+        max_depth = 0
+        offset = 0
+        for tree in trees:
+            if any(tree['split_type']):
+                raise NotImplementedError("Categorical splits are not supported by the NumPy engine.")
+            left = np.asarray(tree['left_children'], dtype=np.int64)
+            right = np.asarray(tree['right_children'], dtype=np.int64)
+            n_nodes = len(left)
+            node_ids = np.arange(n_nodes)
+            is_leaf = left == -1
+
+            # Leaves loop back onto themselves; internal nodes point at global child ids
+            features.append(np.where(is_leaf, 0, tree['split_indices']))
+            thresholds.append(np.where(is_leaf, 0.0, tree['split_conditions']))
+            lefts.append(np.where(is_leaf, node_ids, left) + offset)
+            rights.append(np.where(is_leaf, node_ids, right) + offset)
+            defaults.append(np.asarray(tree['default_left'], dtype=bool))
+            values.append(np.where(is_leaf, tree['split_conditions'], 0.0))
+            roots.append(offset)
+            max_depth = max(max_depth, _tree_depth(left, right))
+            offset += n_nodes
+
+        return cls(np.concatenate(features), np.concatenate(thresholds), np.concatenate(lefts),
+                   np.concatenate(rights), np.concatenate(defaults), np.concatenate(values),
+                   roots, base_margin, max_depth, objective)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads arrays written by save().
+        """
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['feature'], data['threshold'], data['left'], data['right'],
+                       data['default_left'], data['value'], data['roots'], data['base_margin'][()],
+                       data['max_depth'][()], str(data['objective'][()]))
+
+    def save(self, path):
+        """
+        Writes the flat arrays to an .npz file.
+        """
+        np.savez(path, feature=self.feature, threshold=self.threshold, left=self.left, right=self.right,
+                 default_left=self.default_left, value=self.value, roots=self.roots,
+                 base_margin=np.float32(self.base_margin), max_depth=np.int32(self.max_depth),
+                 objective=np.str_(self.objective))
+
+    def _compile_complete(self):
+        depth = self.max_depth
+        n_inner = (1 << depth) - 1
+        n_trees = self.n_trees
+        feature = np.zeros((n_trees, n_inner), dtype=np.int64)
+        threshold = np.zeros((n_trees, n_inner), dtype=np.float32)
+        default_left = np.ones((n_trees, n_inner), dtype=bool)
+        value = np.zeros((n_trees, 1 << depth), dtype=np.float32)
+
+        for t, root in enumerate(self.roots):
+            stack = [(int(root), 0, 0)]
+            while stack:
+                node, pos, level = stack.pop()
+                if self.left[node] == node:
+                    # Leaf: every complete-tree leaf below this position gets its value
+                    span = 1 << (depth - level)
+                    first = (pos + 1) * span - 1 - n_inner
+                    value[t, first:first + span] = self.value[node]
+                    continue
+                feature[t, pos] = self.feature[node]
+                threshold[t, pos] = self.threshold[node]
+                default_left[t, pos] = self.default_left[node]
+                stack.append((int(self.left[node]), 2 * pos + 1, level + 1))
+                stack.append((int(self.right[node]), 2 * pos + 2, level + 1))
+
+        self._c_feature = feature.ravel()
+        self._c_threshold = threshold.ravel()
+        self._c_default_right = ~default_left.ravel()
+        self._c_value = value.ravel()
+        self._c_inner_base = (np.arange(n_trees, dtype=np.int64) * n_inner)[None, :]
+        self._c_leaf_base = (np.arange(n_trees, dtype=np.int64) << depth)[None, :]
+
+    def leaf_values(self, X):
+        """
+        Returns the (n_rows, n_trees) float32 leaf value reached in every tree.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        row_base = (np.arange(n_rows, dtype=np.int64) * n_features)[:, None]
+        has_missing = bool(np.isnan(flat).any())
+
+        if not self._complete:
+            return self._walk_nodes(flat, row_base, has_missing)
+
+        pos = np.zeros((n_rows, self.n_trees), dtype=np.int64)
+        for _ in range(self.max_depth):
+            slot = pos + self._c_inner_base
+            x = np.take(flat, row_base + np.take(self._c_feature, slot))
+            # x >= threshold goes right; NaN compares False either way and is resolved below
+            go_right = ~(x < np.take(self._c_threshold, slot))
+            if has_missing:
+                missing = np.isnan(x)
+                go_right[missing] = np.take(self._c_default_right, slot[missing])
+            pos = 2 * pos + 1 + go_right
+        return np.take(self._c_value, pos - ((1 << self.max_depth) - 1) + self._c_leaf_base)
+
+    def _walk_nodes(self, flat, row_base, has_missing):
+        node = np.broadcast_to(self.roots, (row_base.shape[0], self.n_trees))
+        for _ in range(self.max_depth):
+            x = np.take(flat, row_base + np.take(self.feature, node))
+            go_left = x < np.take(self.threshold, node)
+            if has_missing:
+                missing = np.isnan(x)
+                go_left[missing] = np.take(self.default_left, node[missing])
+            node = np.where(go_left, np.take(self.left, node), np.take(self.right, node))
+        return np.take(self.value, node)
+
+    def predict_margin(self, X):
+        """
+        Returns the raw float32 margin (log-odds for logistic objectives) per row.
+        """
+        leaves = self.leaf_values(X)
+        summed = np.empty((leaves.shape[0], leaves.shape[1] + 1), dtype=np.float32)
+        summed[:, 0] = self.base_margin
+        summed[:, 1:] = leaves
+        # add.accumulate adds strictly left to right, matching XGBoost's per-tree float32 sum
+        return np.add.accumulate(summed, axis=1, dtype=np.float32)[:, -1]
+
+    def predict_proba(self, X):
+        """
+        Returns an (n_rows, 2) array of class probabilities, like XGBClassifier.predict_proba.
+        """
+        margin = self.predict_margin(X)
+        if self.objective in LOGISTIC_OBJECTIVES:
+            # exp is taken in float64 and rounded once, like the correctly rounded expf XGBoost calls;
+            # NumPy's vectorized float32 exp can be one ulp off
+            exp = np.exp(np.minimum(-margin, np.float32(88.7)).astype(np.float64)).astype(np.float32)
+            positive = np.float32(1.0) / (exp + np.float32(1.0))
+        else:
+            positive = margin
+        return np.column_stack([np.float32(1.0) - positive, positive])
+
+    def predict(self, X):
+        """
+        Returns 0/1 class labels, like XGBClassifier.predict.
+        """
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(np.int64)
+
+
+def _tree_depth(left, right):
+    depth = np.zeros(len(left), dtype=np.int64)
+    # Children always have larger ids than their parent in XGBoost's layout
+    for node in range(len(left)):
+        if left[node] != -1:
+            depth[left[node]] = depth[node] + 1
+            depth[right[node]] = depth[node] + 1
+    return int(depth.max())
+
+
+def check_agreement(model, ensemble, X):
+    """
+    Compares a TreeEnsemble with the XGBoost model it was exported from on X.
+    """
+    X = np.asarray(X, dtype=np.float32)
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    reference_margin = booster.inplace_predict(X, predict_type='margin')
+    reference_proba = booster.inplace_predict(X, predict_type='value')
+    margin = ensemble.predict_margin(X)
+    proba = ensemble.predict_proba(X)[:, 1]
+    return {
+        'rows': int(len(X)),
+        'margin_bitwise_equal': bool(np.array_equal(margin.view(np.uint32), reference_margin.astype(np.float32).view(np.uint32))),
+        'margin_max_abs_diff': float(np.max(np.abs(margin - reference_margin))) if len(X) else 0.0,
+        'proba_bitwise_equal': bool(np.array_equal(proba.view(np.uint32), reference_proba.astype(np.float32).view(np.uint32))),
+        'proba_max_abs_diff': float(np.max(np.abs(proba - reference_proba))) if len(X) else 0.0,
+        'label_agreement': float(np.mean((proba > 0.5) == (reference_proba > 0.5))) if len(X) else 1.0,
+    }
+
+
+def main(argv=None):
+    """
+    Checks the NumPy engine of a model bundle against XGBoost on a labelled CSV.
+    """
+    from feature_encoder import FeatureEncoder
+    from model_artifacts import ARTIFACTS_DIR, load_bundle
+
+    parser = argparse.ArgumentParser(description="Check the NumPy tree engine against XGBoost.")
+    parser.add_argument('--bundle', default=None, help="Bundle directory (defaults to the latest one).")
+    parser.add_argument('--artifacts', default=ARTIFACTS_DIR, help="Directory holding the model bundles.")
+    parser.add_argument('--data', default='catalyst_test.csv', help="CSV with raw partner records.")
+    args = parser.parse_args(argv)
+
+    bundle = load_bundle(args.bundle, artifacts_dir=args.artifacts)
+    X = FeatureEncoder(bundle.feature_columns).encode_frame(pd.read_csv(args.data))
+    report = check_agreement(bundle.model, bundle.tree_ensemble(), X)
+    print(json.dumps(report, indent=2))
+    return 0 if report['margin_bitwise_equal'] and report['label_agreement'] == 1.0 else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,224 @@
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from xgboost import XGBClassifier
+from xgboost.callback import TrainingCallback
+
+from drift import DRIFT_PROFILE_FILE, DriftProfile
+from evaluation import evaluate_model, load_sensitive_features
+from fairness import FairnessAggregator
+from model_artifacts import ARTIFACTS_DIR, file_sha256, save_bundle
+from preprocessing import load_and_preprocess_data
+
+SEARCH_LOG_FILE = 'search_log.json'
+
+# Lists are sampled uniformly, (low, high) pairs uniformly and (low, high, 'log') triples log-uniformly
+SEARCH_SPACE = {
+    'max_depth': [3, 4, 5, 6, 8],
+    'learning_rate': (0.02, 0.3, 'log'),
+    'subsample': (0.6, 1.0),
+    'colsample_bytree': (0.6, 1.0),
+    'min_child_weight': [1, 2, 5, 10],
+    'reg_lambda': (0.1, 10.0, 'log'),
+}
+
+# XGBClassifier defaults, always evaluated so the search never loses to the untuned model
+DEFAULT_PARAMS = {
+    'max_depth': 6,
+    'learning_rate': 0.3,
+    'subsample': 1.0,
+    'colsample_bytree': 1.0,
+    'min_child_weight': 1,
+    'reg_lambda': 1.0,
+}
+
+EARLY_STOPPING_ROUNDS = 20
+
+# Training data and folds of a pool worker, set once by _init_worker instead of per task
+_worker_data = {}
+
+
+class _Deadline(TrainingCallback):
+    """
+    Stops boosting once the search's wall-clock budget is spent.
+    """
+
+    def __init__(self, deadline):
+        super().__init__()
+        self.deadline = deadline
+        self.hit = False
+
+    def after_iteration(self, model, epoch, evals_log):
+        self.hit = time.time() >= self.deadline
+        return self.hit
+
+
+def sample_params(rng, space=SEARCH_SPACE):
+    """
+    Draws one configuration from the search space.
+    """
+    params = {}
+    for name, spec in space.items():
+        if isinstance(spec, list):
+            params[name] = spec[int(rng.integers(len(spec)))]
+        elif len(spec) == 3 and spec[2] == 'log':
+            params[name] = float(math.exp(rng.uniform(math.log(spec[0]), math.log(spec[1]))))
+        else:
+            params[name] = float(rng.uniform(spec[0], spec[1]))
+    return params
+
+
+def _init_worker(X, y, folds, n_jobs):
+    _worker_data.update(X=X, y=y, folds=folds, n_jobs=n_jobs)
+
+
+def _cross_validate(candidate, params, n_rounds, deadline):
+    """
+    Scores one configuration with k-fold CV and early stopping, in a pool worker.
+    """
+    started = time.time()
+    entry = {'candidate': candidate, 'params': params, 'n_estimators': n_rounds}
+    if started >= deadline:
+        return dict(entry, status='skipped', seconds=0.0)
+
+    X, y = _worker_data['X'], _worker_data['y']
+    scores, iterations = [], []
+    timed_out = False
+    for train_idx, valid_idx in _worker_data['folds']:
+        deadline_callback = _Deadline(deadline)
+        model = XGBClassifier(n_estimators=n_rounds, eval_metric='logloss', n_jobs=_worker_data['n_jobs'],
+                              early_stopping_rounds=EARLY_STOPPING_ROUNDS, callbacks=[deadline_callback],
+                              **params)
+        model.fit(X[train_idx], y[train_idx], eval_set=[(X[valid_idx], y[valid_idx])], verbose=False)
+        # Read from the eval history: best_score is unset if the deadline stopped the first round
+        history = model.evals_result()['validation_0']['logloss']
+        scores.append(float(np.min(history)))
+        iterations.append(int(np.argmin(history)))
+        if deadline_callback.hit:
+            timed_out = True
+            break
+
+    return dict(entry,
+                status='timed_out' if timed_out else 'ok',
+                cv_logloss=float(np.mean(scores)),
+                cv_logloss_std=float(np.std(scores)),
+                best_iteration=int(np.mean(iterations)),
+                fold_scores=scores,
+                seconds=time.time() - started)
+
+
+def successive_halving(X, y, n_candidates=16, folds=5, workers=None, time_budget=600.0, min_rounds=50,
+                       max_rounds=450, eta=3, seed=42, log=print):
+    """
+    Searches SEARCH_SPACE with k-fold CV and successive halving under a time budget.
+
+    Every rung scores the surviving configurations with eta times more boosting
+    rounds than the previous one (each fold still stops early) and keeps the
+    best 1/eta of them, until only one is left. Trials run across a process pool; XGBoost gets
+    cores // workers threads per trial so the pool does not oversubscribe the
+    machine. Once the budget is spent, running trials stop boosting and queued
+    ones are skipped. Returns (best trial, search log).
+    """
+    deadline = time.time() + time_budget
+    cores = os.cpu_count() or 1
+    workers = max(1, min(workers or cores, n_candidates))
+    n_jobs = max(1, cores // workers)
+
+    rng = np.random.default_rng(seed)
+    candidates = [DEFAULT_PARAMS] + [sample_params(rng) for _ in range(n_candidates - 1)]
+    fold_indices = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed).split(X, y))
+
+    search_log = []
+    survivors = list(range(len(candidates)))
+    best = None
+    n_rounds = min_rounds
+    rung = 0
+
+    init_args = (X, y, fold_indices, n_jobs)
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) if workers > 1 else None
+    if pool is None:
+        _init_worker(*init_args)
+    try:
+        while True:
+            log(f"Rung {rung}: {len(survivors)} candidates x {folds} folds, up to {n_rounds} rounds")
+            args = [(i, candidates[i], n_rounds, deadline) for i in survivors]
+            if pool is not None:
+                results = list(pool.map(_cross_validate, *zip(*args)))
+            else:
+                results = [_cross_validate(*a) for a in args]
+            for result in results:
+                result['rung'] = rung
+            search_log.extend(results)
+
+            finished = sorted((r for r in results if r['status'] == 'ok'), key=lambda r: r['cv_logloss'])
+            if finished:
+                # Later rungs train longer, so their winner replaces the previous one
+                best = finished[0]
+            if not finished or n_rounds >= max_rounds or time.time() >= deadline:
+                break
+            survivors = [r['candidate'] for r in finished[:max(1, math.ceil(len(finished) / eta))]]
+            if len(survivors) == 1:
+                break  # a lone survivor has nothing left to be compared with
+            n_rounds = min(n_rounds * eta, max_rounds)
+            rung += 1
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    if best is None:
+        raise RuntimeError("The time budget ran out before any configuration was fully cross-validated.")
+    return best, search_log
+
+
+def tune_and_export(data_path='catalyst_train.csv', artifacts_dir=ARTIFACTS_DIR, n_candidates=16, folds=5,
+                    workers=None, time_budget=600.0, seed=42):
+    """
+    Tunes the model on the training split, refits the best configuration and exports it.
+
+    The 80/20 split is the same as train_model's, so the holdout metrics in the
+    manifest are comparable with an untuned bundle. The search log is stored
+    in the bundle as search_log.json. Returns the bundle directory, or None if
+    the training data is missing.
+    """
+    started = time.time()
+    train_df, target_column = load_and_preprocess_data(data_path, cache=True)
+    if train_df is None:
+        return None
+    X = train_df.drop(target_column, axis=1)
+    y = train_df[target_column]
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    best, search_log = successive_halving(X_train.to_numpy(dtype=np.float32), y_train.to_numpy(),
+                                          n_candidates=n_candidates, folds=folds, workers=workers,
+                                          time_budget=time_budget, seed=seed)
+    n_estimators = best['best_iteration'] + 1
+    print(f"Best configuration (CV logloss {best['cv_logloss']:.4f}, {n_estimators} rounds): {best['params']}")
+
+    model = XGBClassifier(n_estimators=n_estimators, eval_metric='logloss', **best['params'])
+    model.fit(X_train, y_train)
+    fairness_seed = FairnessAggregator()
+    metrics = evaluate_model(model, X_test, y_test, load_sensitive_features(data_path, X_test.index), fairness_seed)
+
+    tuning = {
+        'mode': 'tuned',
+        'params': best['params'],
+        'n_estimators': n_estimators,
+        'cv_folds': folds,
+        'cv_logloss': best['cv_logloss'],
+        'trials': len(search_log),
+        'search_seconds': time.time() - started,
+        'time_budget': time_budget,
+    }
+    bundle_path = save_bundle(model, X.columns, metrics, data_path, data_hash=file_sha256(data_path),
+                              artifacts_dir=artifacts_dir,
+                              extra_manifest={'training': tuning, 'fairness_seed': fairness_seed.counts()},
+                              extra_files={SEARCH_LOG_FILE: search_log,
+                                           DRIFT_PROFILE_FILE: DriftProfile.build([pd.read_csv(data_path)],
+                                                                                  X.columns).to_dict()})
+    print(f"Model bundle exported to {bundle_path}")
+    return bundle_path
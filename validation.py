@@ -0,0 +1,177 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from feature_encoder import FeatureEncoder
+
+# Allowed [low, high] range of numeric features; None leaves a side open
+FEATURE_RANGES = {
+    'Earnings (Value)': (0, 100000),
+    'Perf. Rating (Avg)': (3.0, 5.0),
+    'Time on Platform (Months)': (0, None),
+    'Order/Trip Volume': (0, None),
+    'Financial Activity (Score)': (0.0, 1.0),
+    'Earnings Volatility': (0.0, 1.0),
+    'On-Time Loan Repayments': (0, None),
+    'Operational Anomaly Score': (0.0, 1.0),
+}
+
+# DataFrame.attrs key under which ingest.read_upload lists, per numeric field,
+# the index labels of rows whose text could not be parsed as a number
+NOT_NUMERIC_ATTR = 'not_numeric_rows'
+
+# Allowed values of categorical features. The training columns only name the
+# categories pd.get_dummies(drop_first=True) kept, so the dropped one is listed here
+FEATURE_CATEGORIES = {
+    'Partner Type': ('Driver', 'Merchant'),
+    'Earnings (Stability Type)': ('Stable', 'Seasonal', 'Variable'),
+}
+
+
+class SchemaValidator:
+    """
+    Row-level input validation compiled from the training feature columns.
+
+    Every field the model reads gets a fixed set of checks (missing, not a
+    number, out of range, unknown category), and every check owns one bit of
+    a per-row uint64 error bitmap. validate_frame() computes the bitmap of a
+    whole DataFrame with one vectorized comparison per check, so callers can
+    score the rows whose bitmap is 0 and report only the others.
+    """
+
+    def __init__(self, feature_columns, ranges=FEATURE_RANGES, categories=FEATURE_CATEGORIES):
+        encoder = FeatureEncoder(feature_columns)
+        self.numeric = {}
+        for field in encoder.numeric_index:
+            self.numeric[field] = ranges.get(field, (None, None))
+        self.categorical = {}
+        for field, known in encoder.categorical_index.items():
+            self.categorical[field] = frozenset(categories.get(field, ())) | frozenset(known)
+
+        # (field, kind, message) of every check; the position is the check's bit
+        self.checks = []
+        for field, (low, high) in self.numeric.items():
+            self.checks.append((field, 'missing', f"'{field}' is missing"))
+            self.checks.append((field, 'not_numeric', f"'{field}' must be a number"))
+            if low is not None or high is not None:
+                self.checks.append((field, 'out_of_range', f"'{field}' must be {_describe_range(low, high)}"))
+        for field, allowed in self.categorical.items():
+            self.checks.append((field, 'missing', f"'{field}' is missing"))
+            self.checks.append((field, 'unknown_category',
+                                f"'{field}' must be one of {', '.join(sorted(allowed))}"))
+        if len(self.checks) > 64:
+            raise ValueError("Too many checks for a 64-bit error bitmap.")
+        self._bit = {(field, kind): np.uint64(1) << np.uint64(i) for i, (field, kind, _) in enumerate(self.checks)}
+
+    @property
+    def fields(self):
+        return list(self.numeric) + list(self.categorical)
+
+    def validate_frame(self, df):
+        """
+        Returns the uint64 error bitmap of every row of df (0 for a valid row).
+        """
+        bits = np.zeros(len(df), dtype=np.uint64)
+        unparsed = df.attrs.get(NOT_NUMERIC_ATTR, {})
+        for field, (low, high) in self.numeric.items():
+            if field not in df.columns:
+                bits |= self._bit[(field, 'missing')]
+                continue
+            column = df[field]
+            missing = column.isna().to_numpy()
+            values = pd.to_numeric(column, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+            not_numeric = np.isnan(values) & ~missing
+            if unparsed.get(field):
+                # Text the upload parser already coerced to NaN
+                not_numeric |= df.index.isin(unparsed[field])
+                missing = missing & ~not_numeric
+            bits[missing] |= self._bit[(field, 'missing')]
+            bits[not_numeric] |= self._bit[(field, 'not_numeric')]
+            if low is not None or high is not None:
+                # NaN compares False, so missing and non-numeric values are not also out of range
+                out_of_range = np.zeros(len(df), dtype=bool)
+                if low is not None:
+                    out_of_range |= values < low
+                if high is not None:
+                    out_of_range |= values > high
+                bits[out_of_range] |= self._bit[(field, 'out_of_range')]
+        for field, allowed in self.categorical.items():
+            if field not in df.columns:
+                bits |= self._bit[(field, 'missing')]
+                continue
+            column = df[field]
+            missing = column.isna().to_numpy()
+            unknown = ~column.astype(str).isin(allowed).to_numpy() & ~missing
+            bits[missing] |= self._bit[(field, 'missing')]
+            bits[unknown] |= self._bit[(field, 'unknown_category')]
+        return bits
+
+    def validate_record(self, record):
+        """
+        Returns the error bitmap of a single JSON record, without building a DataFrame.
+        """
+        bits = 0
+        for field, (low, high) in self.numeric.items():
+            value = record.get(field)
+            if value is None:
+                bits |= int(self._bit[(field, 'missing')])
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                bits |= int(self._bit[(field, 'not_numeric')])
+                continue
+            if math.isnan(value):
+                bits |= int(self._bit[(field, 'missing')])
+            elif (low is not None and value < low) or (high is not None and value > high):
+                bits |= int(self._bit[(field, 'out_of_range')])
+        for field, allowed in self.categorical.items():
+            value = record.get(field)
+            if value is None:
+                bits |= int(self._bit[(field, 'missing')])
+            elif str(value) not in allowed:
+                bits |= int(self._bit[(field, 'unknown_category')])
+        return bits
+
+    def describe(self, bits):
+        """
+        Returns the messages of the checks set in one row's bitmap.
+        """
+        bits = int(bits)
+        return [message for i, (_, _, message) in enumerate(self.checks) if bits >> i & 1]
+
+    def rejected_rows(self, bits, rows, ids=None):
+        """
+        Lists the rows with a non-zero bitmap as {'row', 'errors'} records.
+
+        rows gives the row label of every entry of bits (e.g. the DataFrame
+        index); ids, if given, adds each row's 'Partner ID'.
+        """
+        bad = np.flatnonzero(bits)
+        if len(bad) == 0:
+            return []
+        # Rows usually fail in only a few distinct ways, so each bitmap is decoded once
+        messages = {value: self.describe(value) for value in np.unique(bits[bad])}
+        rows = np.asarray(rows)
+        report = []
+        for i in bad:
+            entry = {'row': rows[i].item() if hasattr(rows[i], 'item') else rows[i], 'errors': messages[bits[i]]}
+            if ids is not None:
+                entry['Partner ID'] = _json_value(ids[i])
+            report.append(entry)
+        return report
+
+
+def _describe_range(low, high):
+    if low is None:
+        return f"at most {high}"
+    if high is None:
+        return f"at least {low}"
+    return f"between {low} and {high}"
+
+
+def _json_value(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return value.item() if hasattr(value, 'item') else value
@@ -0,0 +1,89 @@
+import json
+import os
+import threading
+
+# Seconds between two snapshots of a serve.py worker's counters
+WORKER_STATE_SECONDS = float(os.environ.get('NOVA_WORKER_STATE_SECONDS', '2'))
+
+
+class WorkerState:
+    """
+    Counters of every serve.py worker, shared through one JSON file per worker.
+
+    Each preforked worker keeps its own telemetry, fairness and drift
+    counters, and a request (or a Prometheus scrape) lands on any of them.
+    Every worker writes a snapshot of its registered sources to
+    worker-<index>.json in a directory the parent process created, every
+    interval seconds and when it stops. Endpoints add the snapshots of the
+    other workers to their own live counters, so whichever worker answers
+    reports totals for the whole server, at most interval seconds behind.
+    A restarted worker overwrites the file of the worker it replaces.
+    """
+
+    def __init__(self, directory, worker, interval=WORKER_STATE_SECONDS):
+        self.directory = directory
+        self.worker = worker
+        self.interval = interval
+        self.path = os.path.join(directory, f"worker-{worker}.json")
+        self._sources = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def register(self, name, snapshot):
+        """
+        Publishes snapshot() under name; it returns JSON-serializable state, or None when there is none.
+        """
+        self._sources[name] = snapshot
+        return self
+
+    def publish(self):
+        """
+        Writes the snapshot of every source to this worker's file atomically.
+        """
+        state = {'worker': self.worker, 'pid': os.getpid()}
+        for name, snapshot in self._sources.items():
+            state[name] = snapshot()
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp, self.path)
+
+    def others(self, name):
+        """
+        Returns the last published name snapshot of every other worker that has one.
+        """
+        snapshots = []
+        for filename in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, filename)
+            if not (filename.startswith('worker-') and filename.endswith('.json')) or path == self.path:
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f).get(name)
+            except (OSError, ValueError):
+                continue
+            if snapshot is not None:
+                snapshots.append(snapshot)
+        return snapshots
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='nova-worker-state', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the publisher thread and publishes the final counters.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.publish()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.publish()
+            except Exception as e:
+                print(f"Could not publish the counters of worker {self.worker}: {e}")